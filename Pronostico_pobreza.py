@@ -1,7 +1,16 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+
+from core import POBREZA, forecast_accuracy, poverty_summary, scenario_values
+from indicator_store import CARENCIAS_VARIABLES, CATEGORIES, NACIONAL, entidades, get_store
+from figures import (
+    fan_chart_figure,
+    radar_figure,
+    real_comparison_figure,
+    scenario_bar_figure,
+    with_real_bar,
+    with_real_radar,
+)
+from real_data import ERROR, REAL_COLUMN, example_table, groups, join_real_values, read_real_values, validate
 
 def app():
     st.set_page_config(layout="wide") # Use wide layout for better chart display
@@ -15,123 +24,28 @@ def app():
         """
     )
 
-    # Data from the images
-    # Forecasts (2024)
-    optimistic_poverty_2024 = 12.2
-    restrictive_poverty_2024 = 15.1
-
-    # Previous Year Data (2022)
-    poverty_2022 = 16.0
-
-    # Data for social deprivations (carencias sociales)
-    # Extracting relevant rows for carencias from the full data
-    # Full data for both 2022 and 2024 forecasts (parsed from the images)
-    # Organized into four main categories
-    full_data_raw = {
-        'Categoría': [
-            # POBREZA
-            'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA',
-            # PRIVACIÓN SOCIAL
-            'PRIVACIÓN SOCIAL', 'PRIVACIÓN SOCIAL', 'PRIVACIÓN SOCIAL',
-            # INDICADORES DE CARENCIA SOCIAL
-            'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL',
-            # BIENESTAR ECONÓMICO
-            'BIENESTAR ECONÓMICO', 'BIENESTAR ECONÓMICO', 'BIENESTAR ECONÓMICO'
-        ],
-        'Variable': [
-            # POBREZA
-            'Pobreza',
-            'Población en pobreza',
-            'Población en pobreza moderada',
-            'Población en pobreza extrema',
-            'Población vulnerable por carencias sociales',
-            'Población vulnerable por ingresos',
-            'Población no pobre y no vulnerable',
-            # PRIVACIÓN SOCIAL
-            'Privación social',
-            'Población con al menos una carencia social',
-            'Población con al menos tres carencias sociales',
-            # INDICADORES DE CARENCIA SOCIAL
-            'Indicadores de carencia social',
-            'Rezago educativo',
-            'Carencia por acceso a los servicios de salud',
-            'Carencia por acceso a la seguridad social',
-            'Carencia por calidad y espacios de la vivienda',
-            'Carencia por acceso a los servicios básicos de la vivienda',
-            'Carencia por acceso a la alimentación nutritiva y de calidad',
-            # BIENESTAR ECONÓMICO
-            'Bienestar económico',
-            'Población con ingreso inferior a la linea de pobreza extrema por ingresos',
-            'Población con ingreso inferior a la linea de pobreza por ingresos'
-        ],
-        'Valores 2022 (%)': [ # Data from the second image, cleaned to float where possible
-            # POBREZA
-            None, 16.0, 15.0, 1.1, 28.4, 9.6, 45.9,
-            # PRIVACIÓN SOCIAL
-            None, 44.5, 8.8,
-            # INDICADORES DE CARENCIA SOCIAL
-            None, 13.5, 22.8, 27.2, 3.2, 3.8, 11.7,
-            # BIENESTAR ECONÓMICO
-            None, 3.8, 25.7
-        ],
-        'Pronóstico optimista 2024 (%)': [ # Data from the first image, cleaned to float where possible
-            # POBREZA
-            None, 12.2, 11.5, 0.7, 34.6, 6.7, 46.6,
-            # PRIVACIÓN SOCIAL
-            None, 46.8, 6.1,
-            # INDICADORES DE CARENCIA SOCIAL
-            None, 13.7, 16.1, 27.2, 3.2, 3.8, 11.7,
-            # BIENESTAR ECONÓMICO
-            None, 2.8, 18.9
-        ],
-        'Pronóstico restrictivo 2024 (%)': [ # Data from the first image, cleaned to float where possible
-            # POBREZA
-            None, 15.1, 14.3, 0.8, 31.9, 8.6, 44.4,
-            # PRIVACIÓN SOCIAL
-            None, 47.0, 6.0,
-            # INDICADORES DE CARENCIA SOCIAL
-            None, 13.7, 16.2, 27.2, 3.2, 3.8, 11.7,
-            # BIENESTAR ECONÓMICO
-            None, 3.4, 23.7
-        ]
-    }
-
-    df_full = pd.DataFrame(full_data_raw)
-
-    # Define the carencias variables for easy access
-    carencias_variables = [
-        'Rezago educativo',
-        'Carencia por acceso a los servicios de salud',
-        'Carencia por acceso a la seguridad social',
-        'Carencia por calidad y espacios de la vivienda',
-        'Carencia por acceso a los servicios básicos de la vivienda',
-        'Carencia por acceso a la alimentación nutritiva y de calidad'
-    ]
-
-    # Define variables by category for easy access
-    pobreza_variables = [
-        'Población en pobreza',
-        'Población en pobreza moderada',
-        'Población en pobreza extrema',
-        'Población vulnerable por carencias sociales',
-        'Población vulnerable por ingresos',
-        'Población no pobre y no vulnerable'
-    ]
-    
-    privacion_social_variables = [
-        'Población con al menos una carencia social',
-        'Población con al menos tres carencias sociales'
-    ]
-    
-    bienestar_economico_variables = [
-        'Población con ingreso inferior a la linea de pobreza extrema por ingresos',
-        'Población con ingreso inferior a la linea de pobreza por ingresos'
-    ]
-
     # --- TABS ---
     tab1, tab2 = st.tabs(["Análisis de Pronósticos", "Cargar Datos Reales 2024"])
 
     with tab1:
+        # Tables are built once per process (and per state) and shared across reruns and sessions
+        entidad = entidad_selector('entidad_pronosticos')
+        store = get_store(entidad=entidad)
+
+        # Values, variations and simulated interval come from the UI-free core
+        summary = poverty_summary(store)
+        poverty_values = summary['values']
+
+        # Forecasts (2024)
+        optimistic_poverty_2024 = poverty_values['2024 (Optimista)']
+        restrictive_poverty_2024 = poverty_values['2024 (Restrictivo)']
+
+        # Previous Year Data (2022)
+        poverty_2022 = poverty_values['2022']
+
+        # Define the carencias variables for easy access
+        carencias_variables = CARENCIAS_VARIABLES
+
         st.header("1. Análisis de 'Población en Pobreza'")
 
         st.write(f"""
@@ -141,17 +55,37 @@ def app():
             * **Pronóstico Restrictivo 2024:** {restrictive_poverty_2024}%
         """)
 
-        st.subheader("Intervalo de Confianza Implícito para 2024")
+        # Rolling-origin backtest of the forecasting engine, only with a quarterly history
+        accuracy = forecast_accuracy(entidad)
+        if accuracy is not None and POBREZA in accuracy.index:
+            poverty_accuracy = accuracy.loc[POBREZA]
+            st.subheader("Precisión Histórica de los Pronósticos")
+            st.write(f"""
+                Repitiendo el pronóstico desde cada trimestre pasado
+                ({int(poverty_accuracy['Evaluaciones'])} comparaciones con lo observado después):
+                * **Error absoluto medio (pronóstico central):** {poverty_accuracy['MAE central (pp)']:.2f} pp
+                * **Sesgo (pronóstico central):** {poverty_accuracy['Sesgo central (pp)']:+.2f} pp
+                * **Cobertura de la banda optimista-restrictivo:** {poverty_accuracy['Cobertura de la banda (%)']:.0f}%
+                  (nominal {accuracy.attrs['nominal_coverage']:.0%})
+            """)
+            with st.expander("Precisión histórica de todos los indicadores"):
+                st.dataframe(accuracy.style.format(precision=2))
+
+        # Joint scenarios between both forecasts, cached per process
+        simulation = summary['simulation']
+        poverty_p5_2024, poverty_p95_2024 = summary['interval']
+
+        st.subheader("Intervalo Simulado para 2024")
         st.markdown(f"""
-            Considerando los pronósticos, el intervalo de confianza implícito
-            para la 'Población en pobreza' en 2024 es: **[{optimistic_poverty_2024}%, {restrictive_poverty_2024}%]**
+            A partir de {simulation.config['n_draws']:,} escenarios simulados entre los pronósticos,
+            el 90% de los resultados para la 'Población en pobreza' en 2024 cae en:
+            **[{poverty_p5_2024:.1f}%, {poverty_p95_2024:.1f}%]**
         """)
 
         st.subheader("Variación Respecto a 2022")
 
-        # Calculate variations
-        variation_optimistic = optimistic_poverty_2024 - poverty_2022
-        variation_restrictive = restrictive_poverty_2024 - poverty_2022
+        variation_optimistic = summary['variations']['optimista']
+        variation_restrictive = summary['variations']['restrictivo']
 
         st.write(f"""
             * **Variación (2024 Optimista vs. 2022):** {variation_optimistic:.1f} puntos porcentuales
@@ -168,65 +102,37 @@ def app():
 
         st.subheader("Visualización del Rango y Datos Anteriores (Pobreza) - Gráfico de Barras")
 
-        # Prepare data for bar chart for poverty
-        poverty_data_for_bar = {
-            'Escenario': ['2022', '2024 (Optimista)', '2024 (Restrictivo)'],
-            'Pobreza (%)': [poverty_2022, optimistic_poverty_2024, restrictive_poverty_2024]
-        }
-        df_poverty_bar = pd.DataFrame(poverty_data_for_bar)
-        
-
-
-        # Create bar chart with explicit configuration
-        fig_poverty_bar = px.bar(
-            df_poverty_bar,
-            x='Escenario',
-            y='Pobreza (%)',
-            color='Escenario',
-            color_discrete_map={
-                '2022': 'blue',
-                '2024 (Optimista)': 'green',
-                '2024 (Restrictivo)': 'red'
-            },
-            title='Población en Pobreza: 2022 vs. Pronósticos 2024 (Gráfico de Barras)',
-            text='Pobreza (%)'
-        )
-        
-        # Force x-axis to be categorical
-        fig_poverty_bar.update_xaxes(type='category')
-
-        # Update layout for better presentation
-        fig_poverty_bar.update_traces(
-            texttemplate='%{text:.1f}%',
-            textposition='outside'
-        )
-        
-        fig_poverty_bar.update_layout(
-            xaxis_title="Escenario",
-            yaxis_title="Pobreza (%)",
-            showlegend=True,
-            height=500
+        # Built once per distinct input and reused across reruns
+        fig_poverty_bar = scenario_bar_figure(
+            poverty_values,
+            'Población en Pobreza: 2022 vs. Pronósticos 2024 (Gráfico de Barras)'
         )
-        
+
         st.plotly_chart(fig_poverty_bar, use_container_width=True)
 
+        st.subheader("Gráfico de Abanico: Bandas Simuladas de Pobreza")
+
+        fig_poverty_fan = fan_chart_figure(summary['fan'], 'Población en Pobreza: Bandas de Escenarios Simulados 2024')
+
+        st.plotly_chart(fig_poverty_fan, use_container_width=True)
+
         st.markdown(
-            """
+            f"""
             ---
-            **Nota:** Este "intervalo de confianza" se deriva directamente de los dos pronósticos
-            (optimista y restrictivo) y no es un intervalo de confianza estadístico formal que requeriría
-            más datos o supuestos sobre la distribución. Representa el rango de resultados esperados
-            según las proyecciones dadas.
+            **Nota:** Las bandas provienen de {simulation.config['n_draws']:,} escenarios conjuntos simulados
+            entre el pronóstico optimista y el restrictivo (distribución '{simulation.config['distribution']}'),
+            respetando las identidades entre indicadores (por ejemplo, pobreza moderada + extrema = pobreza).
+            Reflejan la incertidumbre entre escenarios, no el error muestral de la encuesta.
             """
         )
 
         st.header("2. Detalles Completos de Indicadores por Categorías (2022 y Pronósticos 2024)")
 
         # Display data organized by categories
-        for categoria in ['POBREZA', 'PRIVACIÓN SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'BIENESTAR ECONÓMICO']:
+        for categoria in CATEGORIES:
             st.subheader(f"**{categoria}**")
-            df_categoria = df_full[df_full['Categoría'] == categoria]
-            st.dataframe(df_categoria[['Variable', 'Valores 2022 (%)', 'Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)']].style.hide(axis="index"))
+            df_categoria = store.category(categoria)
+            st.dataframe(df_categoria[['Variable', 'Valores 2022 (%)', 'Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)']].style.hide(axis="index").format(precision=1))
             st.markdown("---")
 
         st.markdown(
@@ -239,42 +145,9 @@ def app():
         st.subheader("Visualización de Carencias Sociales")
 
         # Prepare data for radar chart for carencias
-        df_carencias = df_full[df_full['Variable'].isin(carencias_variables)].set_index('Variable')
-
-        fig_carencias_radar = go.Figure()
-
-        # Add traces for each year/forecast
-        fig_carencias_radar.add_trace(go.Scatterpolar(
-              r=df_carencias['Valores 2022 (%)'].tolist(),
-              theta=carencias_variables,
-              fill='toself',
-              name='2022',
-              line_color='blue'
-        ))
-        fig_carencias_radar.add_trace(go.Scatterpolar(
-              r=df_carencias['Pronóstico optimista 2024 (%)'].tolist(),
-              theta=carencias_variables,
-              fill='toself',
-              name='2024 (Optimista)',
-              line_color='green'
-        ))
-        fig_carencias_radar.add_trace(go.Scatterpolar(
-              r=df_carencias['Pronóstico restrictivo 2024 (%)'].tolist(),
-              theta=carencias_variables,
-              fill='toself',
-              name='2024 (Restrictivo)',
-              line_color='red'
-        ))
-
-        fig_carencias_radar.update_layout(
-            polar=dict(
-                radialaxis=dict(
-                    visible=True,
-                    range=[0, df_carencias[['Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)']].max().max() * 1.1] # Dynamic range
-                )),
-            showlegend=True,
-            title='Comparativa de Carencias Sociales: 2022 vs. Pronósticos 2024'
-        )
+        df_carencias = store.variables(carencias_variables)
+
+        fig_carencias_radar = radar_figure(df_carencias, 'Comparativa de Carencias Sociales: 2022 vs. Pronósticos 2024')
         st.plotly_chart(fig_carencias_radar, use_container_width=True)
 
 
@@ -287,113 +160,142 @@ def app():
             """
         )
 
+        real_data_comparison()
+
+
+def entidad_selector(key):
+    """State selector, shown only when microdata breakdowns are available."""
+    options = entidades()
+    if not options:
+        return NACIONAL
+    return st.selectbox("Entidad federativa:", [NACIONAL] + options, key=key)
+
+
+@st.fragment
+def real_data_comparison():
+    """Real-data form and comparison charts.
+
+    Runs as a fragment: submitting the form or changing the state reruns only
+    this function, and the inputs are sent in one batch instead of one rerun
+    per field.
+    """
+    entidad = entidad_selector('entidad_datos_reales')
+    store = get_store(entidad=entidad)
+    carencias_variables = CARENCIAS_VARIABLES
+    poverty_values = scenario_values(store)
+
+    with st.form("real_data_2024"):
         st.subheader("Datos Reales de Pobreza (2024)")
         real_poverty_2024 = st.number_input(
             "Porcentaje de Población en Pobreza Real 2024 (%)",
-            min_value=0.0, max_value=100.0, value=optimistic_poverty_2024, step=0.1
+            min_value=0.0, max_value=100.0, value=poverty_values['2024 (Optimista)'], step=0.1
         )
 
         st.subheader("Datos Reales de Carencias Sociales (2024)")
         real_carencias = {}
         for carencia in carencias_variables:
-            # Get default value from optimistic forecast if available, otherwise 0.0
-            default_value = df_full[df_full['Variable'] == carencia]['Pronóstico optimista 2024 (%)'].iloc[0] if not df_full[df_full['Variable'] == carencia]['Pronóstico optimista 2024 (%)'].empty else 0.0
+            # Default to the optimistic forecast
+            default_value = store.value(carencia, 'optimista')
             real_carencias[carencia] = st.number_input(
                 f"Porcentaje de '{carencia}' Real 2024 (%)",
                 min_value=0.0, max_value=100.0, value=default_value, step=0.1, key=f"real_{carencia}"
             )
 
-        if st.button("Comparar Datos Reales"):
-            st.markdown("---")
-            st.subheader("Comparativa de 'Población en Pobreza' (Real vs. Pronósticos vs. 2022)")
-
-            # Data for poverty comparison bar chart
-            poverty_data_compare_bar = {
-                'Escenario': ['2022', '2024 (Optimista)', '2024 (Restrictivo)', '2024 (Real)'],
-                'Pobreza (%)': [poverty_2022, optimistic_poverty_2024, restrictive_poverty_2024, real_poverty_2024]
-            }
-            df_poverty_compare_bar = pd.DataFrame(poverty_data_compare_bar)
-
-            # Create comparison bar chart
-            fig_poverty_compare_bar = px.bar(
-                df_poverty_compare_bar,
-                x='Escenario',
-                y='Pobreza (%)',
-                color='Escenario',
-                color_discrete_map={
-                    '2022': 'blue',
-                    '2024 (Optimista)': 'green',
-                    '2024 (Restrictivo)': 'red',
-                    '2024 (Real)': 'darkblue'
-                },
-                title='Población en Pobreza: Comparativa Real vs. Pronósticos (Gráfico de Barras)',
-                text='Pobreza (%)'
-            )
+        submitted = st.form_submit_button("Comparar Datos Reales")
 
-            # Update layout for better presentation
-            fig_poverty_compare_bar.update_traces(
-                texttemplate='%{text:.1f}%',
-                textposition='outside'
-            )
-            
-            fig_poverty_compare_bar.update_layout(
-                xaxis_title="Escenario",
-                yaxis_title="Pobreza (%)",
-                showlegend=True,
-                height=500
-            )
-            
-            st.plotly_chart(fig_poverty_compare_bar, use_container_width=True)
-
-
-            st.subheader("Comparativa de Carencias Sociales (Real vs. Pronósticos vs. 2022)")
-
-            fig_carencias_compare_radar = go.Figure()
-
-            # Add traces for each scenario
-            fig_carencias_compare_radar.add_trace(go.Scatterpolar(
-                  r=df_carencias['Valores 2022 (%)'].tolist(),
-                  theta=carencias_variables,
-                  fill='toself',
-                  name='2022',
-                  line_color='blue'
-            ))
-            fig_carencias_compare_radar.add_trace(go.Scatterpolar(
-                  r=df_carencias['Pronóstico optimista 2024 (%)'].tolist(),
-                  theta=carencias_variables,
-                  fill='toself',
-                  name='2024 (Optimista)',
-                  line_color='green'
-            ))
-            fig_carencias_compare_radar.add_trace(go.Scatterpolar(
-                  r=df_carencias['Pronóstico restrictivo 2024 (%)'].tolist(),
-                  theta=carencias_variables,
-                  fill='toself',
-                  name='2024 (Restrictivo)',
-                  line_color='red'
-            ))
-            # Add real data trace
-            fig_carencias_compare_radar.add_trace(go.Scatterpolar(
-                  r=[real_carencias[c] for c in carencias_variables],
-                  theta=carencias_variables,
-                  fill='toself',
-                  name='2024 (Real)',
-                  line_color='darkblue',
-                  line_width=3
-            ))
-
-            max_val = max(df_carencias[['Valores 2022 (%)', 'Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)']].max().max(), max(real_carencias.values())) if real_carencias else df_carencias[['Valores 2022 (%)', 'Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)']].max().max()
-            fig_carencias_compare_radar.update_layout(
-                polar=dict(
-                    radialaxis=dict(
-                        visible=True,
-                        range=[0, max_val * 1.1]
-                    )),
-                showlegend=True,
-                title='Comparativa de Carencias Sociales: Real vs. Pronósticos vs. 2022'
-            )
-            st.plotly_chart(fig_carencias_compare_radar, use_container_width=True)
+    # Keep the last submitted values per state, so the comparison survives other
+    # reruns and is never drawn against another state's forecasts
+    comparisons = st.session_state.setdefault('real_comparison', {})
+    if submitted:
+        comparisons[entidad] = {'poverty': real_poverty_2024, 'carencias': real_carencias}
+    real_data = comparisons.get(entidad)
+
+    if real_data is not None:
+        st.markdown("---")
+        st.subheader("Comparativa de 'Población en Pobreza' (Real vs. Pronósticos vs. 2022)")
+
+        # Cached 2022/forecast bars; only the '2024 (Real)' trace is added per submission
+        fig_poverty_compare_bar = with_real_bar(
+            scenario_bar_figure(poverty_values, 'Población en Pobreza: Comparativa Real vs. Pronósticos (Gráfico de Barras)'),
+            real_data['poverty']
+        )
+
+        st.plotly_chart(fig_poverty_compare_bar, use_container_width=True)
+
+
+        st.subheader("Comparativa de Carencias Sociales (Real vs. Pronósticos vs. 2022)")
+
+        # Same cached radar as tab1
+        fig_carencias_radar = radar_figure(
+            store.variables(carencias_variables), 'Comparativa de Carencias Sociales: 2022 vs. Pronósticos 2024'
+        )
+        fig_carencias_compare_radar = with_real_radar(
+            fig_carencias_radar,
+            {c: real_data['carencias'][c] for c in carencias_variables},
+            'Comparativa de Carencias Sociales: Real vs. Pronósticos vs. 2022'
+        )
+        st.plotly_chart(fig_carencias_compare_radar, use_container_width=True)
+
+    st.markdown("---")
+    st.subheader("Carga Masiva de Datos Reales 2024")
+    st.write(
+        """
+        Sube un archivo CSV o Parquet con las columnas 'Variable' y 'Real 2024 (%)'
+        (opcionalmente 'Entidad' y 'Trimestre') para comparar todos los indicadores a la vez.
+        """
+    )
+    st.download_button(
+        "Descargar plantilla CSV",
+        example_table(store.indicator_variables).to_csv(index=False).encode('utf-8'),
+        file_name='datos_reales_2024.csv',
+        mime='text/csv',
+    )
+    uploaded = st.file_uploader("Archivo de datos reales 2024", type=['csv', 'parquet'])
+    if uploaded is not None:
+        bulk_comparison(uploaded, store.indicator_variables)
+
+
+def bulk_comparison(uploaded, variables):
+    """Validation report and comparison charts for an uploaded table of real values."""
+    try:
+        frame = read_real_values(uploaded)
+    except ValueError as exc:
+        st.error(f"No se pudo leer el archivo: {exc}")
+        return
+
+    # One vectorized pass: per-row checks plus identities between indicators
+    valid, issues = validate(frame, variables)
+    if len(issues):
+        n_errors = int((issues['Tipo'] == ERROR).sum())
+        st.warning(f"{n_errors} filas con errores (omitidas) y {len(issues) - n_errors} advertencias de consistencia.")
+        st.dataframe(issues, hide_index=True)
+
+    options = groups(valid)
+    if not options:
+        st.error("El archivo no tiene filas válidas para comparar.")
+        return
+    entidad, trimestre = options[0]
+    if len(options) > 1:
+        entidad, trimestre = st.selectbox(
+            "Grupo a comparar:", options, format_func=lambda group: " - ".join(part for part in group if part)
+        )
+
+    # Real values joined onto df_full of the group's store in one merge
+    joined = join_real_values(get_store(entidad=entidad).df_full, valid, entidad, trimestre)
+    compared = joined.dropna(subset=[REAL_COLUMN])
+    st.write(f"{len(compared)} indicadores comparados.")
+
+    fig_real_comparison = real_comparison_figure(
+        compared.set_index('Variable'), REAL_COLUMN, 'Indicadores: Real 2024 vs. Pronósticos vs. 2022'
+    )
+    st.plotly_chart(fig_real_comparison, use_container_width=True)
+    st.dataframe(
+        compared[['Categoría', 'Variable', 'Valores 2022 (%)', 'Pronóstico optimista 2024 (%)',
+                  'Pronóstico restrictivo 2024 (%)', REAL_COLUMN, 'Real - Optimista (pp)', 'Real - Restrictivo (pp)']]
+        .style.hide(axis="index")
+        .format(precision=1)
+    )
 
 
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
@@ -0,0 +1,224 @@
+"""Local JSON API over the indicator tables, variations and chart figures.
+
+Serves what the apps compute, without a Streamlit session per viewer:
+
+* ``/api/entidades``: states with breakdowns (``ENOE_CACHE_DIR`` only);
+* ``/api/indicadores`` and ``/api/indicadores/{categoria}``: category tables;
+* ``/api/variaciones``: 2024-vs-2022 changes of every indicator;
+* ``/api/pobreza``: scenario values, changes and simulated interval;
+* ``/api/figuras`` and ``/api/figuras/{nombre}``: Plotly figure JSON of the
+  charts in ``report`` (the same builders, titles and themes as the apps).
+
+Every endpoint takes ``?entidad=`` (default: national). Responses go through
+the same process-wide stores, simulations and figure cache as the apps
+(``core``, ``figures``), and the on-disk caches of the pipeline are shared
+with any app reading the same ``ENOE_CACHE_DIR``. Each serialized body is kept
+with its gzip version and a content ETag, keyed by the request and
+``indicator_store.data_version()``; ``If-None-Match`` gets a bodiless 304.
+Handlers are async: cached responses are answered on the event loop and
+first builds, including the store of a state not built yet, go to a thread.
+
+Starlette and uvicorn come with Streamlit, so the API needs nothing else.
+
+Usage:
+    python api.py --port 8502
+    curl -H 'Accept-Encoding: gzip' localhost:8502/api/figuras/carencias_radar_mejorado
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Route
+
+import schema
+from core import POBREZA, poverty_summary, variation_table
+from indicator_store import CATEGORIES, NACIONAL, data_version, entidades, get_store
+
+# Smaller bodies are sent as is: gzip would not pay for its header
+MIN_GZIP_BYTES = 512
+GZIP_LEVEL = 6
+_MAX_RESPONSES = 512
+
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+schema.register('api', _responses, _responses_lock)
+
+
+class NotFound(Exception):
+    """Unknown state, category, variable or figure."""
+
+
+def _clean(value):
+    """JSON-safe copy of ``value``: NaN becomes null."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    return value
+
+
+def _records(df):
+    return _clean(schema.decimal_frame(df).to_dict(orient='records'))
+
+
+def _store(request):
+    entidad = request.query_params.get('entidad', NACIONAL)
+    if entidad != NACIONAL and entidad not in entidades():
+        raise NotFound(f"Entidad desconocida: {entidad}")
+    return get_store(entidad=entidad)
+
+
+def _indicators(request, store):
+    return {
+        categoria: {'encabezado': store.headers.get(categoria), 'filas': _records(store.category(categoria))}
+        for categoria in store.categories
+    }
+
+
+def _category(request, store):
+    categoria = request.path_params['categoria']
+    if categoria not in CATEGORIES:
+        raise NotFound(f"Categoría desconocida: {categoria}")
+    return _records(store.category(categoria))
+
+
+def _variations(request, store):
+    table = variation_table(store.variables(store.indicator_variables))
+    return _records(table.rename_axis('Variable').reset_index())
+
+
+def _poverty(request, store):
+    variable = request.query_params.get('variable', POBREZA)
+    if variable not in store.indicator_variables:
+        raise NotFound(f"Variable desconocida: {variable}")
+    summary = poverty_summary(store, variable)
+    return _clean({
+        'variable': variable,
+        'valores': summary['values'],
+        'variaciones': summary['variations'],
+        'intervalo': list(summary['interval']),
+    })
+
+
+def _chart_jobs(store):
+    import report
+
+    return {name: (builder, args, kwargs) for name, builder, args, kwargs in report.chart_jobs(store)}
+
+
+def _figure_names(request, store):
+    return list(_chart_jobs(store))
+
+
+def _figure(request, store):
+    import figures
+
+    jobs = _chart_jobs(store)
+    name = request.path_params['nombre']
+    if name not in jobs:
+        raise NotFound(f"Figura desconocida: {name}")
+    builder, args, kwargs = jobs[name]
+    # Already JSON: returned as bytes, not re-encoded
+    return getattr(figures, builder)(*args, **kwargs).to_json().encode('utf-8')
+
+
+def _cached_response(key, build):
+    """``(etag, body, gzipped body or None)`` for ``key``, building it on first use."""
+    entry = _responses.get(key)
+    if entry is not None:
+        return entry
+    payload = build()
+    body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    compressed = gzip.compress(body, GZIP_LEVEL) if len(body) >= MIN_GZIP_BYTES else None
+    entry = (hashlib.sha256(body).hexdigest()[:20], body, compressed)
+    with _responses_lock:
+        _responses[key] = entry
+        while len(_responses) > _MAX_RESPONSES:
+            _responses.popitem(last=False)
+    schema.enforce_budget()
+    return entry
+
+
+def _not_modified(request, etag):
+    tokens = request.headers.get('if-none-match', '')
+    # Either encoding's tag matches: both have the same content
+    return any(token.strip().removeprefix('W/').strip('"').removesuffix('-gz') == etag
+               for token in tokens.split(','))
+
+
+def endpoint(handler):
+    """Starlette endpoint serving ``handler(request, store)`` with ETag and gzip."""
+    async def serve(request):
+        # Keyed before any store is resolved: building one may take the cube,
+        # forecasts and bootstrap of a state, which must not block the loop
+        key = (handler.__name__, request.url.path, tuple(sorted(request.query_params.items())), data_version())
+        entry = _responses.get(key)
+        if entry is None:
+            try:
+                entry = await run_in_threadpool(_cached_response, key, lambda: handler(request, _store(request)))
+            except NotFound as error:
+                return _error(404, error)
+        etag, body, compressed = entry
+        use_gzip = compressed is not None and 'gzip' in request.headers.get('accept-encoding', '')
+        headers = {
+            'ETag': f'"{etag}-gz"' if use_gzip else f'"{etag}"',
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+        }
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers['Content-Encoding'] = 'gzip'
+            body = compressed
+        return Response(body, media_type='application/json', headers=headers)
+    return serve
+
+
+def _error(status, error):
+    body = json.dumps({'error': str(error)}, ensure_ascii=False)
+    return Response(body, status_code=status, media_type='application/json')
+
+
+async def _entidades(request):
+    body = json.dumps({'entidades': [NACIONAL] + entidades()}, ensure_ascii=False)
+    return Response(body, media_type='application/json')
+
+
+app = Starlette(routes=[
+    Route('/api/entidades', _entidades),
+    Route('/api/indicadores', endpoint(_indicators)),
+    Route('/api/indicadores/{categoria}', endpoint(_category)),
+    Route('/api/variaciones', endpoint(_variations)),
+    Route('/api/pobreza', endpoint(_poverty)),
+    Route('/api/figuras', endpoint(_figure_names)),
+    Route('/api/figuras/{nombre}', endpoint(_figure)),
+])
+
+
+def invalidate():
+    """Drop the serialized responses; stores and figures have their own ``invalidate``."""
+    with _responses_lock:
+        _responses.clear()
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="API JSON local de indicadores y figuras.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args(argv)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Rolling-origin backtest of the ``forecasting`` engine.
+
+Every past quarter with enough history before it is a forecast origin: the
+model is refitted on the history up to that quarter only (cold, so no later
+quarter leaks in through warm-started parameters) and forecasts the next
+``MAX_HORIZON`` quarters. Those forecasts are compared with what the survey
+later observed, giving per indicator and scenario:
+
+* MAE and bias (forecast - observed, pp) of the central, optimistic and
+  restrictive forecasts;
+* coverage: share of observations inside the optimistic-restrictive band,
+  nominally ``RESTRICTIVE_QUANTILE - OPTIMISTIC_QUANTILE``.
+
+The forecasts of an origin only depend on the quarters up to it, so each
+origin is stored in its own file keyed by their hashes. Adding a quarter only
+computes the new origin; the errors of older origins are re-scored against
+the new observation when the files are read. Missing origins run in a
+process pool.
+
+Usage:
+    python backtesting.py --cache-dir cache/
+    python backtesting.py --cache-dir cache/ --entidad Jalisco --horizon 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import breakdowns
+import enoe_cache
+import forecasting
+from forecasting import CENTRAL_COLUMN, FORECAST_COLUMNS, quarter_index, quarter_label
+from indicator_store import SCENARIO_COLUMNS
+
+MAX_HORIZON = 8
+OBSERVED_COLUMN = 'Observado (%)'
+ORIGIN_COLUMNS = ['Origen', 'Horizonte', 'Trimestre']
+SCENARIOS = {
+    'central': CENTRAL_COLUMN,
+    'optimista': SCENARIO_COLUMNS['optimista'],
+    'restrictivo': SCENARIO_COLUMNS['restrictivo'],
+}
+NOMINAL_COVERAGE = forecasting.RESTRICTIVE_QUANTILE - forecasting.OPTIMISTIC_QUANTILE
+
+_backtests = {}
+_backtests_lock = threading.Lock()
+
+
+def origin_forecasts(hist, max_horizon=MAX_HORIZON):
+    """Long table of the forecasts made at the last quarter of ``hist``; runs in a worker."""
+    fitted, params, level, trend, sigma = forecasting.fit_history(hist, max_workers=1)
+    horizons = np.arange(1, max_horizon + 1)
+    favourable_up = hist.index[fitted].get_level_values('Variable').isin(forecasting.FAVOURABLE_UP)
+    forecasts = forecasting.scenario_forecasts(params, level, trend, sigma, horizons, favourable_up)
+
+    origin = hist.columns[-1]
+    index = hist.index[fitted]
+    table = pd.DataFrame({
+        **{name: np.repeat(index.get_level_values(name), len(horizons)) for name in breakdowns.INDEX_COLUMNS},
+        'Origen': origin,
+        'Horizonte': np.tile(horizons, len(index)),
+        'Trimestre': np.tile([quarter_label(quarter_index(origin) + h) for h in horizons], len(index)),
+    })
+    for column, values in zip(FORECAST_COLUMNS, forecasts):
+        table[column] = values.ravel()
+    return table
+
+
+def _origin_digest(hashes, origin, max_horizon):
+    upto = {q: sha for q, sha in hashes.items() if quarter_index(q) <= quarter_index(origin)}
+    payload = json.dumps([forecasting.MODEL_VERSION, forecasting.OPTIMISTIC_QUANTILE,
+                          forecasting.RESTRICTIVE_QUANTILE, max_horizon, upto], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def origins(hist):
+    """Quarters usable as origins: enough history before, an observation after."""
+    observed = [q for q in hist.columns if hist[q].notna().any()]
+    return observed[forecasting.MIN_QUARTERS - 1:-1]
+
+
+def backtest(cache_dir, quarter=None, max_horizon=MAX_HORIZON, max_workers=None):
+    """Forecasts of every origin joined with the observed values.
+
+    Origins already on disk are read; missing ones are computed in a process
+    pool and written one file each.
+    """
+    hist = forecasting.history(cache_dir, quarter)
+    manifest_quarters = enoe_cache.read_manifest(cache_dir)['quarters']
+    hashes = {q: manifest_quarters[q]['sha256'] for q in hist.columns if q in manifest_quarters}
+    paths = {
+        origin: os.path.join(cache_dir, f"backtest_{origin}_{_origin_digest(hashes, origin, max_horizon)}.csv")
+        for origin in origins(hist)
+    }
+    key = (cache_dir, tuple(sorted(paths.values())))
+    if key in _backtests:
+        return _backtests[key]
+
+    with _backtests_lock:
+        if key not in _backtests:
+            missing = [origin for origin, path in paths.items() if not os.path.exists(path)]
+            jobs = [hist.loc[:, :origin] for origin in missing]
+            workers = max_workers or min(os.cpu_count() or 1, 8)
+            if workers == 1 or len(jobs) <= 1:
+                computed = [origin_forecasts(job, max_horizon) for job in jobs]
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                    computed = list(pool.map(origin_forecasts, jobs, [max_horizon] * len(jobs)))
+            for origin, table in zip(missing, computed):
+                tmp_path = f"{paths[origin]}.{os.getpid()}.tmp"
+                table.to_csv(tmp_path, index=False)
+                os.replace(tmp_path, paths[origin])
+
+            tables = [pd.read_csv(path) for origin, path in paths.items() if origin not in missing]
+            forecasts = pd.concat(tables + computed, ignore_index=True) if paths else pd.DataFrame(
+                columns=breakdowns.INDEX_COLUMNS + ORIGIN_COLUMNS + FORECAST_COLUMNS)
+            observed = hist.stack().dropna().rename(OBSERVED_COLUMN)
+            observed = observed.rename_axis(breakdowns.INDEX_COLUMNS + ['Trimestre']).reset_index()
+            _backtests[key] = forecasts.merge(observed, on=breakdowns.INDEX_COLUMNS + ['Trimestre'], how='inner')
+    return _backtests[key]
+
+
+def accuracy(results, dimension=breakdowns.NACIONAL, group=breakdowns.NACIONAL, max_horizon=None):
+    """MAE, bias and band coverage per indicator for one breakdown group."""
+    rows = results[(results['Desagregación'] == dimension) & (results['Grupo'] == group)]
+    if max_horizon is not None:
+        rows = rows[rows['Horizonte'] <= max_horizon]
+    observed = rows[OBSERVED_COLUMN]
+    columns = {}
+    for scenario, column in SCENARIOS.items():
+        columns[f'MAE {scenario} (pp)'] = (rows[column] - observed).abs()
+    for scenario, column in SCENARIOS.items():
+        columns[f'Sesgo {scenario} (pp)'] = rows[column] - observed
+    low = rows[[SCENARIOS['optimista'], SCENARIOS['restrictivo']]].min(axis=1)
+    high = rows[[SCENARIOS['optimista'], SCENARIOS['restrictivo']]].max(axis=1)
+    columns['Cobertura de la banda (%)'] = ((observed >= low) & (observed <= high)) * 100.0
+    columns['Evaluaciones'] = observed.notna().astype(int)
+
+    errors = pd.DataFrame(columns).assign(Variable=rows['Variable'])
+    table = errors.groupby('Variable', sort=False).agg(
+        {**{c: 'mean' for c in columns if c != 'Evaluaciones'}, 'Evaluaciones': 'sum'}
+    )
+    table = table.round(2)
+    table.attrs['nominal_coverage'] = NOMINAL_COVERAGE
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtesting con origen móvil de los pronósticos.")
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--quarter')
+    parser.add_argument('--entidad', default=breakdowns.NACIONAL)
+    parser.add_argument('--horizon', type=int, help="Solo horizontes de hasta este número de trimestres")
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = backtest(args.cache_dir, args.quarter, max_workers=args.workers)
+    elapsed = time.perf_counter() - start
+    dimension = breakdowns.NACIONAL if args.entidad == breakdowns.NACIONAL else breakdowns.ENTIDAD
+    print(accuracy(results, dimension, args.entidad, args.horizon).to_string())
+    print(f"{results['Origen'].nunique()} orígenes, {len(results)} pronósticos evaluados en {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
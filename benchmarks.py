@@ -0,0 +1,529 @@
+"""Benchmarks of app reruns, figure building and data preparation.
+
+App benchmarks drive both scripts headlessly with Streamlit's ``AppTest`` and
+record, per interaction, the median wall time, the peak Python memory
+(``tracemalloc``, measured in a separate run so it does not slow the timed
+ones) and the serialized Plotly payload, overall and per tab. Each
+interaction is measured with cold process caches (store, figures,
+simulations cleared) and warm ones. ``AppTest`` reruns the whole script even
+for widgets inside a fragment, so interaction times are upper bounds of what
+a browser session pays.
+
+Micro-benchmarks time the data-prep functions and each figure builder, cold
+(the undecorated builder) and warm (through the figure cache), and end with
+the memory held by each process cache (``schema.memory_report``).
+
+Import benchmarks run ``python -X importtime`` in a fresh interpreter for
+the core, the figure module and both apps, and record the cumulative import
+time and whether Streamlit or Plotly got imported along the way.
+
+API benchmarks start ``api.py`` in its own process and drive it with a local
+asyncio load generator: ``--concurrency`` keep-alive connections share
+``--api-requests`` requests per endpoint, once asking for gzip (200) and
+once revalidating with ``If-None-Match`` (304). They record throughput and
+the median and p95 latency.
+
+Results are written as JSON; ``--compare`` reports the change against a
+previous file and exits with 1 when something got slower than ``--threshold``.
+
+Usage:
+    python benchmarks.py --out bench.json
+    python benchmarks.py --out bench.json --compare bench_base.json
+    python benchmarks.py --micro-only --cache-dir cache/
+    python benchmarks.py --imports-only
+    python benchmarks.py --api-only --concurrency 64
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import io
+import itertools
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.request
+
+import pandas as pd
+import plotly
+import streamlit
+from streamlit.testing.v1 import AppTest
+
+import figures
+import indicator_store
+import montecarlo
+import real_data
+import schema
+from core import scenario_values
+from indicator_store import CARENCIAS_VARIABLES, CATEGORIES, FULL_DATA_RAW, IndicatorStore, get_store
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLASSIC_APP = os.path.join(HERE, 'Pronostico_pobreza.py')
+IMPROVED_APP = os.path.join(HERE, 'improved_version.py')
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+# Smaller differences are timer noise, whatever their ratio
+MIN_DELTA_MS = 1.0
+APP_TIMEOUT = 120
+
+# Modules timed by the import benchmarks, and the heavy ones to watch for
+IMPORT_MODULES = ['core', 'indicator_store', 'figures', 'Pronostico_pobreza', 'improved_version']
+HEAVY_MODULES = ['streamlit', 'plotly', 'plotly.express']
+
+# Endpoints loaded by the API benchmarks
+API_PATHS = [
+    '/api/indicadores',
+    '/api/variaciones',
+    '/api/pobreza',
+    '/api/figuras/carencias_radar_mejorado',
+    '/api/figuras/variacion_mapa_calor',
+]
+DEFAULT_CONCURRENCY = 32
+DEFAULT_API_REQUESTS = 2000
+API_STARTUP_TIMEOUT = 60
+
+
+def clear_caches():
+    """Drop every process-wide cache the apps use."""
+    indicator_store.invalidate()
+    figures.figure_cache.clear()
+    montecarlo._results.clear()
+    gc.collect()
+
+
+def measure(fn, repeat=DEFAULT_REPEAT, setup=None):
+    """Median, min and max wall time (ms) of ``fn()`` over ``repeat`` runs."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(times), 2),
+        'min_ms': round(min(times), 2),
+        'max_ms': round(max(times), 2),
+        'repeat': repeat,
+    }
+
+
+def peak_memory_mb(fn, setup=None):
+    """Peak traced Python memory (MB) while running ``fn()`` once."""
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 2**20, 2)
+
+
+def _payload(node):
+    """Number of charts and bytes of Plotly JSON under an AppTest node."""
+    charts = node.get('plotly_chart')
+    return len(charts), sum(len(chart.proto.spec.encode('utf-8')) for chart in charts)
+
+
+def _app_stats(at):
+    if at.exception:
+        raise RuntimeError(f"La app falló: {[e.value for e in at.exception]}")
+    n_charts, payload = _payload(at)
+    return {
+        'charts': n_charts,
+        'payload_bytes': payload,
+        'tabs': {tab.label: dict(zip(('charts', 'payload_bytes'), _payload(tab))) for tab in at.tabs},
+    }
+
+
+def _new_app(path):
+    return AppTest.from_file(path, default_timeout=APP_TIMEOUT)
+
+
+def _category_selectbox(at):
+    return next(sb for sb in at.selectbox if sb.label.startswith("Selecciona una categor"))
+
+
+def app_interactions():
+    """``(app, path, interaction, prepare, action)``; only ``action(at)`` is timed."""
+    categories = itertools.cycle(CATEGORIES[1:] + CATEGORIES[:1])
+    values = itertools.count(300)
+
+    def run(at):
+        at.run()
+
+    def switch_category(at):
+        _category_selectbox(at).select(next(categories)).run()
+
+    def compare_real_data(at):
+        # New value each time so the comparison figure is rebuilt
+        at.number_input[0].set_value(next(values) / 10)
+        next(b for b in at.button if b.label == "Comparar Datos Reales").click().run()
+
+    return [
+        ('Pronostico_pobreza.py', CLASSIC_APP, 'carga inicial', None, run),
+        ('improved_version.py', IMPROVED_APP, 'carga inicial', None, run),
+        ('improved_version.py', IMPROVED_APP, 'cambio de categoría', run, switch_category),
+        ('Pronostico_pobreza.py', CLASSIC_APP, 'Comparar Datos Reales', run, compare_real_data),
+    ]
+
+
+def run_app_benchmarks(repeat=DEFAULT_REPEAT):
+    results = []
+    for app_name, path, interaction, prepare, action in app_interactions():
+        for cache in ('frío', 'caliente'):
+            apps = []
+
+            def setup():
+                if cache == 'frío':
+                    clear_caches()
+                else:
+                    # Warm the process caches with a throwaway session
+                    warm = _new_app(path)
+                    if prepare is not None:
+                        prepare(warm)
+                    action(warm)
+                at = _new_app(path)
+                if prepare is not None:
+                    prepare(at)
+                    if cache == 'frío':
+                        clear_caches()
+                apps.append(at)
+
+            timing = measure(lambda: action(apps[-1]), repeat, setup)
+            memory = peak_memory_mb(lambda: action(apps[-1]), setup)
+            result = {'app': app_name, 'interaction': interaction, 'cache': cache, **timing, 'peak_mb': memory}
+            result.update(_app_stats(apps[-1]))
+            results.append(result)
+            print(f"{app_name:24} {interaction:22} {cache:8} {timing['median_ms']:9.1f} ms "
+                  f"{memory:7.1f} MB {result['payload_bytes'] / 1024:8.1f} kB")
+    return results
+
+
+def _real_values_table(store, copies=200):
+    table = real_data.example_table(store.indicator_variables)
+    table[real_data.REAL_COLUMN] = store.scenario('optimista').reindex(table['Variable']).to_numpy()
+    tables = [table.assign(Trimestre=f'T{i}') for i in range(copies)]
+    csv = io.StringIO()
+    pd.concat(tables, ignore_index=True).to_csv(csv, index=False)
+    csv.seek(0)
+    return real_data.read_real_values(csv, 'reales.csv')
+
+
+def micro_benchmarks(store, repeat=DEFAULT_REPEAT, cache_dir=None):
+    """``(name, fn, setup)`` for the data-prep functions and figure builders."""
+    poverty_values = scenario_values(store)
+    simulation = montecarlo.simulate(store)
+    df_carencias = store.variables(CARENCIAS_VARIABLES)
+    df_all = store.variables(store.indicator_variables)
+    builders = {
+        'scenario_bar_figure': (poverty_values, 'Pobreza'),
+        'radar_figure': (df_carencias, 'Carencias'),
+        'fan_chart_figure': (simulation.fan('Población en pobreza', poverty_values['2022']), 'Abanico'),
+        'variation_heatmap_figure': (df_all,),
+        'category_bars_figure': (store.variables(store.category_variables('POBREZA')),),
+    }
+    real_values = _real_values_table(store)
+
+    def clear_simulations():
+        montecarlo._results.clear()
+
+    benchmarks = [
+        ('IndicatorStore', lambda: IndicatorStore(FULL_DATA_RAW), None),
+        ('get_store (caliente)', get_store, None),
+        ('store.variables (todas)', lambda: store.variables(store.indicator_variables), None),
+        ('store.value', lambda: store.value('Población en pobreza', 'optimista'), None),
+        ('simulate (frío)', lambda: montecarlo.simulate(store), clear_simulations),
+        ('simulate (caliente)', lambda: montecarlo.simulate(store), None),
+        (f'real_data.validate ({len(real_values)} filas)',
+         lambda: real_data.validate(real_values, store.indicator_variables), None),
+    ]
+    for name, args in builders.items():
+        builder = getattr(figures, name)
+        benchmarks.append((f'{name} (frío)', lambda b=builder, a=args: b.__wrapped__(*a), None))
+        benchmarks.append((f'{name} (caliente)', lambda b=builder, a=args: b(*a), None))
+    benchmarks.append(('payload_size (mapa de calor)',
+                       lambda: figures.payload_size(figures.variation_heatmap_figure(df_all)), None))
+
+    if cache_dir:
+        import breakdowns
+        import cube
+        import enoe_cache
+        import enoe_ingest
+        import forecasting
+        import microsim
+
+        quarter = enoe_cache.latest_quarter(cache_dir)
+        frame = enoe_cache.load_quarter(cache_dir, quarter, breakdowns.BREAKDOWN_COLUMNS)
+        histograms = enoe_ingest.code_histogram(frame)
+        benchmarks += [
+            ('enoe_ingest.encode_persons', lambda: enoe_ingest.encode_persons(frame), None),
+            ('enoe_ingest.code_histogram', lambda: enoe_ingest.code_histogram(frame), None),
+            ('enoe_ingest.histogram_totals (2 carencias)',
+             lambda: enoe_ingest.histogram_totals(*histograms, min_carencias=2), None),
+            ('enoe_cache.load_quarter', lambda: enoe_cache.load_quarter(cache_dir, quarter, enoe_cache.INDICATOR_COLUMNS), None),
+            ('enoe_cache.indicator_table', lambda: enoe_cache.indicator_table(cache_dir, quarter), None),
+            ('breakdowns.breakdown_table', lambda: breakdowns.breakdown_table(frame), None),
+        ]
+        indicator_cube = cube.cube(cache_dir)
+        year = int(quarter[:4])
+        benchmarks += [
+            ('cube.values (entidad x sexo)', lambda: indicator_cube.values(quarter, 'Jalisco', 'Mujer'), None),
+            ('cube.values (año x grupo de edad)',
+             lambda: indicator_cube.values(year, edad=breakdowns.AGE_GROUPS[-1][1]), None),
+            ('cube.group_table', lambda: indicator_cube.group_table(breakdowns.ENTIDAD, 'Jalisco'), None),
+            ('cube.history', indicator_cube.history, None),
+        ]
+        households = microsim.household_table(cache_dir, quarter)
+        micro_frame = enoe_cache.load_quarter(cache_dir, quarter, microsim.MICRO_COLUMNS)
+        benchmarks += [
+            ('microsim.HouseholdTable', lambda: microsim.HouseholdTable(micro_frame), None),
+            ('microsim.scenario', lambda: households.scenario(5, 500), None),
+            (f'microsim.grid ({len(microsim.GRID_GROWTHS) * len(microsim.GRID_TRANSFERS)} escenarios)',
+             households.grid, None),
+        ]
+        hist = forecasting.history(cache_dir)
+        fitted = hist[hist.notna().sum(axis=1) >= forecasting.MIN_QUARTERS]
+        if len(fitted):
+            _, params = forecasting.forecast_table(hist)
+            benchmarks += [
+                (f'forecasting.forecast_table ({len(fitted)} series, frío)',
+                 lambda: forecasting.forecast_table(hist), None),
+                (f'forecasting.forecast_table ({len(fitted)} series, tibio)',
+                 lambda: forecasting.forecast_table(hist, previous=params), None),
+            ]
+    return benchmarks
+
+
+def run_micro_benchmarks(repeat=DEFAULT_REPEAT, cache_dir=None):
+    clear_caches()
+    store = get_store()
+    results = []
+    for name, fn, setup in micro_benchmarks(store, repeat, cache_dir):
+        fn()  # first call outside the timings (imports, lazy init)
+        timing = measure(fn, repeat, setup)
+        results.append({'name': name, **timing})
+        print(f"{name:45} {timing['median_ms']:9.2f} ms")
+    return results
+
+
+def import_time(module):
+    """Cumulative import time (ms) of ``module`` in a fresh interpreter, and the heavy modules it loaded."""
+    check = f"import json, sys; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}; {check}"],
+        cwd=HERE, capture_output=True, text=True, check=True,
+    )
+    # stderr lines: "import time: self [us] | cumulative | imported package"
+    cumulative = next(
+        int(line.split('|')[1])
+        for line in reversed(proc.stderr.splitlines())
+        if line.startswith('import time:') and line.split('|')[2].strip() == module
+    )
+    return cumulative / 1000, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_import_benchmarks(repeat=3):
+    results = []
+    for module in IMPORT_MODULES:
+        times = []
+        for _ in range(repeat):
+            elapsed, loaded = import_time(module)
+            times.append(elapsed)
+        result = {'module': module, 'min_ms': round(min(times), 1), 'repeat': repeat, 'loads': loaded}
+        results.append(result)
+        print(f"import {module:22} {result['min_ms']:9.1f} ms  {', '.join(loaded) or '-'}")
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_api(base_url, proc):
+    deadline = time.monotonic() + API_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("api.py terminó antes de aceptar conexiones")
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/entidades", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("api.py no respondió a tiempo")
+
+
+async def _load(port, path, headers, expected_status, concurrency, n_requests):
+    """Latencies (ms) of ``n_requests`` GETs over ``concurrency`` keep-alive connections, and the wall time."""
+    request = ''.join([f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"]
+                      + [f"{name}: {value}\r\n" for name, value in headers.items()] + ['\r\n']).encode('ascii')
+    pending = iter(range(n_requests))
+    latencies = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        # The iterator is shared: each connection takes the next request
+        for _ in pending:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while (line := await reader.readline()) not in (b'\r\n', b''):
+                name, _, value = line.partition(b':')
+                if name.strip().lower() == b'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            if status != expected_status:
+                raise RuntimeError(f"{path}: HTTP {status}, se esperaba {expected_status}")
+            latencies.append((time.perf_counter() - start) * 1000)
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def run_api_benchmarks(concurrency=DEFAULT_CONCURRENCY, n_requests=DEFAULT_API_REQUESTS):
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, 'api.py'), '--port', str(port)], cwd=HERE)
+    results = []
+    try:
+        _wait_for_api(base_url, proc)
+        for path in API_PATHS:
+            # First request builds the response; its ETag is what clients revalidate with
+            with urllib.request.urlopen(f"{base_url}{path}") as response:
+                etag = response.headers['ETag']
+            modes = [('gzip', {'Accept-Encoding': 'gzip'}, 200), ('etag', {'If-None-Match': etag}, 304)]
+            for mode, headers, expected_status in modes:
+                latencies, elapsed = asyncio.run(_load(port, path, headers, expected_status, concurrency, n_requests))
+                latencies.sort()
+                result = {
+                    'path': path,
+                    'mode': mode,
+                    'concurrency': concurrency,
+                    'requests': n_requests,
+                    'requests_per_s': round(n_requests / elapsed, 1),
+                    'median_ms': round(statistics.median(latencies), 2),
+                    'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+                }
+                results.append(result)
+                print(f"{path:45} {mode:5} {result['requests_per_s']:9.1f} req/s  "
+                      f"p50 {result['median_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms")
+    finally:
+        proc.terminate()
+        proc.wait()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata():
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'streamlit': streamlit.__version__,
+        'plotly': plotly.__version__,
+    }
+
+
+def _keyed(results):
+    keyed = {}
+    for result in results.get('apps', []):
+        keyed[f"{result['app']} | {result['interaction']} | {result['cache']}"] = result['median_ms']
+    for result in results.get('micro', []):
+        keyed[result['name']] = result['median_ms']
+    for result in results.get('imports', []):
+        keyed[f"import {result['module']}"] = result['min_ms']
+    for result in results.get('api', []):
+        keyed[f"api {result['path']} | {result['mode']}"] = result['median_ms']
+    return keyed
+
+
+def compare(base, current, threshold=DEFAULT_THRESHOLD):
+    """Print the change of every median; returns the names that regressed."""
+    base_times, current_times = _keyed(base), _keyed(current)
+    print(f"\nComparación con {base['meta'].get('commit')} (umbral {threshold:.0%}):")
+    regressions = []
+    for name, now in current_times.items():
+        before = base_times.get(name)
+        if before is None:
+            continue
+        change = (now - before) / before if before else 0.0
+        marker = ''
+        if change > threshold and now - before > MIN_DELTA_MS:
+            marker = '  <-- más lento'
+            regressions.append(name)
+        print(f"{name:70} {before:9.2f} -> {now:9.2f} ms ({change:+.0%}){marker}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del simulador de pobreza.")
+    parser.add_argument('--out', help="Archivo JSON de resultados")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--micro-only', action='store_true', help="Solo micro-benchmarks")
+    parser.add_argument('--apps-only', action='store_true', help="Solo benchmarks de las apps")
+    parser.add_argument('--imports-only', action='store_true', help="Solo tiempos de importación")
+    parser.add_argument('--api-only', action='store_true', help="Solo carga sobre la API JSON")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Conexiones simultáneas a la API")
+    parser.add_argument('--api-requests', type=int, default=DEFAULT_API_REQUESTS, help="Peticiones por endpoint y modo")
+    parser.add_argument('--cache-dir', help="Caché ENOE para los benchmarks de microdatos")
+    parser.add_argument('--compare', help="JSON previo contra el cual comparar")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    # AppTest resets Streamlit's log level on every run; silence the per-rerun
+    # notices so the report stays readable
+    for name in ('streamlit.deprecation_util', 'streamlit.runtime.scriptrunner_utils.script_run_context'):
+        logging.getLogger(name).disabled = True
+    results = {'meta': _metadata()}
+    only = args.micro_only or args.apps_only or args.imports_only or args.api_only
+    if args.imports_only or not only:
+        results['imports'] = run_import_benchmarks()
+    if args.apps_only or not only:
+        results['apps'] = run_app_benchmarks(args.repeat)
+    if args.micro_only or not only:
+        results['micro'] = run_micro_benchmarks(args.repeat, args.cache_dir)
+        # What the process caches hold after the micro-benchmarks
+        memory = schema.memory_report()
+        print(memory.to_string(index=False))
+        results['memory'] = memory.to_dict(orient='records')
+    if args.api_only or not only:
+        results['api'] = run_api_benchmarks(args.concurrency, args.api_requests)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            base = json.load(f)
+        if compare(base, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Indicators of ``df_full`` by state, sex and age group.
+
+All breakdowns come from one weighted group-by over the person frame. Every
+person gets a cell code (state x sex x age group); one ``np.bincount`` sums
+the weights per cell and person code (``enoe_ingest.group_totals``), and each
+indicator's numerator and denominator per cell follow from that histogram.
+The state, sex, age and national totals are then sums over the axes of that
+small cell array, so no subset of the microdata is ever filtered.
+
+The result is a long table indexed by ``(Desagregación, Grupo, Variable)``,
+sorted so that ``table.loc[('Entidad', 'Jalisco')]`` is an index slice. It is
+cached per quarter in memory and next to the columnar cache.
+
+Usage:
+    python breakdowns.py --cache-dir cache/ --quarter 2022T1
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import enoe_cache
+import schema
+from enoe_ingest import group_totals
+from indicator_store import FULL_DATA_RAW
+
+NACIONAL = 'Nacional'
+ENTIDAD = 'Entidad'
+SEXO = 'Sexo'
+EDAD = 'Grupo de edad'
+DIMENSIONS = [NACIONAL, ENTIDAD, SEXO, EDAD]
+INDEX_COLUMNS = ['Desagregación', 'Grupo', 'Variable']
+
+# Lower bound of each age group; 'eda' codes 97-99 are "no especificado"
+AGE_GROUPS = [
+    (0, '0 a 11 años'),
+    (12, '12 a 17 años'),
+    (18, '18 a 29 años'),
+    (30, '30 a 44 años'),
+    (45, '45 a 64 años'),
+    (65, '65 años o más'),
+]
+EDAD_NO_ESPECIFICADA = 97
+
+BREAKDOWN_COLUMNS = enoe_cache.INDICATOR_COLUMNS + ['ent', 'sex', 'eda']
+
+_N_ENT = len(enoe_cache.ENTIDADES)
+_N_SEX = len(enoe_cache.CATEGORIES['sex'])
+# One extra age slot for unspecified ages; it counts in every other total
+_N_AGE = len(AGE_GROUPS) + 1
+
+_tables = {}
+_tables_lock = threading.Lock()
+schema.register('breakdowns', _tables, _tables_lock)
+
+
+def cell_codes(frame):
+    """State x sex x age-group cell of every person, as int64 codes."""
+    ent = frame['ent'].to_numpy(dtype=np.int64) - 1
+    sex = frame['sex'].to_numpy(dtype=np.int64) - 1
+    eda = frame['eda'].to_numpy(dtype=np.int64)
+    age = np.searchsorted([lower for lower, _ in AGE_GROUPS[1:]], eda, side='right')
+    age = np.where(eda >= EDAD_NO_ESPECIFICADA, len(AGE_GROUPS), age)
+    return (ent * _N_SEX + sex) * _N_AGE + age
+
+
+def cell_totals(frame):
+    """Weighted numerators and denominators per cell.
+
+    Returns ``(numerators, denominators, variables)``; the arrays have shape
+    (states, sexes, age groups, indicators).
+    """
+    n_cells = _N_ENT * _N_SEX * _N_AGE
+    numerators, denominators, variables = group_totals(frame, cell_codes(frame), n_cells)
+    shape = (_N_ENT, _N_SEX, _N_AGE, len(variables))
+    return numerators.reshape(shape), denominators.reshape(shape), variables
+
+
+def breakdown_table(frame):
+    """Long indicator table for the nation and every state, sex and age group."""
+    numerators, denominators, variables = cell_totals(frame)
+    sexes = list(enoe_cache.CATEGORIES['sex'].values())
+    ages = [label for _, label in AGE_GROUPS]
+    # (dimension, group labels, axes summed away); unspecified ages are dropped last
+    rollups = [
+        (NACIONAL, [NACIONAL], (0, 1, 2)),
+        (ENTIDAD, enoe_cache.ENTIDADES, (1, 2)),
+        (SEXO, sexes, (0, 2)),
+        (EDAD, ages, (0, 1)),
+    ]
+
+    parts = []
+    for dimension, groups, axes in rollups:
+        num = numerators.sum(axis=axes).reshape(-1, len(variables))[:len(groups)]
+        den = denominators.sum(axis=axes).reshape(-1, len(variables))[:len(groups)]
+        parts.append(pd.DataFrame({
+            'Desagregación': dimension,
+            'Grupo': np.repeat(groups, len(variables)),
+            'Variable': np.tile(variables, len(groups)),
+            'Numerador': num.ravel(),
+            'Denominador': den.ravel(),
+        }))
+    table = pd.concat(parts, ignore_index=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['Valor (%)'] = np.where(
+            table['Denominador'] > 0, table['Numerador'] / table['Denominador'] * 100, np.nan
+        ).round(1)
+
+    # Categoría alongside Variable, as in the national indicator table
+    categories = dict(zip(FULL_DATA_RAW['Variable'], FULL_DATA_RAW['Categoría']))
+    table.insert(2, 'Categoría', table['Variable'].map(categories))
+    return table.set_index(INDEX_COLUMNS).sort_index()
+
+
+def breakdowns(cache_dir, quarter=None):
+    """Breakdown table of a cached quarter, computed once and kept on disk."""
+    quarter = quarter or enoe_cache.latest_quarter(cache_dir)
+    entry = enoe_cache.read_manifest(cache_dir)['quarters'][quarter]
+    key = (cache_dir, quarter, entry['sha256'])
+    if key in _tables:
+        return _tables[key]
+
+    path = os.path.join(cache_dir, f"desagregaciones_{quarter}_{entry['sha256'][:12]}.csv")
+    with _tables_lock:
+        if key not in _tables:
+            if os.path.exists(path):
+                table = pd.read_csv(path, index_col=INDEX_COLUMNS).sort_index()
+            else:
+                table = breakdown_table(enoe_cache.load_quarter(cache_dir, quarter, BREAKDOWN_COLUMNS))
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                table.to_csv(tmp_path)
+                os.replace(tmp_path, path)
+            _tables[key] = table
+        table = _tables[key]
+    schema.enforce_budget()
+    return table
+
+
+def group_table(table, dimension, group):
+    """Indicator table (``Variable``, ``Valor (%)``) of one group."""
+    return table.loc[(dimension, group)].reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indicadores por entidad, sexo y grupo de edad.")
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--quarter')
+    parser.add_argument('--dimension', choices=DIMENSIONS, default=ENTIDAD)
+    parser.add_argument('--variable', default='Población en pobreza')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table = breakdowns(args.cache_dir, args.quarter)
+    elapsed = time.perf_counter() - start
+    values = table.xs((args.dimension, args.variable), level=['Desagregación', 'Variable'])['Valor (%)']
+    print(values.to_string())
+    print(f"{len(table)} filas en {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Computation core shared by the apps, the report and batch jobs.
+
+UI-free: importing it loads pandas and numpy (through ``indicator_store`` and
+``montecarlo``) but neither Streamlit nor Plotly. The apps are views over
+these functions and ``figures``, which only imports Plotly when a chart is
+built.
+"""
+import os
+
+import pandas as pd
+
+import schema
+from indicator_store import CACHE_DIR_ENV, NACIONAL, QUARTER_ENV, SCENARIO_COLUMNS
+from montecarlo import simulate
+
+POBREZA = 'Población en pobreza'
+# Values are published with one decimal, so are their differences (no float noise)
+VARIATION_DECIMALS = 1
+
+# Scenario label shown in charts and tables -> column in df_full
+SCENARIO_LABELS = {
+    '2022': SCENARIO_COLUMNS['2022'],
+    '2024 (Optimista)': SCENARIO_COLUMNS['optimista'],
+    '2024 (Restrictivo)': SCENARIO_COLUMNS['restrictivo'],
+}
+
+
+def scenario_values(store, variable=POBREZA):
+    """Scenario label -> value (%) of one variable."""
+    return {
+        '2022': store.value(variable, '2022'),
+        '2024 (Optimista)': store.value(variable, 'optimista'),
+        '2024 (Restrictivo)': store.value(variable, 'restrictivo'),
+    }
+
+
+def variations(values):
+    """Change (pp) of each 2024 forecast with respect to 2022."""
+    return {
+        'optimista': round(float(values['2024 (Optimista)'] - values['2022']), VARIATION_DECIMALS),
+        'restrictivo': round(float(values['2024 (Restrictivo)'] - values['2022']), VARIATION_DECIMALS),
+    }
+
+
+def variation_table(df_values):
+    """2024-vs-2022 variations of every row of ``df_values`` (indexed by 'Variable')."""
+    # Differences of the published decimals, not of their float32 approximations
+    df_values = schema.decimal_frame(df_values[list(SCENARIO_COLUMNS.values())])
+    return pd.DataFrame({
+        'Variación Optimista': df_values[SCENARIO_COLUMNS['optimista']] - df_values[SCENARIO_COLUMNS['2022']],
+        'Variación Restrictiva': df_values[SCENARIO_COLUMNS['restrictivo']] - df_values[SCENARIO_COLUMNS['2022']],
+    }).dropna().round(VARIATION_DECIMALS)
+
+
+def poverty_summary(store, variable=POBREZA, **simulation_options):
+    """Values, variations and simulated P5-P95 interval of one variable.
+
+    ``simulation_options`` go to ``montecarlo.simulate`` (e.g. ``distribution``).
+    """
+    values = scenario_values(store, variable)
+    simulation = simulate(store, **simulation_options)
+    low, high = simulation.band(variable)
+    return {
+        'values': values,
+        'variations': variations(values),
+        'interval': (low, high),
+        'interval_width': high - low,
+        'simulation': simulation,
+        'fan': simulation.fan(variable, values['2022']),
+    }
+
+
+def forecast_accuracy(entidad=NACIONAL):
+    """Backtest accuracy (``backtesting.accuracy``) of the nation or a state.
+
+    None unless ``ENOE_CACHE_DIR`` holds a history long enough to backtest.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    import backtesting
+    import breakdowns
+
+    results = backtesting.backtest(cache_dir, os.environ.get(QUARTER_ENV))
+    dimension = breakdowns.NACIONAL if entidad == NACIONAL else breakdowns.ENTIDAD
+    table = backtesting.accuracy(results, dimension, entidad)
+    return table if len(table) else None
+
+
+def household_table(entidad=NACIONAL):
+    """``microsim.HouseholdTable`` of the cached quarter for the nation or a state.
+
+    None without ``ENOE_CACHE_DIR``: the simulation needs household microdata.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    import microsim
+
+    return microsim.household_table(cache_dir, os.environ.get(QUARTER_ENV), None if entidad == NACIONAL else entidad)
+
+
+def monthly_income_poverty(entidad=NACIONAL):
+    """Monthly income-poverty series (``poverty_lines.monthly_series``) of the nation or a state.
+
+    None without ``ENOE_CACHE_DIR`` or without a monthly poverty-line series.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    import poverty_lines
+
+    path = poverty_lines.lines_path(cache_dir)
+    if path is None:
+        return None
+    return poverty_lines.monthly_series(
+        cache_dir, poverty_lines.read_lines(path), None if entidad == NACIONAL else entidad, os.environ.get(QUARTER_ENV)
+    )
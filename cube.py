@@ -0,0 +1,239 @@
+"""Pre-aggregated indicator cube: quarter x state x sex x age group x indicator.
+
+Every cached quarter is reduced once to its cell totals
+(``breakdowns.cell_totals``): the weighted numerator and denominator of each
+indicator per state, sex and age-group cell, a few thousand numbers. The cube
+stacks those blocks along a quarter axis into two dense arrays, and every axis
+is dictionary-encoded (label -> position), so a slice is plain array
+indexing and a roll-up is a sum over axes followed by one division; no
+DataFrame is filtered. Rates of a roll-up are ratios of the summed totals, so
+a year is the weighted rate over its quarters, not the mean of quarterly
+rates.
+
+The block of a quarter is kept in memory and on disk next to the columnar
+cache, keyed by the quarter's hash; when a quarter is added only its block is
+computed, and the cube is restacked from the blocks already there.
+
+Usage:
+    python cube.py --cache-dir cache/ --entidad Jalisco --sexo Mujer
+    python cube.py --cache-dir cache/ --year 2022 --variable "Rezago educativo"
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import enoe_cache
+import schema
+from breakdowns import (
+    AGE_GROUPS,
+    BREAKDOWN_COLUMNS,
+    EDAD,
+    ENTIDAD,
+    INDEX_COLUMNS,
+    NACIONAL,
+    SEXO,
+    cell_totals,
+)
+
+TRIMESTRE = 'Trimestre'
+VARIABLE = 'Variable'
+AXES = [TRIMESTRE, ENTIDAD, SEXO, EDAD, VARIABLE]
+EDAD_NO_ESPECIFICADA = 'No especificada'
+# Breakdown dimension -> argument of ``IndicatorCube.totals``
+_ARGUMENTS = {ENTIDAD: 'entidad', SEXO: 'sexo', EDAD: 'edad'}
+
+_blocks = {}
+_cubes = {}
+_cubes_lock = threading.Lock()
+schema.register('cube', _cubes, _cubes_lock)
+schema.register('cube (trimestres)', _blocks, _cubes_lock)
+
+
+class IndicatorCube:
+    """Weighted numerators and denominators with dictionary-encoded axes."""
+
+    def __init__(self, quarters, numerators, denominators, variables):
+        self.labels = {
+            TRIMESTRE: list(quarters),
+            ENTIDAD: list(enoe_cache.ENTIDADES),
+            SEXO: list(enoe_cache.CATEGORIES['sex'].values()),
+            EDAD: [label for _, label in AGE_GROUPS] + [EDAD_NO_ESPECIFICADA],
+            VARIABLE: list(variables),
+        }
+        self.codes = {axis: {label: i for i, label in enumerate(labels)} for axis, labels in self.labels.items()}
+        self.numerators = numerators
+        self.denominators = denominators
+
+    @property
+    def nbytes(self) -> int:
+        return self.numerators.nbytes + self.denominators.nbytes
+
+    @property
+    def quarters(self) -> list:
+        return self.labels[TRIMESTRE]
+
+    def _positions(self, axis, selection):
+        """Position (int) or positions (array) of the selected labels of an axis."""
+        codes = self.codes[axis]
+        if axis == TRIMESTRE and isinstance(selection, int):
+            # A year selects its quarters
+            selection = [q for q in self.quarters if q.startswith(f"{selection}T")]
+        if isinstance(selection, (list, tuple)):
+            return np.array([codes[label] for label in selection], dtype=np.intp)
+        return codes[selection]
+
+    def totals(self, trimestre=None, entidad=None, sexo=None, edad=None, variable=None):
+        """Numerators and denominators of a slice.
+
+        Each argument is a label (the axis is dropped), a list of labels (the
+        axis is kept in that order) or None (the axis is summed away; for
+        ``variable``, every indicator is kept, as indicators do not add up).
+        ``trimestre`` also takes a year, which sums its quarters, and
+        ``entidad=NACIONAL`` rolls the states up.
+        """
+        if entidad == NACIONAL:
+            entidad = None
+        if variable is None:
+            variable = self.labels[VARIABLE]
+        selection = dict(zip(AXES, (trimestre, entidad, sexo, edad, variable)))
+        if isinstance(trimestre, int):
+            # Sum the year's quarters like a roll-up
+            numerators, denominators = self._take(TRIMESTRE, self._positions(TRIMESTRE, trimestre))
+            selection[TRIMESTRE] = None
+        else:
+            numerators, denominators = self.numerators, self.denominators
+
+        # Labels first (views), then lists, then the roll-ups
+        index = tuple(
+            self._positions(axis, value) if value is not None and not isinstance(value, (list, tuple)) else slice(None)
+            for axis, value in selection.items()
+        )
+        numerators, denominators = numerators[index], denominators[index]
+        kept = [axis for axis, value in selection.items() if value is None or isinstance(value, (list, tuple))]
+        for position, axis in enumerate(kept):
+            if selection[axis] is not None:
+                positions = self._positions(axis, selection[axis])
+                numerators = numerators.take(positions, axis=position)
+                denominators = denominators.take(positions, axis=position)
+        summed = tuple(position for position, axis in enumerate(kept) if selection[axis] is None)
+        return numerators.sum(axis=summed), denominators.sum(axis=summed)
+
+    def _take(self, axis, positions):
+        position = AXES.index(axis)
+        return self.numerators.take(positions, axis=position), self.denominators.take(positions, axis=position)
+
+    def values(self, trimestre=None, entidad=None, sexo=None, edad=None, variable=None):
+        """Rates (%) of a slice, NaN where nobody was measured; see ``totals``."""
+        numerators, denominators = self.totals(trimestre, entidad, sexo, edad, variable)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(denominators > 0, numerators / denominators * 100, np.nan)
+
+    def group_table(self, dimension, group, quarter=None):
+        """Indicator table (``Variable``, ``Valor (%)``) of one breakdown group and quarter."""
+        quarter = quarter or self.quarters[-1]
+        selection = {} if dimension == NACIONAL else {_ARGUMENTS[dimension]: group}
+        values = self.values(trimestre=quarter, **selection)
+        return pd.DataFrame({VARIABLE: self.labels[VARIABLE], 'Valor (%)': values.round(1)})
+
+    def history(self):
+        """Wide table of every breakdown series (rows) by cached quarter (columns).
+
+        Same series and rounding as ``breakdowns.breakdowns``.
+        """
+        variables = self.labels[VARIABLE]
+        parts = []
+        # (dimension, axis kept); unspecified ages have no group of their own
+        for dimension, axis in ((NACIONAL, None), (ENTIDAD, ENTIDAD), (SEXO, SEXO), (EDAD, EDAD)):
+            groups = [NACIONAL] if axis is None else self.labels[axis]
+            if axis == EDAD:
+                groups = groups[:-1]
+            kept = {} if axis is None else {_ARGUMENTS[axis]: groups}
+            # (quarters, groups, variables)
+            values = self.values(trimestre=self.quarters, **kept).reshape(
+                len(self.quarters), len(groups), len(variables))
+            index = pd.MultiIndex.from_arrays(
+                [[dimension] * (len(groups) * len(variables)), np.repeat(groups, len(variables)),
+                 np.tile(variables, len(groups))],
+                names=INDEX_COLUMNS,
+            )
+            parts.append(pd.DataFrame(values.reshape(len(self.quarters), -1).T.round(1),
+                                      index=index, columns=self.quarters))
+        return pd.concat(parts).sort_index()
+
+
+def quarter_cells(cache_dir, quarter):
+    """``(numerators, denominators, variables)`` of a cached quarter, kept in memory and on disk."""
+    entry = enoe_cache.read_manifest(cache_dir)['quarters'][quarter]
+    key = (cache_dir, quarter, entry['sha256'])
+    if key in _blocks:
+        return _blocks[key]
+
+    path = os.path.join(cache_dir, f"cubo_{quarter}_{entry['sha256'][:12]}.npz")
+    if os.path.exists(path):
+        with np.load(path) as block:
+            cells = block['numerators'], block['denominators'], block['variables'].tolist()
+    else:
+        cells = cell_totals(enoe_cache.load_quarter(cache_dir, quarter, BREAKDOWN_COLUMNS))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, numerators=cells[0], denominators=cells[1], variables=np.array(cells[2]))
+        os.replace(tmp_path, path)
+    _blocks[key] = cells
+    return cells
+
+
+def cube(cache_dir, quarter=None):
+    """Cube of the cached quarters up to ``quarter`` (default: all), built once per set of quarters."""
+    manifest_quarters = enoe_cache.read_manifest(cache_dir)['quarters']
+    # 'YYYYTn' labels sort chronologically
+    quarters = sorted(q for q in manifest_quarters if quarter is None or q <= quarter)
+    key = (cache_dir, tuple((q, manifest_quarters[q]['sha256']) for q in quarters))
+    if key in _cubes:
+        return _cubes[key]
+
+    with _cubes_lock:
+        if key not in _cubes:
+            blocks = [quarter_cells(cache_dir, q) for q in quarters]
+            variables = blocks[0][2]
+            if any(block[2] != variables for block in blocks):
+                raise ValueError("Los trimestres del caché no miden los mismos indicadores")
+            _cubes[key] = IndicatorCube(
+                quarters,
+                np.stack([block[0] for block in blocks]),
+                np.stack([block[1] for block in blocks]),
+                variables,
+            )
+        indicator_cube = _cubes[key]
+    schema.enforce_budget()
+    return indicator_cube
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cubo de indicadores por trimestre, entidad, sexo y edad.")
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--quarter', help="Trimestre a consultar (por omisión, el más reciente)")
+    parser.add_argument('--year', type=int, help="Acumular los trimestres de un año")
+    parser.add_argument('--entidad')
+    parser.add_argument('--sexo')
+    parser.add_argument('--edad')
+    parser.add_argument('--variable')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    indicator_cube = cube(args.cache_dir)
+    built = time.perf_counter() - start
+    trimestre = args.year if args.year is not None else args.quarter or indicator_cube.quarters[-1]
+    variables = [args.variable] if args.variable else indicator_cube.labels[VARIABLE]
+    start = time.perf_counter()
+    values = indicator_cube.values(trimestre, args.entidad, args.sexo, args.edad, variables)
+    sliced = time.perf_counter() - start
+    print(pd.Series(values, index=pd.Index(variables, name=VARIABLE), name='Valor (%)').round(1).to_string())
+    print(f"{len(indicator_cube.quarters)} trimestres en {built:.2f} s, consulta en {sliced * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""Columnar on-disk cache of ingested ENOE quarters.
+
+Each quarter's person frame (see ``enoe_ingest.person_frame``) is stored as an
+uncompressed Arrow IPC file with downcast dtypes: int8 category codes for
+state and sex, int8 carencia flags (null where not measured), float32
+measures. Readers memory-map the file and only materialize the columns they
+ask for, so a cached quarter loads without parsing.
+
+``manifest.json`` records, per quarter, the sha256 of every source file and of
+the cache file, the schema and the carencias that were not measured. A
+quarter is only re-ingested when one of its source hashes changes. Quarters
+may be ingested by several processes at once (``pipeline``): entries are
+added under a file lock, so none is lost.
+
+Usage:
+    python enoe_cache.py build --sdem SDEMT122.csv --year 2022 --quarter 2022T1 --cache-dir cache/
+    python enoe_cache.py load --quarter 2022T1 --cache-dir cache/
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are serialized
+    fcntl = None
+
+from enoe_ingest import CARENCIA_COLUMNS, EXTRA_CARENCIA_COLUMNS, IndicatorAccumulator, iter_person_frames
+from schema import CARENCIA_NO_MEDIDA
+
+MANIFEST_NAME = 'manifest.json'
+CACHE_FORMAT = 1
+
+# Only what the df_full indicators need; everything else stays on disk
+INDICATOR_COLUMNS = ['fac', 'urbano', 'ingreso_pc'] + CARENCIA_COLUMNS
+
+# Category codes stored as int8; labels live in the manifest
+ENTIDADES = [
+    'Aguascalientes', 'Baja California', 'Baja California Sur', 'Campeche',
+    'Coahuila', 'Colima', 'Chiapas', 'Chihuahua', 'Ciudad de México', 'Durango',
+    'Guanajuato', 'Guerrero', 'Hidalgo', 'Jalisco', 'México', 'Michoacán',
+    'Morelos', 'Nayarit', 'Nuevo León', 'Oaxaca', 'Puebla', 'Querétaro',
+    'Quintana Roo', 'San Luis Potosí', 'Sinaloa', 'Sonora', 'Tabasco',
+    'Tamaulipas', 'Tlaxcala', 'Veracruz', 'Yucatán', 'Zacatecas',
+]
+CATEGORIES = {
+    'ent': dict(enumerate(ENTIDADES, start=1)),
+    'sex': {1: 'Hombre', 2: 'Mujer'},
+}
+
+_manifest_lock = threading.Lock()
+
+
+def file_hash(path, block_size=2**20):
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'format': CACHE_FORMAT, 'quarters': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(cache_dir, manifest):
+    # Write-then-rename so concurrent readers never see a partial manifest
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def _manifest_locked(cache_dir):
+    """Hold the manifest against other threads and processes during a read-modify-write."""
+    with _manifest_lock, open(os.path.join(cache_dir, f"{MANIFEST_NAME}.lock"), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _smallest_int(values):
+    """Smallest signed integer dtype holding ``values``."""
+    if len(values) == 0:
+        return np.int8
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+def compact_table(frame, missing_columns, schema=None):
+    """Arrow table with downcast dtypes; ``schema`` pins dtypes across chunks."""
+    arrays = {}
+    for column in frame.columns:
+        if column in missing_columns:
+            continue
+        values = frame[column].to_numpy()
+        if column in CARENCIA_COLUMNS:
+            mask = np.isnan(values)
+            arrays[column] = pa.array(np.where(mask, 0, values).astype(np.int8), mask=mask if mask.any() else None)
+        elif column in ('ent', 'sex', 'urbano'):
+            arrays[column] = pa.array(values.astype(np.int8))
+        elif values.dtype.kind == 'f':
+            arrays[column] = pa.array(values.astype(np.float32))
+        else:
+            arrays[column] = pa.array(values.astype(_smallest_int(values)))
+    table = pa.table(arrays)
+    if schema is not None:
+        table = table.cast(schema)
+    return table
+
+
+def cache_path(cache_dir, quarter):
+    return os.path.join(cache_dir, f"enoe_{quarter}.arrow")
+
+
+def build_quarter(sdem_path, year, quarter, cache_dir, extra_tables=(), memory_budget_mb=256, force=False):
+    """Ingest a quarter into the cache unless its sources are unchanged.
+
+    Returns the manifest entry of the quarter.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    sources = [sdem_path] + [path for path, _, _ in extra_tables]
+    source_hashes = {os.path.basename(path): file_hash(path) for path in sources}
+    manifest = read_manifest(cache_dir)
+    entry = manifest['quarters'].get(quarter)
+    if (not force and entry is not None and entry['sources'] == source_hashes
+            and os.path.exists(cache_path(cache_dir, quarter))):
+        return entry
+
+    path = cache_path(cache_dir, quarter)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    missing_columns = None
+    schema = None
+    rows = 0
+    accumulator = IndicatorAccumulator()
+    provided = {column for _, columns, _ in extra_tables for column in columns}
+    try:
+        for frame in iter_person_frames(sdem_path, year, extra_tables, memory_budget_mb):
+            if missing_columns is None:
+                # Carencias no source measures. Extra tables may not match the
+                # households of a given chunk, so their columns count as
+                # measured whenever a table supplies them; ENOE's own flags
+                # depend only on the table's columns, the same in every chunk.
+                missing_columns = [
+                    c for c in CARENCIA_COLUMNS
+                    if c not in provided and (c in EXTRA_CARENCIA_COLUMNS or frame[c].isna().all())
+                ]
+            accumulator.add(frame)
+            table = compact_table(frame, missing_columns, schema)
+            if writer is None:
+                schema = _widen_schema(table.schema)
+                table = table.cast(schema)
+                writer = pa.ipc.new_file(tmp_path, schema)
+            writer.write_table(table)
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError(f"La tabla {sdem_path} no tiene registros en el universo")
+    os.replace(tmp_path, path)
+
+    indicators_path = os.path.join(cache_dir, f"indicadores_{quarter}.csv")
+    accumulator.table().to_csv(indicators_path, index=False)
+
+    entry = {
+        'year': year,
+        'file': os.path.basename(path),
+        'indicators': os.path.basename(indicators_path),
+        'sha256': file_hash(path),
+        'sources': source_hashes,
+        'rows': rows,
+        'schema': {field.name: str(field.type) for field in schema},
+        'categories': CATEGORIES,
+        'missing_columns': missing_columns,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    with _manifest_locked(cache_dir):
+        manifest = read_manifest(cache_dir)
+        manifest['quarters'][quarter] = entry
+        write_manifest(cache_dir, manifest)
+    return entry
+
+
+def _widen_schema(schema):
+    """Keep the first chunk's dtypes except for identifiers, which may grow."""
+    fields = []
+    for field in schema:
+        if field.name in ('hogar', 'upm', 'est_d'):
+            field = field.with_type(pa.int64() if field.name != 'est_d' else pa.int32())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def load_quarter(cache_dir, quarter, columns=None, verify=False):
+    """Memory-map a cached quarter and return ``columns`` as a DataFrame.
+
+    Numeric columns without nulls are zero-copy views over the mapped file.
+    Carencia flags stay int8, with ``CARENCIA_NO_MEDIDA`` where not measured
+    (also for carencias missing from the whole quarter), a quarter of the
+    memory of float32 NaN flags.
+    """
+    manifest = read_manifest(cache_dir)
+    entry = manifest['quarters'][quarter]
+    path = os.path.join(cache_dir, entry['file'])
+    if verify and file_hash(path) != entry['sha256']:
+        raise ValueError(f"El caché de {quarter} no coincide con su manifiesto")
+
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    wanted = table.column_names if columns is None else list(columns)
+    present = [c for c in wanted if c in table.column_names]
+    table = table.select(present)
+    for column in present:
+        if column in CARENCIA_COLUMNS:
+            index = table.column_names.index(column)
+            table = table.set_column(index, column, table.column(column).fill_null(CARENCIA_NO_MEDIDA))
+    frame = table.to_pandas(split_blocks=True)
+
+    for column in wanted:
+        if column in CARENCIA_COLUMNS and column not in frame:
+            frame[column] = np.full(len(frame), CARENCIA_NO_MEDIDA, dtype=np.int8)
+    return frame[wanted]
+
+
+def latest_quarter(cache_dir):
+    quarters = read_manifest(cache_dir)['quarters']
+    return max(quarters) if quarters else None
+
+
+def indicator_table(cache_dir, quarter=None):
+    """Indicator table of a cached quarter, reading only ``INDICATOR_COLUMNS``."""
+    quarter = quarter or latest_quarter(cache_dir)
+    accumulator = IndicatorAccumulator()
+    accumulator.add(load_quarter(cache_dir, quarter, INDICATOR_COLUMNS))
+    return accumulator.table()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Caché columnar de trimestres ENOE.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help="Ingresa un trimestre al caché")
+    build.add_argument('--sdem', required=True)
+    build.add_argument('--year', type=int, required=True)
+    build.add_argument('--quarter', required=True, help="Identificador, p. ej. 2022T1")
+    build.add_argument('--cache-dir', required=True)
+    build.add_argument('--budget-mb', type=int, default=256)
+    build.add_argument('--force', action='store_true')
+
+    load = subparsers.add_parser('load', help="Mide la carga en frío de un trimestre")
+    load.add_argument('--quarter')
+    load.add_argument('--cache-dir', required=True)
+
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    if args.command == 'build':
+        entry = build_quarter(args.sdem, args.year, args.quarter, args.cache_dir,
+                              memory_budget_mb=args.budget_mb, force=args.force)
+        print(f"{args.quarter}: {entry['rows']} personas, {time.perf_counter() - start:.2f} s")
+    else:
+        quarter = args.quarter or latest_quarter(args.cache_dir)
+        frame = load_quarter(args.cache_dir, quarter, INDICATOR_COLUMNS)
+        loaded = time.perf_counter() - start
+        table = indicator_table(args.cache_dir, quarter)
+        print(f"{quarter}: {len(frame)} personas cargadas en {loaded * 1000:.0f} ms, "
+              f"{len(table)} indicadores en {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
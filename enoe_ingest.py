@@ -0,0 +1,518 @@
+"""Streaming ingestion of ENOE-INEGI quarterly microdata into indicator tables.
+
+Reads SDEM (person) tables, plus optional COE1/COE2 or household tables, in
+bounded-memory chunks and computes the weighted percentage of every
+``Variable`` row of ``df_full`` using the expansion factor.
+
+Two passes are made over the person table:
+
+1. household pass: per-household income totals and sizes (bounded by the
+   number of households, not persons);
+2. person pass: carencia and income flags for each person, joined to the
+   household table with ``np.searchsorted``, accumulated as weighted sums.
+
+Each person's six carencias and two income-line flags are packed into one
+uint8 code (``encode_persons``). Carencias are counted with a popcount
+table, and every row of ``df_full`` is a 0/1 function of the code, so the
+weighted totals come from a 256-bin weight histogram per group. Alternative
+deprivation thresholds only recompute the 256-code flag table.
+
+ENOE does not ask about housing quality, basic services or food access. Those
+three carencias are read from extra tables when they are given (already as
+0/1 columns named like ``EXTRA_CARENCIA_COLUMNS``); otherwise they are left
+out of the carencia count and their rows are reported as missing (NaN).
+
+Usage:
+    python enoe_ingest.py --sdem SDEMT222.csv --year 2022 --out indicadores_2022.csv
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from indicator_store import (
+    BIENESTAR_ECONOMICO_VARIABLES,
+    CARENCIAS_VARIABLES,
+    FULL_DATA_RAW,
+)
+
+# Raw column aliases: canonical name -> names used across ENOE releases
+COLUMN_ALIASES = {
+    'fac': ['fac', 'fac_tri'],
+    't_loc': ['t_loc', 't_loc_tri'],
+    'est_d': ['est_d', 'est_d_tri'],
+}
+
+HOUSEHOLD_KEYS = ['cd_a', 'ent', 'con', 'v_sel', 'n_hog', 'h_mud']
+PERSON_KEYS = HOUSEHOLD_KEYS + ['n_ren']
+
+SDEM_COLUMNS = PERSON_KEYS + [
+    'r_def', 'c_res', 'sex', 'eda', 'anios_esc', 'cs_p17', 'imssissste',
+    'seg_soc', 'emp_ppal', 'ingocup', 'upm', 'fac', 't_loc', 'est_d',
+]
+# Columns that may be absent from a given release
+OPTIONAL_SDEM_COLUMNS = {'cs_p17', 'seg_soc', 'emp_ppal', 'upm', 'est_d'}
+
+# Codes from the SDEM codebook
+ENTREVISTA_COMPLETA = 0            # r_def
+RESIDENTES_HABITUALES = (1, 3)     # c_res
+SALUD_SIN_ACCESO = 4               # imssissste: no recibe atención médica
+SEG_SOC_SIN_ACCESO = 2             # seg_soc
+EMPLEO_INFORMAL = 1                # emp_ppal
+NO_ASISTE_ESCUELA = 2              # cs_p17
+ANIOS_ESC_NO_ESPECIFICADO = 99
+LOCALIDAD_RURAL = 4                # t_loc: menos de 2 500 habitantes
+
+# Monthly per-capita poverty lines (MXN), urban / rural
+LINEAS_POBREZA = {
+    'pobreza': {'urbano': 4158.35, 'rural': 2970.26},
+    'pobreza_extrema': {'urbano': 2086.21, 'rural': 1600.18},
+}
+
+CARENCIA_COLUMNS = ['car_educ', 'car_salud', 'car_segsoc', 'car_vivienda', 'car_servicios', 'car_alim']
+CARENCIA_BY_VARIABLE = dict(zip(CARENCIAS_VARIABLES, CARENCIA_COLUMNS))
+# Carencias ENOE does not measure; they must come from extra tables
+EXTRA_CARENCIA_COLUMNS = ['car_vivienda', 'car_servicios', 'car_alim']
+
+# One byte per person: the six carencias (bits 0-5, in CARENCIA_COLUMNS
+# order) and whether the income is below each poverty line (bits 6 and 7)
+CARENCIA_BITS = {column: 1 << k for k, column in enumerate(CARENCIA_COLUMNS)}
+CARENCIAS_MASK = 0b00111111
+BAJO_LP_BIT = 1 << 6
+BAJO_LPE_BIT = 1 << 7
+CODES = np.arange(256)
+POPCOUNT = np.array([bin(code).count('1') for code in CODES], dtype=np.uint8)
+# Above this many (group x code) bins, group totals gather per-person flags instead
+MAX_HISTOGRAM_BINS = 2**21
+
+# Rough parser cost per numeric cell; used to size chunks from the budget
+BYTES_PER_CELL = 32
+
+
+def pack_keys(df, keys):
+    """Pack ENOE key columns into a single int64 (sortable, joinable)."""
+    widths = {'cd_a': 1000, 'ent': 100, 'con': 100000, 'v_sel': 100, 'n_hog': 10, 'h_mud': 10, 'n_ren': 100}
+    packed = np.zeros(len(df), dtype=np.int64)
+    for key in keys:
+        packed = packed * widths[key] + df[key].to_numpy(dtype=np.int64)
+    return packed
+
+
+def chunk_rows(n_columns, memory_budget_mb):
+    """Rows per chunk so that one parsed chunk stays inside the budget."""
+    return max(10_000, int(memory_budget_mb * 2**20 // (n_columns * BYTES_PER_CELL)))
+
+
+def _resolve_columns(available, wanted, optional=()):
+    """Map canonical column names to the names present in a file."""
+    lower = {c.lower(): c for c in available}
+    resolved = {}
+    for name in wanted:
+        for alias in COLUMN_ALIASES.get(name, [name]):
+            if alias in lower:
+                resolved[lower[alias]] = name
+                break
+        else:
+            if name not in optional:
+                raise KeyError(f"Columna '{name}' no encontrada en la tabla ENOE")
+    return resolved
+
+
+def iter_table(path, columns, optional=(), chunksize=200_000):
+    """Yield chunks of ``columns`` from an ENOE CSV or DBF table.
+
+    Column names are matched case-insensitively and renamed to their canonical
+    name; optional columns that are absent are simply not returned.
+    """
+    if path.lower().endswith('.dbf'):
+        try:
+            from dbfread import DBF
+        except ImportError as exc:
+            raise ImportError("Leer tablas DBF requiere el paquete 'dbfread'") from exc
+        table = DBF(path, load=False, lowernames=True)
+        resolved = _resolve_columns(table.field_names, columns, optional)
+        batch = []
+        for record in table:
+            batch.append([record[raw] for raw in resolved])
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=list(resolved.values())).apply(pd.to_numeric, errors='coerce')
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=list(resolved.values())).apply(pd.to_numeric, errors='coerce')
+        return
+
+    header = pd.read_csv(path, nrows=0, encoding='latin-1').columns
+    resolved = _resolve_columns(header, columns, optional)
+    reader = pd.read_csv(
+        path,
+        usecols=list(resolved),
+        chunksize=chunksize,
+        encoding='latin-1',
+        na_values=[' ', ''],
+        low_memory=False,
+    )
+    for chunk in reader:
+        chunk = chunk.rename(columns=resolved)
+        yield chunk.apply(pd.to_numeric, errors='coerce')
+
+
+def _universe(chunk):
+    """Completed interviews of usual residents."""
+    return (chunk['r_def'] == ENTREVISTA_COMPLETA) & chunk['c_res'].isin(RESIDENTES_HABITUALES)
+
+
+def household_income(sdem_path, chunksize):
+    """First pass: per-household income total and size, as sorted arrays."""
+    columns = HOUSEHOLD_KEYS + ['r_def', 'c_res', 'ingocup']
+    partials = []
+    for chunk in iter_table(sdem_path, columns, chunksize=chunksize):
+        chunk = chunk[_universe(chunk)]
+        grouped = (
+            pd.DataFrame({
+                'hogar': pack_keys(chunk, HOUSEHOLD_KEYS),
+                'ingreso': chunk['ingocup'].fillna(0.0).to_numpy(dtype=np.float64),
+            })
+            .groupby('hogar', sort=False)['ingreso']
+            .agg(['sum', 'size'])
+        )
+        partials.append(grouped)
+        # Re-reduce so the partial list stays bounded by the household count
+        if len(partials) >= 8:
+            partials = [pd.concat(partials).groupby(level=0).sum()]
+    if not partials:
+        empty = np.array([], dtype=np.int64)
+        return empty, np.array([], dtype=np.float64)
+    households = pd.concat(partials).groupby(level=0).sum().sort_index()
+    return households.index.to_numpy(dtype=np.int64), (households['sum'] / households['size']).to_numpy()
+
+
+def load_extra_columns(path, columns, keys, chunksize):
+    """Load keyed 0/1 columns from an extra table as sorted lookup arrays."""
+    parts = []
+    for chunk in iter_table(path, keys + columns, chunksize=chunksize):
+        part = chunk[columns].astype(np.float32)
+        part.index = pack_keys(chunk, keys)
+        parts.append(part)
+    frame = pd.concat(parts)
+    frame = frame[~frame.index.duplicated()].sort_index()
+    return frame.index.to_numpy(dtype=np.int64), frame
+
+
+def _lookup(sorted_keys, values, keys, fill=np.nan):
+    """Vectorized left join of ``keys`` against sorted ``sorted_keys``."""
+    if len(sorted_keys) == 0:
+        return np.full(len(keys), fill)
+    pos = np.searchsorted(sorted_keys, keys)
+    pos = np.minimum(pos, len(sorted_keys) - 1)
+    found = sorted_keys[pos] == keys
+    return np.where(found, values[pos], fill)
+
+
+def person_frame(chunk, year, hh_keys, hh_income_pc, extras=()):
+    """Canonical person frame for one SDEM chunk (universe only).
+
+    Columns: hogar, ent, sex, eda, upm, est_d, fac, urbano, ingreso_pc and
+    the six ``car_*`` flags (float, NaN when the source does not measure it).
+    """
+    chunk = chunk[_universe(chunk)]
+    hogar = pack_keys(chunk, HOUSEHOLD_KEYS)
+    eda = chunk['eda'].to_numpy(dtype=np.float64)
+    anios_esc = chunk['anios_esc'].replace(ANIOS_ESC_NO_ESPECIFICADO, np.nan).to_numpy(dtype=np.float64)
+
+    # Rezago educativo: below the compulsory level of the person's cohort
+    # (secundaria if born in 1982 or later, primaria otherwise), or aged
+    # 3-15 and not attending school.
+    nacidos_1982 = (year - eda) >= 1982
+    norma = np.where(nacidos_1982, 9.0, 6.0)
+    car_educ = (eda >= 16) & (anios_esc < norma)
+    if 'cs_p17' in chunk:
+        car_educ |= (eda >= 3) & (eda <= 15) & (chunk['cs_p17'].to_numpy() == NO_ASISTE_ESCUELA)
+
+    car_salud = chunk['imssissste'].to_numpy() == SALUD_SIN_ACCESO
+    if 'seg_soc' in chunk:
+        car_segsoc = chunk['seg_soc'].to_numpy() == SEG_SOC_SIN_ACCESO
+    elif 'emp_ppal' in chunk:
+        car_segsoc = chunk['emp_ppal'].to_numpy() == EMPLEO_INFORMAL
+    else:
+        car_segsoc = np.full(len(chunk), np.nan)
+
+    frame = pd.DataFrame({
+        'hogar': hogar,
+        'ent': chunk['ent'].to_numpy(dtype=np.int8),
+        'sex': chunk['sex'].to_numpy(dtype=np.int8),
+        'eda': chunk['eda'].to_numpy(dtype=np.int16),
+        # Without 'upm' the (cd_a, ent, con) prefix of the key stands in as PSU
+        'upm': chunk['upm'].to_numpy(dtype=np.int64) if 'upm' in chunk else hogar // 10000,
+        'est_d': chunk['est_d'].fillna(0).to_numpy(dtype=np.int32) if 'est_d' in chunk else chunk['ent'].to_numpy(dtype=np.int32),
+        'fac': chunk['fac'].to_numpy(dtype=np.float32),
+        'urbano': chunk['t_loc'].to_numpy() != LOCALIDAD_RURAL,
+        'ingreso_pc': _lookup(hh_keys, hh_income_pc, hogar).astype(np.float32),
+        'car_educ': car_educ.astype(np.float32),
+        'car_salud': car_salud.astype(np.float32),
+        'car_segsoc': np.asarray(car_segsoc, dtype=np.float32),
+    })
+    for column in EXTRA_CARENCIA_COLUMNS:
+        frame[column] = np.float32(np.nan)
+    for sorted_keys, values, keys in extras:
+        lookup_keys = pack_keys(chunk, keys)
+        for column in values.columns:
+            frame[column] = _lookup(sorted_keys, values[column].to_numpy(), lookup_keys).astype(np.float32)
+    return frame
+
+
+def encode_persons(frame, lineas=LINEAS_POBREZA):
+    """Person code and known-carencia mask, both uint8.
+
+    The code holds a bit per carencia (set when the flag is 1) plus the two
+    income bits; the mask has a carencia's bit set when it was measured for
+    that person: not NaN in float flags, not negative in cached int8 ones.
+    """
+    codes = np.zeros(len(frame), dtype=np.uint8)
+    known = np.zeros(len(frame), dtype=np.uint8)
+    for k, column in enumerate(CARENCIA_COLUMNS):
+        values = frame[column].to_numpy()
+        codes |= (values == 1).view(np.uint8) << k
+        known |= (values >= 0).view(np.uint8) << k
+
+    urbano = frame['urbano'].to_numpy()
+    ingreso = frame['ingreso_pc'].to_numpy()
+    lp = np.where(urbano, lineas['pobreza']['urbano'], lineas['pobreza']['rural'])
+    lpe = np.where(urbano, lineas['pobreza_extrema']['urbano'], lineas['pobreza_extrema']['rural'])
+    codes |= (ingreso < lp).view(np.uint8) << 6
+    codes |= (ingreso < lpe).view(np.uint8) << 7
+    return codes, known
+
+
+def code_flags(count_mask=CARENCIAS_MASK, min_carencias=1, min_carencias_extrema=3):
+    """0/1 value of every non-carencia row of ``df_full`` for each of the 256 codes.
+
+    Only the carencias in ``count_mask`` are counted; ``min_carencias`` and
+    ``min_carencias_extrema`` are the deprivation thresholds of poverty and
+    extreme poverty (CONEVAL: 1 and 3).
+    """
+    n_carencias = POPCOUNT[CODES & count_mask]
+    bajo_lp = (CODES & BAJO_LP_BIT) > 0
+    bajo_lpe = (CODES & BAJO_LPE_BIT) > 0
+    con_carencias = n_carencias >= min_carencias
+
+    pobreza = bajo_lp & con_carencias
+    pobreza_extrema = bajo_lpe & (n_carencias >= min_carencias_extrema)
+    flags = {
+        'Población en pobreza': pobreza,
+        'Población en pobreza moderada': pobreza & ~pobreza_extrema,
+        'Población en pobreza extrema': pobreza_extrema,
+        'Población vulnerable por carencias sociales': ~bajo_lp & con_carencias,
+        'Población vulnerable por ingresos': bajo_lp & ~con_carencias,
+        'Población no pobre y no vulnerable': ~bajo_lp & ~con_carencias,
+        'Población con al menos una carencia social': n_carencias >= 1,
+        'Población con al menos tres carencias sociales': n_carencias >= 3,
+        BIENESTAR_ECONOMICO_VARIABLES[0]: bajo_lpe,
+        BIENESTAR_ECONOMICO_VARIABLES[1]: bajo_lp,
+    }
+    return {variable: flag.astype(np.float64) for variable, flag in flags.items()}
+
+
+# The four CONEVAL quadrants: everyone falls in exactly one
+QUADRANTS = [
+    'Población en pobreza',
+    'Población vulnerable por carencias sociales',
+    'Población vulnerable por ingresos',
+    'Población no pobre y no vulnerable',
+]
+
+
+def measured_carencias(known):
+    """Bits of the carencias measured for anyone; the others are left out of the count."""
+    return int(np.bitwise_or.reduce(known)) if len(known) else 0
+
+
+def indicator_flags(frame, lineas=LINEAS_POBREZA):
+    """0/1 float32 array per person for every data row of ``df_full``.
+
+    Carencias that are missing for the whole frame are excluded from the
+    carencia count; their own column is returned as NaN.
+    """
+    codes, known = encode_persons(frame, lineas)
+    flags = {
+        variable: values[codes].astype(np.float32)
+        for variable, values in code_flags(measured_carencias(known)).items()
+    }
+    for variable, column in CARENCIA_BY_VARIABLE.items():
+        bit = CARENCIA_BITS[column]
+        flags[variable] = np.where(known & bit, (codes & bit) > 0, np.nan).astype(np.float32)
+    return flags
+
+
+def _carencia_bits():
+    return np.column_stack([(CODES & CARENCIA_BITS[column]) > 0 for column in CARENCIA_BY_VARIABLE.values()])
+
+
+def code_histogram(frame, groups=None, n_groups=1, lineas=LINEAS_POBREZA):
+    """Expansion weight per (group, code) and per (group, known mask).
+
+    Returns ``(histogram, known_histogram, measured)``; the histograms have
+    shape (n_groups, 256). Every indicator, under any deprivation threshold,
+    can be derived from them with ``histogram_totals``.
+    """
+    codes, known = encode_persons(frame, lineas)
+    weights = frame['fac'].to_numpy(dtype=np.float64)
+    cells = 0 if groups is None else groups.astype(np.int64) * len(CODES)
+    size = n_groups * len(CODES)
+    histogram = np.bincount(cells + codes, weights=weights, minlength=size).reshape(n_groups, len(CODES))
+    known_histogram = np.bincount(cells + known, weights=weights, minlength=size).reshape(n_groups, len(CODES))
+    return histogram, known_histogram, measured_carencias(known)
+
+
+def histogram_totals(histogram, known_histogram, measured, count_mask=CARENCIAS_MASK, **thresholds):
+    """Numerators and denominators of every ``df_full`` row from code histograms.
+
+    Returns ``(numerators, denominators, variables)`` of shape (groups,
+    variables); ``thresholds`` go to ``code_flags``. Only 256 codes per group
+    are touched, so alternative thresholds cost a small matrix product.
+    """
+    flags = code_flags(count_mask & measured, **thresholds)
+    bits = _carencia_bits()
+    flag_table = np.column_stack(list(flags.values()) + [bits.astype(np.float64)])
+    totals = histogram.sum(axis=1)
+    denominators = np.column_stack([np.repeat(totals[:, None], len(flags), axis=1), known_histogram @ bits])
+    return histogram @ flag_table, denominators, list(flags) + list(CARENCIA_BY_VARIABLE)
+
+
+def group_totals(frame, groups=None, n_groups=1, lineas=LINEAS_POBREZA, **thresholds):
+    """Weighted numerators and denominators of every ``df_full`` row per group.
+
+    ``groups`` holds each person's group number (all in group 0 by default).
+    Persons are reduced to (group x code) histograms, so no per-person flag
+    array is materialized; with too many groups for a histogram (PSUs),
+    flags are gathered from the 256-code table one row at a time.
+    """
+    if n_groups * len(CODES) <= MAX_HISTOGRAM_BINS:
+        return histogram_totals(*code_histogram(frame, groups, n_groups, lineas), **thresholds)
+
+    codes, known = encode_persons(frame, lineas)
+    weights = frame['fac'].to_numpy(dtype=np.float64)
+    count_mask = thresholds.pop('count_mask', CARENCIAS_MASK)
+    flags = code_flags(count_mask & measured_carencias(known), **thresholds)
+    bits = _carencia_bits()
+    numerators = np.column_stack(
+        [np.bincount(groups, weights=weights * values[codes], minlength=n_groups) for values in flags.values()]
+        + [np.bincount(groups, weights=weights * bit[codes], minlength=n_groups) for bit in bits.T]
+    )
+    totals = np.bincount(groups, weights=weights, minlength=n_groups)
+    denominators = np.column_stack(
+        [np.repeat(totals[:, None], len(flags), axis=1)]
+        + [np.bincount(groups, weights=weights * bit[known], minlength=n_groups) for bit in bits.T]
+    )
+    return numerators, denominators, list(flags) + list(CARENCIA_BY_VARIABLE)
+
+
+class IndicatorAccumulator:
+    """Weighted numerators and denominators summed over chunks."""
+
+    def __init__(self):
+        self.numerators = None
+        self.denominators = None
+        self.rows = 0
+
+    def add(self, frame, lineas=LINEAS_POBREZA):
+        numerators, denominators, variables = group_totals(frame, lineas=lineas)
+        numerators = pd.Series(numerators[0], index=variables)
+        denominators = pd.Series(denominators[0], index=variables)
+        if self.numerators is None:
+            self.numerators, self.denominators = numerators, denominators
+        else:
+            self.numerators += numerators
+            self.denominators += denominators
+        self.rows += len(frame)
+
+    def table(self):
+        """Indicator table in ``df_full`` row order (data rows only)."""
+        if self.numerators is None:
+            raise ValueError("Sin registros: ningún bloque de personas llegó a los indicadores")
+        rows = [
+            (categoria, variable)
+            for categoria, variable in zip(FULL_DATA_RAW['Categoría'], FULL_DATA_RAW['Variable'])
+            if variable in self.numerators.index
+        ]
+        table = pd.DataFrame(rows, columns=['Categoría', 'Variable'])
+        numerators = self.numerators.reindex(table['Variable']).to_numpy()
+        denominators = self.denominators.reindex(table['Variable']).to_numpy()
+        table['Numerador'] = numerators
+        table['Denominador'] = denominators
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table['Valor (%)'] = np.where(denominators > 0, numerators / denominators * 100, np.nan).round(1)
+        return table
+
+
+def iter_person_frames(sdem_path, year, extra_tables=(), memory_budget_mb=256):
+    """Stream the canonical person frame of a quarter, chunk by chunk.
+
+    ``extra_tables`` is a sequence of ``(path, columns, keys)`` with keyed
+    0/1 carencia columns (e.g. from COE1/COE2 or a housing table).
+    """
+    chunksize = chunk_rows(len(SDEM_COLUMNS), memory_budget_mb)
+    hh_keys, hh_income_pc = household_income(sdem_path, chunksize)
+    extras = [
+        load_extra_columns(path, list(columns), list(keys), chunksize) + (list(keys),)
+        for path, columns, keys in extra_tables
+    ]
+    for chunk in iter_table(sdem_path, SDEM_COLUMNS, OPTIONAL_SDEM_COLUMNS, chunksize=chunksize):
+        yield person_frame(chunk, year, hh_keys, hh_income_pc, extras)
+
+
+def ingest_quarter(sdem_path, year, extra_tables=(), memory_budget_mb=256, lineas=LINEAS_POBREZA, person_sink=None):
+    """Compute the indicator table for one ENOE quarter.
+
+    ``person_sink``, if given, is called with every person frame (used to
+    write the columnar cache without a second parse of the CSV).
+    """
+    accumulator = IndicatorAccumulator()
+    for frame in iter_person_frames(sdem_path, year, extra_tables, memory_budget_mb):
+        accumulator.add(frame, lineas)
+        if person_sink is not None:
+            person_sink(frame)
+    return accumulator.table()
+
+
+def write_indicator_table(table, path):
+    """Write the pipeline output read by ``indicator_store``."""
+    if path.endswith('.parquet'):
+        table.to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False)
+
+
+def read_indicator_table(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def parse_extra(spec):
+    """``(path, columns, keys)`` of an extra table given as ``ruta:col1,col2[:llave1,llave2]``."""
+    path, columns, *keys = spec.split(':')
+    return path, columns.split(','), keys[0].split(',') if keys else PERSON_KEYS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcula los indicadores a partir de microdatos ENOE.")
+    parser.add_argument('--sdem', required=True, help="Tabla SDEM (CSV o DBF)")
+    parser.add_argument('--year', type=int, required=True, help="Año del trimestre")
+    parser.add_argument('--extra', action='append', default=[],
+                        help="Tabla con carencias adicionales: ruta:col1,col2[:llave1,llave2]")
+    parser.add_argument('--budget-mb', type=int, default=256, help="Memoria máxima por bloque (MB)")
+    parser.add_argument('--out', required=True, help="Archivo de salida (.csv o .parquet)")
+    args = parser.parse_args(argv)
+
+    extra_tables = [parse_extra(spec) for spec in args.extra]
+
+    start = time.perf_counter()
+    table = ingest_quarter(args.sdem, args.year, extra_tables, args.budget_mb)
+    write_indicator_table(table, args.out)
+    print(f"{os.path.basename(args.out)}: {len(table)} indicadores en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
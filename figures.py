@@ -0,0 +1,535 @@
+"""Figure builders shared by the apps.
+
+Builders are pure: they take the slice of ``df_full`` they plot and return a
+Plotly figure, without calling Streamlit. The ones decorated with
+``@memoized`` are cached in a bounded LRU keyed by a hash of their inputs
+(data slice, titles and theme), so reruns whose inputs did not change reuse
+the figure. Cached figures are shared between sessions: callers must not
+mutate them, and the ``with_real_*`` helpers copy before adding a trace.
+
+Figures that take longer to build than to parse back (``PERSIST_MIN_MS``)
+are also written as JSON to the ``result_store``, so other replicas and
+restarts load them instead of building them again.
+
+Plotly is imported inside the builders, so importing this module stays
+cheap and ``plotly.express`` is only loaded when a chart that needs it is
+first built.
+"""
+import functools
+import hashlib
+import math
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import result_store
+from core import SCENARIO_LABELS, variation_table
+from indicator_store import SCENARIO_COLUMNS
+
+# Scenario label -> (column in df_full, bar color) for the per-indicator bars
+INDICATOR_BAR_SCENARIOS = {
+    '2022': (SCENARIO_COLUMNS['2022'], '#1f77b4'),
+    '2024 (Optimista)': (SCENARIO_COLUMNS['optimista'], '#2ca02c'),
+    '2024 (Restrictivo)': (SCENARIO_COLUMNS['restrictivo'], '#d62728'),
+}
+
+REAL_LABEL = '2024 (Real)'
+
+# Colors per app: 'clasico' is Pronostico_pobreza.py, 'mejorado' improved_version.py
+THEMES = {
+    'clasico': {
+        'colors': {'2022': 'blue', '2024 (Optimista)': 'green', '2024 (Restrictivo)': 'red', REAL_LABEL: 'darkblue'},
+        'fills': {},
+        'fan': ('rgba(255, 0, 0, 0.15)', 'rgba(255, 0, 0, 0.3)', 'blue'),
+        'background': None,
+    },
+    'mejorado': {
+        'colors': {'2022': '#6366f1', '2024 (Optimista)': '#10b981', '2024 (Restrictivo)': '#ef4444', REAL_LABEL: '#1e3a8a'},
+        'fills': {
+            '2022': 'rgba(99, 102, 241, 0.3)',
+            '2024 (Optimista)': 'rgba(16, 185, 129, 0.3)',
+            '2024 (Restrictivo)': 'rgba(239, 68, 68, 0.3)',
+        },
+        'fan': ('rgba(239, 68, 68, 0.15)', 'rgba(239, 68, 68, 0.3)', '#6366f1'),
+        'background': 'rgba(0,0,0,0)',
+    },
+}
+
+PANEL_HEIGHT = 400
+
+# Bump when a builder draws something different from the same inputs
+FIGURES_VERSION = 1
+# Parsing a figure's JSON costs 15-25 ms; quicker builders are not persisted
+PERSIST_MIN_MS = 20
+
+
+class FigureCache:
+    """Thread-safe LRU of built figures with hit/miss counters."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._figures:
+                self.hits += 1
+                self._figures.move_to_end(key)
+                return self._figures[key]
+            self.misses += 1
+        figure = build()
+        with self._lock:
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+        return figure
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._figures), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.hits = self.misses = 0
+
+
+figure_cache = FigureCache()
+
+
+def _digest(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode())
+        digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            _digest(digest, key)
+            _digest(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            _digest(digest, item)
+    else:
+        digest.update(pickle.dumps(value))
+
+
+def data_hash(*values):
+    """Content hash of builder inputs (DataFrames, Series, dicts, scalars)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _digest(digest, value)
+    return digest.hexdigest()
+
+
+def _build_or_load(builder, digest, args, kwargs):
+    """Figure from the disk store, or built (and stored when it was slow to build)."""
+    store = result_store.default_store()
+    if store is None:
+        return builder(*args, **kwargs)
+    import plotly
+    import plotly.io as pio
+
+    key = f"{builder.__name__}:{digest}"
+    version = f"{FIGURES_VERSION}-{plotly.__version__}"
+    payload = store.get('figura', key, version)
+    if payload is not None:
+        return pio.from_json(payload.decode('utf-8'))
+    start = time.perf_counter()
+    figure = builder(*args, **kwargs)
+    if (time.perf_counter() - start) * 1000 >= PERSIST_MIN_MS:
+        store.put('figura', key, version, figure.to_json().encode('utf-8'))
+    return figure
+
+
+def memoized(builder):
+    """Cache ``builder``'s figure in ``figure_cache`` by a hash of its arguments."""
+    @functools.wraps(builder)
+    def wrapper(*args, **kwargs):
+        digest = data_hash(args, kwargs)
+        return figure_cache.get_or_build((builder.__name__, digest),
+                                         lambda: _build_or_load(builder, digest, args, kwargs))
+    return wrapper
+
+
+def cache_stats():
+    return figure_cache.stats()
+
+
+def _background(theme):
+    background = THEMES[theme]['background']
+    if background is None:
+        return {}
+    return {'plot_bgcolor': background, 'paper_bgcolor': background}
+
+
+@memoized
+def scenario_bar_figure(values, title, theme='clasico'):
+    """Bar per scenario; ``values`` maps scenario label -> value (%)."""
+    import plotly.express as px
+
+    df_bar = pd.DataFrame({'Escenario': list(values), 'Pobreza (%)': list(values.values())})
+    colors = THEMES[theme]['colors']
+
+    fig = px.bar(
+        df_bar,
+        x='Escenario',
+        y='Pobreza (%)',
+        color='Escenario',
+        color_discrete_map={label: colors[label] for label in values},
+        title=title,
+        text='Pobreza (%)'
+    )
+
+    # Force x-axis to be categorical
+    fig.update_xaxes(type='category')
+
+    fig.update_traces(
+        texttemplate='%{text:.1f}%',
+        textposition='outside'
+    )
+
+    fig.update_layout(
+        xaxis_title="Escenario",
+        yaxis_title="Pobreza (%)",
+        showlegend=True,
+        height=500,
+        **_background(theme)
+    )
+    return fig
+
+
+def with_real_bar(base, real_value, theme='clasico'):
+    """Copy of a cached scenario bar chart plus the '2024 (Real)' bar."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure(base)
+    fig.add_trace(go.Bar(
+        name=REAL_LABEL,
+        x=[REAL_LABEL],
+        y=[real_value],
+        text=[real_value],
+        marker_color=THEMES[theme]['colors'][REAL_LABEL],
+        legendgroup=REAL_LABEL,
+        offsetgroup=REAL_LABEL,
+        alignmentgroup='True',
+        texttemplate='%{text:.1f}%',
+        textposition='outside',
+    ))
+    return fig
+
+
+@memoized
+def radar_figure(df_carencias, title, theme='clasico', height=None):
+    """Radar of the scenario columns of ``df_carencias`` (indexed by 'Variable')."""
+    import plotly.graph_objects as go
+
+    colors = THEMES[theme]['colors']
+    fills = THEMES[theme]['fills']
+    theta = df_carencias.index.tolist()
+
+    fig = go.Figure()
+    # Add traces for each year/forecast
+    for label, column in SCENARIO_LABELS.items():
+        trace = dict(
+            r=df_carencias[column].tolist(),
+            theta=theta,
+            fill='toself',
+            name=label,
+            line_color=colors[label],
+        )
+        if label in fills:
+            trace['fillcolor'] = fills[label]
+        fig.add_trace(go.Scatterpolar(**trace))
+
+    layout = dict(
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, df_carencias[list(SCENARIO_LABELS.values())].max().max() * 1.1]  # Dynamic range
+            )),
+        showlegend=True,
+        title=title,
+        **_background(theme)
+    )
+    if height is not None:
+        layout['height'] = height
+    fig.update_layout(**layout)
+    return fig
+
+
+def with_real_radar(base, real_values, title, theme='clasico'):
+    """Copy of a cached radar plus the '2024 (Real)' trace.
+
+    ``real_values`` maps each carencia (in the radar's order) to its value.
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure(base)
+    theta = list(real_values)
+    fig.add_trace(go.Scatterpolar(
+        r=list(real_values.values()),
+        theta=theta,
+        fill='toself',
+        name=REAL_LABEL,
+        line_color=THEMES[theme]['colors'][REAL_LABEL],
+        line_width=3
+    ))
+    max_val = max(fig.layout.polar.radialaxis.range[1] / 1.1, max(real_values.values(), default=0))
+    fig.update_layout(
+        polar=dict(radialaxis=dict(range=[0, max_val * 1.1])),
+        title=title
+    )
+    return fig
+
+
+@memoized
+def fan_chart_figure(df_fan, title, theme='clasico', height=500):
+    """Percentile bands from ``SimulationResult.fan``."""
+    import plotly.graph_objects as go
+
+    outer, inner, median = THEMES[theme]['fan']
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=df_fan.index, y=df_fan['P95'], mode='lines', line_width=0, showlegend=False, hoverinfo='skip'
+    ))
+    fig.add_trace(go.Scatter(
+        x=df_fan.index, y=df_fan['P5'], mode='lines', line_width=0, fill='tonexty',
+        fillcolor=outer, name='P5 - P95'
+    ))
+    fig.add_trace(go.Scatter(
+        x=df_fan.index, y=df_fan['P75'], mode='lines', line_width=0, showlegend=False, hoverinfo='skip'
+    ))
+    fig.add_trace(go.Scatter(
+        x=df_fan.index, y=df_fan['P25'], mode='lines', line_width=0, fill='tonexty',
+        fillcolor=inner, name='P25 - P75'
+    ))
+    fig.add_trace(go.Scatter(
+        x=df_fan.index, y=df_fan['P50'], mode='lines+markers', line_color=median, name='Mediana'
+    ))
+
+    fig.update_xaxes(type='category')
+    fig.update_layout(
+        title=title,
+        xaxis_title="Año",
+        yaxis_title="Pobreza (%)",
+        height=height,
+        **_background(theme)
+    )
+    return fig
+
+
+@memoized
+def variation_heatmap_figure(df_values, theme='mejorado'):
+    """Heatmap of 2024-vs-2022 variations; ``df_values`` indexed by 'Variable'."""
+    import plotly.express as px
+
+    heatmap_data = variation_table(df_values)
+
+    fig = px.imshow(
+        heatmap_data.T,
+        title='Mapa de Calor: Variación 2024 vs 2022',
+        color_continuous_scale='RdYlGn_r',
+        aspect='auto'
+    )
+
+    fig.update_layout(
+        xaxis_title="Indicador",
+        yaxis_title="Escenario",
+        height=400,
+        **_background(theme)
+    )
+    return fig
+
+
+@memoized
+def shock_grid_figure(df_grid, variable, theme='mejorado'):
+    """Heatmap of one indicator over a grid of income shocks.
+
+    ``df_grid`` has one row per growth rate and one column per transfer
+    change; the index and column names label the axes.
+    """
+    import plotly.express as px
+
+    fig = px.imshow(
+        df_grid,
+        labels=dict(x=df_grid.columns.name, y=df_grid.index.name, color='%'),
+        title=f'{variable}: Rejilla de Choques al Ingreso',
+        color_continuous_scale='RdYlGn_r',
+        origin='lower',
+        aspect='auto',
+    )
+    fig.update_layout(height=450, **_background(theme))
+    return fig
+
+
+@memoized
+def monthly_income_poverty_figure(df_series, variables, estimated_column, theme='mejorado'):
+    """Lines of ``variables`` by month; months flagged in ``estimated_column`` are dashed.
+
+    ``df_series`` is indexed by month ('YYYY-MM').
+    """
+    import plotly.graph_objects as go
+
+    # Two series from the theme's palette: extreme line red, full line blue
+    colors = THEMES[theme]['colors']
+    palette = [colors['2024 (Restrictivo)'], colors['2022']]
+    estimated = df_series[estimated_column].to_numpy(dtype=bool)
+    # The dashed stretch starts at the last observed month so both connect
+    first_estimated = int(estimated.argmax()) if estimated.any() else len(estimated)
+    observed_months = df_series.index[:first_estimated]
+    estimated_months = df_series.index[max(first_estimated - 1, 0):]
+
+    fig = go.Figure()
+    for variable, color in zip(variables, palette):
+        label = _wrap_title(variable, 60)
+        fig.add_trace(go.Scatter(
+            x=observed_months, y=df_series.loc[observed_months, variable], mode='lines+markers',
+            line_color=color, name=label, legendgroup=variable,
+        ))
+        if estimated.any():
+            fig.add_trace(go.Scatter(
+                x=estimated_months, y=df_series.loc[estimated_months, variable], mode='lines',
+                line=dict(color=color, dash='dash'), name=f'{label} (estimado)', legendgroup=variable,
+            ))
+    fig.update_xaxes(type='category')
+    fig.update_layout(
+        title='Pobreza por Ingresos: Serie Mensual con Líneas de Pobreza Actualizadas',
+        xaxis_title="Mes",
+        yaxis_title="Población (%)",
+        height=450,
+        legend=dict(orientation='h', yanchor='top', y=-0.25, xanchor='left', x=0),
+        **_background(theme)
+    )
+    return fig
+
+
+@memoized
+def real_comparison_figure(df_rows, real_column, title, theme='clasico'):
+    """Horizontal grouped bars of every scenario plus the real value per indicator.
+
+    ``df_rows`` is indexed by 'Variable' and holds the scenario columns and
+    ``real_column``; indicators without a real value are left out.
+    """
+    import plotly.graph_objects as go
+
+    df_rows = df_rows.dropna(subset=[real_column])
+    colors = THEMES[theme]['colors']
+    labels = {**SCENARIO_LABELS, REAL_LABEL: real_column}
+    indicators = [_wrap_title(indicator, 60) for indicator in df_rows.index]
+
+    fig = go.Figure()
+    for label, column in labels.items():
+        fig.add_trace(go.Bar(
+            name=label,
+            y=indicators,
+            x=df_rows[column].tolist(),
+            orientation='h',
+            marker_color=colors[label],
+            texttemplate='%{x:.1f}%',
+            textposition='outside',
+        ))
+    fig.update_layout(
+        title=title,
+        barmode='group',
+        xaxis_title="Porcentaje (%)",
+        yaxis=dict(autorange='reversed'),
+        height=max(400, 110 * len(df_rows)),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        **_background(theme)
+    )
+    return fig
+
+
+def _wrap_title(text, width=40):
+    """Break long indicator names so subplot titles don't overlap."""
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}'.strip()
+    lines.append(line)
+    return '<br>'.join(lines)
+
+
+@memoized
+def category_bars_figure(df_rows, n_cols=3):
+    """One figure with a grouped-bar panel per indicator.
+
+    ``df_rows`` is indexed by 'Variable' and holds the scenario columns. Each
+    panel gets its own y-range (20% padding around its values) so small
+    differences stay visible; the legend is shared.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    indicators = df_rows.index.tolist()
+    n_cols = max(1, min(n_cols, len(indicators)))
+    n_rows = math.ceil(len(indicators) / n_cols)
+
+    fig = make_subplots(
+        rows=n_rows,
+        cols=n_cols,
+        subplot_titles=[_wrap_title(indicator) for indicator in indicators],
+        vertical_spacing=0.25 / n_rows,
+        horizontal_spacing=0.06,
+    )
+
+    for i, indicator in enumerate(indicators):
+        row, col = divmod(i, n_cols)
+        values = []
+        for name, (column, color) in INDICATOR_BAR_SCENARIOS.items():
+            value = df_rows.at[indicator, column]
+            values.append(value)
+            fig.add_trace(
+                go.Bar(
+                    name=name,
+                    x=[name],
+                    y=[value],
+                    marker_color=color,
+                    legendgroup=name,
+                    showlegend=(i == 0),
+                    texttemplate='%{y:.1f}%',
+                    textposition='outside',
+                ),
+                row=row + 1,
+                col=col + 1,
+            )
+
+        # Set y-axis range with more padding (20%) to accommodate bars and text labels
+        min_val = min(values)
+        max_val = max(values)
+        range_val = max_val - min_val
+        y_min = max(0, min_val - range_val * 0.20)
+        y_max = max_val + range_val * 0.20
+        if range_val == 0:
+            y_min, y_max = 0, max_val * 1.2 or 1
+        fig.update_yaxes(range=[y_min, y_max], row=row + 1, col=col + 1)
+
+    fig.update_xaxes(showticklabels=False)
+    fig.update_yaxes(title_text="Porcentaje (%)", col=1)
+    fig.update_annotations(font_size=12)
+    fig.update_layout(
+        height=PANEL_HEIGHT * n_rows,
+        barmode='group',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        margin=dict(t=80),
+    )
+    return fig
+
+
+def payload_size(fig):
+    """Bytes of the JSON Plotly sends to the browser for ``fig``."""
+    return len(fig.to_json().encode('utf-8'))
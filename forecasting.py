@@ -0,0 +1,291 @@
+"""2024 scenarios forecast from the quarterly ENOE history.
+
+Every series (one indicator of the nation, a state, a sex or an age group, as
+in ``breakdowns``, read from the ``cube``) gets a damped-trend exponential
+smoothing model (Holt's method, trend damped by ``DAMPING``) fitted to its
+cached quarters. The 2024
+scenarios are quantiles of the forecast distribution at ``TARGET_QUARTER``:
+the optimistic forecast is the favourable quantile (less poverty, more
+``Población no pobre y no vulnerable``) and the restrictive one the
+unfavourable quantile.
+
+The smoothing parameters are found by grid search, vectorized over series and
+candidate parameters, with series split in blocks over a process pool. The
+chosen parameters are kept in ``pronosticos_parametros.json``; on the next
+refresh (a new or re-ingested quarter) a series that was fitted before only
+searches a fine grid around its previous parameters. Forecasts are cached
+per set of quarter hashes, in memory and next to the columnar cache.
+
+Usage:
+    python forecasting.py --cache-dir cache/
+    python forecasting.py --cache-dir cache/ --target 2024T3 --workers 4 --cold
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import breakdowns
+import cube
+import enoe_cache
+from indicator_store import SCENARIO_COLUMNS
+from montecarlo import NO_POBRE
+
+# Bump when the model or the parameter search changes
+MODEL_VERSION = 1
+
+# ENIGH 2024, which CONEVAL measures poverty with, was collected Aug-Nov
+TARGET_QUARTER = '2024T3'
+# Quantiles of the forecast distribution read as the two scenarios
+OPTIMISTIC_QUANTILE = 0.2
+RESTRICTIVE_QUANTILE = 0.8
+# Indicators where a higher value is the favourable outcome
+FAVOURABLE_UP = {NO_POBRE}
+
+DAMPING = 0.9
+MIN_QUARTERS = 4
+# Coarse grid for series without previous parameters, then REFINE_ROUNDS
+# finer grids (REFINE_POINTS per axis) around the best point so far
+GRID = np.linspace(0.05, 0.95, 10)
+REFINE_POINTS = 5
+REFINE_ROUNDS = 3
+PARAM_BOUNDS = (0.01, 0.99)
+# Fewer series than this per worker are not worth a process
+MIN_BLOCK_SERIES = 256
+
+CENTRAL_COLUMN = 'Pronóstico central (%)'
+FORECAST_COLUMNS = [CENTRAL_COLUMN, SCENARIO_COLUMNS['optimista'], SCENARIO_COLUMNS['restrictivo']]
+PARAMS_NAME = 'pronosticos_parametros.json'
+
+_forecasts = {}
+_forecasts_lock = threading.Lock()
+
+
+def quarter_index(quarter):
+    """'2022T1' -> consecutive quarter number."""
+    year, q = quarter.split('T')
+    return int(year) * 4 + int(q) - 1
+
+
+def quarter_label(index):
+    return f"{index // 4}T{index % 4 + 1}"
+
+
+def history(cache_dir, quarter=None):
+    """Wide table of every breakdown series (rows) by quarter (columns).
+
+    Covers the cached quarters up to ``quarter`` (default: the latest); quarters
+    missing in between, such as the suspended 2020T2 survey, are NaN columns.
+    """
+    table = cube.cube(cache_dir, quarter).history()
+    span = range(quarter_index(table.columns[0]), quarter_index(table.columns[-1]) + 1)
+    return table.reindex(columns=[quarter_label(i) for i in span])
+
+
+def _smooth(y, alpha, beta, phi=DAMPING):
+    """Run the damped Holt recursion for every series and candidate.
+
+    ``y`` is (series, quarters); ``alpha`` and ``beta`` broadcast against
+    (series, candidates). Returns the sum of squared one-step errors, the
+    final level and trend, and the number of errors per series.
+    """
+    observed = ~np.isnan(y)
+    first = observed.argmax(axis=1)
+    shape = np.broadcast_shapes((len(y), 1), np.shape(alpha))
+    level = np.broadcast_to(y[np.arange(len(y)), first][:, None], shape).copy()
+    trend = np.zeros(shape)
+    sse = np.zeros(shape)
+    for t in range(y.shape[1]):
+        counts = (observed[:, t] & (t > first))[:, None]
+        pred = level + phi * trend
+        # Unobserved quarters carry the state forward without an error
+        error = np.where(counts, y[:, [t]] - pred, 0.0)
+        sse += error ** 2
+        level = pred + alpha * error
+        trend = phi * trend + alpha * beta * error
+    n_errors = (observed & (np.arange(y.shape[1]) > first[:, None])).sum(axis=1)
+    return sse, level, trend, n_errors
+
+
+def _fit_block(y, start):
+    """Best ``(alpha, beta)``, final state and residual sd of each series.
+
+    Rows of ``start`` that are NaN are searched on the coarse grid first;
+    the others are warm-started from their previous parameters.
+    """
+    params = start.copy()
+    cold = np.isnan(params[:, 0])
+    if cold.any():
+        alpha, beta = (grid.ravel()[None, :] for grid in np.meshgrid(GRID, GRID, indexing='ij'))
+        sse = _smooth(y[cold], alpha, beta)[0]
+        best = sse.argmin(axis=1)
+        params[cold] = np.column_stack([alpha[0, best], beta[0, best]])
+
+    step = GRID[1] - GRID[0]
+    offsets = np.linspace(-1, 1, REFINE_POINTS)
+    d_alpha, d_beta = (grid.ravel()[None, :] for grid in np.meshgrid(offsets, offsets, indexing='ij'))
+    for _ in range(REFINE_ROUNDS):
+        step /= 2
+        alpha = np.clip(params[:, [0]] + step * d_alpha, *PARAM_BOUNDS)
+        beta = np.clip(params[:, [1]] + step * d_beta, *PARAM_BOUNDS)
+        best = _smooth(y, alpha, beta)[0].argmin(axis=1)
+        rows = np.arange(len(y))
+        params = np.column_stack([alpha[rows, best], beta[rows, best]])
+
+    sse, level, trend, n_errors = _smooth(y, params[:, [0]], params[:, [1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma = np.sqrt(sse[:, 0] / n_errors)
+    return params, level[:, 0], trend[:, 0], sigma
+
+
+def fit(y, start=None, max_workers=None):
+    """Fit every row of ``y`` (series x quarters), in blocks over a process pool."""
+    if start is None:
+        start = np.full((len(y), 2), np.nan)
+    workers = max_workers or min(os.cpu_count() or 1, 8)
+    n_blocks = max(1, min(workers, len(y) // MIN_BLOCK_SERIES))
+    blocks = [block for block in np.array_split(np.arange(len(y)), n_blocks) if len(block)]
+    # No blocks when no series has enough quarters
+    if len(blocks) <= 1:
+        return _fit_block(y, start)
+    with ProcessPoolExecutor(max_workers=len(blocks)) as pool:
+        futures = [pool.submit(_fit_block, y[block], start[block]) for block in blocks]
+        results = [future.result() for future in futures]
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def _series_keys(index):
+    return ['|'.join(map(str, key)) for key in index]
+
+
+def scenario_forecasts(params, level, trend, sigma, horizons, favourable_up):
+    """Central, optimistic and restrictive forecasts (series x horizons), clipped to 0-100.
+
+    Mean and variance are those of the damped additive-error model:
+    ``sigma^2 (1 + sum_{j<h} c_j^2)`` with ``c_j = alpha (1 + beta phi_j)``.
+    """
+    horizons = np.asarray(horizons)
+    phi_j = np.cumsum(DAMPING ** np.arange(1, horizons.max() + 1))
+    alpha, beta = params[:, [0]], params[:, [1]]
+    central = level[:, None] + phi_j[horizons - 1] * trend[:, None]
+    c_squared = np.cumsum((alpha * (1 + beta * phi_j)) ** 2, axis=1)
+    cumulative = np.concatenate([np.zeros((len(params), 1)), c_squared], axis=1)
+    spread = sigma[:, None] * np.sqrt(1 + cumulative[:, horizons - 1])
+
+    low = central + NormalDist().inv_cdf(OPTIMISTIC_QUANTILE) * spread
+    high = central + NormalDist().inv_cdf(RESTRICTIVE_QUANTILE) * spread
+    up = np.asarray(favourable_up)[:, None]
+    return [values.clip(0, 100).round(1) for values in (central, np.where(up, high, low), np.where(up, low, high))]
+
+
+def fit_history(hist, previous=None, max_workers=None):
+    """Fit the series of ``hist`` with at least ``MIN_QUARTERS`` observations.
+
+    Returns ``(fitted, params, level, trend, sigma)``; ``fitted`` is the row
+    mask of ``hist`` the other arrays refer to.
+    """
+    y = hist.to_numpy(dtype=np.float64)
+    fitted = np.isfinite(y).sum(axis=1) >= MIN_QUARTERS
+    keys = np.array(_series_keys(hist.index))[fitted]
+    previous = previous or {}
+    start = np.array([previous.get(key, (np.nan, np.nan)) for key in keys], dtype=np.float64).reshape(-1, 2)
+    return (fitted, *fit(y[fitted], start, max_workers))
+
+
+def forecast_table(hist, target=TARGET_QUARTER, previous=None, max_workers=None):
+    """Central, optimistic and restrictive forecasts of every series at ``target``.
+
+    ``previous`` maps series keys to ``(alpha, beta)`` from an earlier fit.
+    Returns ``(table, params)``; series with fewer than ``MIN_QUARTERS``
+    observed quarters get NaN forecasts and no parameters.
+    """
+    horizon = quarter_index(target) - quarter_index(hist.columns[-1])
+    if horizon < 1:
+        raise ValueError(f"El historial ya llega a {hist.columns[-1]}; el objetivo {target} no es un pronóstico")
+    fitted, params, level, trend, sigma = fit_history(hist, previous, max_workers)
+    favourable_up = hist.index[fitted].get_level_values('Variable').isin(FAVOURABLE_UP)
+    forecasts = scenario_forecasts(params, level, trend, sigma, [horizon], favourable_up)
+
+    table = pd.DataFrame(np.nan, index=hist.index, columns=FORECAST_COLUMNS + ['alpha', 'beta'])
+    table.loc[fitted, FORECAST_COLUMNS] = np.column_stack([values[:, 0] for values in forecasts])
+    table.loc[fitted, ['alpha', 'beta']] = params.round(4)
+    table['Trimestres observados'] = hist.notna().sum(axis=1)
+    keys = np.array(_series_keys(hist.index))[fitted]
+    return table, dict(zip(keys, params.round(4).tolist()))
+
+
+def read_params(cache_dir):
+    path = os.path.join(cache_dir, PARAMS_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        stored = json.load(f)
+    return stored['params'] if stored.get('version') == MODEL_VERSION else {}
+
+
+def write_params(cache_dir, params):
+    path = os.path.join(cache_dir, PARAMS_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MODEL_VERSION, 'params': params}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def forecasts(cache_dir, quarter=None, target=TARGET_QUARTER, max_workers=None, cold=False):
+    """Forecast table of the cached history up to ``quarter``, computed once and kept on disk.
+
+    The on-disk result is tied to the sha256 of every quarter in the history,
+    so ingesting a quarter triggers a (warm-started) refit.
+    """
+    manifest_quarters = enoe_cache.read_manifest(cache_dir)['quarters']
+    quarter = quarter or max(manifest_quarters, key=quarter_index)
+    hashes = {q: entry['sha256'] for q, entry in manifest_quarters.items()
+              if quarter_index(q) <= quarter_index(quarter)}
+    payload = json.dumps([MODEL_VERSION, target, OPTIMISTIC_QUANTILE, RESTRICTIVE_QUANTILE, hashes], sort_keys=True)
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+    key = (cache_dir, digest)
+    if key in _forecasts and not cold:
+        return _forecasts[key]
+
+    path = os.path.join(cache_dir, f"pronosticos_{target}_{digest}.csv")
+    with _forecasts_lock:
+        if key not in _forecasts or cold:
+            if os.path.exists(path) and not cold:
+                table = pd.read_csv(path, index_col=breakdowns.INDEX_COLUMNS)
+            else:
+                previous = {} if cold else read_params(cache_dir)
+                table, params = forecast_table(history(cache_dir, quarter), target, previous, max_workers)
+                write_params(cache_dir, {**previous, **params})
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                table.to_csv(tmp_path)
+                os.replace(tmp_path, path)
+            _forecasts[key] = table
+    return _forecasts[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pronósticos 2024 a partir del historial trimestral ENOE.")
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--quarter', help="Último trimestre del historial (por omisión, el más reciente)")
+    parser.add_argument('--target', default=TARGET_QUARTER)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--cold', action='store_true', help="Ignorar los parámetros y pronósticos guardados")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table = forecasts(args.cache_dir, args.quarter, args.target, args.workers, args.cold)
+    elapsed = time.perf_counter() - start
+    print(table.loc[(breakdowns.NACIONAL, breakdowns.NACIONAL), FORECAST_COLUMNS].to_string())
+    fitted = table['alpha'].notna().sum()
+    print(f"{fitted} de {len(table)} series ajustadas en {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,35 @@
-import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
+import streamlit as st
+
+import profiling
+from core import (
+    POBREZA,
+    forecast_accuracy,
+    household_table,
+    monthly_income_poverty,
+    poverty_summary,
+    scenario_values,
+    variations,
+)
+from indicator_store import (
+    BIENESTAR_ECONOMICO_VARIABLES,
+    CARENCIAS_VARIABLES,
+    CATEGORIES,
+    NACIONAL,
+    STANDARD_ERROR_COLUMN,
+    entidades,
+    get_store,
+)
+from figures import (
+    category_bars_figure,
+    fan_chart_figure,
+    monthly_income_poverty_figure,
+    radar_figure,
+    scenario_bar_figure,
+    shock_grid_figure,
+    variation_heatmap_figure,
+)
+from montecarlo import BAJO_LP, DISTRIBUTIONS, POBREZA_EXTREMA
 
 def app():
     st.set_page_config(layout="wide", page_title="Simulador de Pobreza 2024 - Versión Mejorada")
@@ -78,127 +104,48 @@ def app():
     
     st.markdown('<h1 class="main-header">📊 Simulador de Pobreza 2024 - Análisis Avanzado</h1>', unsafe_allow_html=True)
 
-    # Data from the images
-    # Forecasts (2024)
-    optimistic_poverty_2024 = 12.2
-    restrictive_poverty_2024 = 15.1
-
-    # Previous Year Data (2022)
-    poverty_2022 = 16.0
-
-    # Data for social deprivations (carencias sociales)
-    # Organized into four main categories
-    full_data_raw = {
-        'Categoría': [
-            # POBREZA
-            'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA',
-            # PRIVACIÓN SOCIAL
-            'PRIVACIÓN SOCIAL', 'PRIVACIÓN SOCIAL', 'PRIVACIÓN SOCIAL',
-            # INDICADORES DE CARENCIA SOCIAL
-            'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL',
-            # BIENESTAR ECONÓMICO
-            'BIENESTAR ECONÓMICO', 'BIENESTAR ECONÓMICO', 'BIENESTAR ECONÓMICO'
-        ],
-        'Variable': [
-            # POBREZA
-            'Pobreza',
-            'Población en pobreza',
-            'Población en pobreza moderada',
-            'Población en pobreza extrema',
-            'Población vulnerable por carencias sociales',
-            'Población vulnerable por ingresos',
-            'Población no pobre y no vulnerable',
-            # PRIVACIÓN SOCIAL
-            'Privación social',
-            'Población con al menos una carencia social',
-            'Población con al menos tres carencias sociales',
-            # INDICADORES DE CARENCIA SOCIAL
-            'Indicadores de carencia social',
-            'Rezago educativo',
-            'Carencia por acceso a los servicios de salud',
-            'Carencia por acceso a la seguridad social',
-            'Carencia por calidad y espacios de la vivienda',
-            'Carencia por acceso a los servicios básicos de la vivienda',
-            'Carencia por acceso a la alimentación nutritiva y de calidad',
-            # BIENESTAR ECONÓMICO
-            'Bienestar económico',
-            'Población con ingreso inferior a la linea de pobreza extrema por ingresos',
-            'Población con ingreso inferior a la linea de pobreza por ingresos'
-        ],
-        'Valores 2022 (%)': [
-            # POBREZA
-            None, 16.0, 15.0, 1.1, 28.4, 9.6, 45.9,
-            # PRIVACIÓN SOCIAL
-            None, 44.5, 8.8,
-            # INDICADORES DE CARENCIA SOCIAL
-            None, 13.5, 22.8, 27.2, 3.2, 3.8, 11.7,
-            # BIENESTAR ECONÓMICO
-            None, 3.8, 25.7
-        ],
-        'Pronóstico optimista 2024 (%)': [
-            # POBREZA
-            None, 12.2, 11.5, 0.7, 34.6, 6.7, 46.6,
-            # PRIVACIÓN SOCIAL
-            None, 46.8, 6.1,
-            # INDICADORES DE CARENCIA SOCIAL
-            None, 13.7, 16.1, 27.2, 3.2, 3.8, 11.7,
-            # BIENESTAR ECONÓMICO
-            None, 2.8, 18.9
-        ],
-        'Pronóstico restrictivo 2024 (%)': [
-            # POBREZA
-            None, 15.1, 14.3, 0.8, 31.9, 8.6, 44.4,
-            # PRIVACIÓN SOCIAL
-            None, 47.0, 6.0,
-            # INDICADORES DE CARENCIA SOCIAL
-            None, 13.7, 16.2, 27.2, 3.2, 3.8, 11.7,
-            # BIENESTAR ECONÓMICO
-            None, 3.4, 23.7
-        ]
-    }
+    # No-op unless POBREZA_PROFILE=1 or ?perfil=1
+    profiler = start_profiler('app')
 
-    df_full = pd.DataFrame(full_data_raw)
-
-    # Define variables by category for easy access
-    carencias_variables = [
-        'Rezago educativo',
-        'Carencia por acceso a los servicios de salud',
-        'Carencia por acceso a la seguridad social',
-        'Carencia por calidad y espacios de la vivienda',
-        'Carencia por acceso a los servicios básicos de la vivienda',
-        'Carencia por acceso a la alimentación nutritiva y de calidad'
-    ]
-
-    pobreza_variables = [
-        'Población en pobreza',
-        'Población en pobreza moderada',
-        'Población en pobreza extrema',
-        'Población vulnerable por carencias sociales',
-        'Población vulnerable por ingresos',
-        'Población no pobre y no vulnerable'
-    ]
-    
-    privacion_social_variables = [
-        'Población con al menos una carencia social',
-        'Población con al menos tres carencias sociales'
-    ]
-    
-    bienestar_economico_variables = [
-        'Población con ingreso inferior a la linea de pobreza extrema por ingresos',
-        'Población con ingreso inferior a la linea de pobreza por ingresos'
-    ]
+    # Tables are built once per process and shared across reruns and sessions
+    with profiler.span('General', 'datos', 'tabla de indicadores'):
+        store = get_store()
+
+    carencias_variables = CARENCIAS_VARIABLES
 
     # --- TABS ---
-    tab1, tab2, tab3 = st.tabs([
+    tab1, tab2, tab3, tab4 = st.tabs([
         "📈 Dashboard Principal", 
         "🔍 Análisis Detallado", 
         "📊 Visualizaciones Avanzadas",
-     
+        "🧮 Microsimulación de Ingresos",
     ])
 
     with tab1:
         st.header("📊 Dashboard de Indicadores Clave")
         
+        # National store, or one built once per state
+        entidad = entidad_selector('entidad_dashboard')
+
+        # Joint scenarios between both forecasts, cached per process
+        distribution = st.selectbox(
+            "Distribución de los escenarios simulados entre pronósticos:",
+            DISTRIBUTIONS
+        )
+        # Values, variations and simulated interval come from the UI-free core
+        with profiler.span('Dashboard', 'datos', 'resumen y simulación'):
+            summary = poverty_summary(get_store(entidad=entidad), distribution=distribution)
+            poverty_values = summary['values']
+            simulation = summary['simulation']
+
+            # Forecasts (2024)
+            optimistic_poverty_2024 = poverty_values['2024 (Optimista)']
+            restrictive_poverty_2024 = poverty_values['2024 (Restrictivo)']
+
+            # Previous Year Data (2022)
+            poverty_2022 = poverty_values['2022']
+            poverty_p5_2024, poverty_p95_2024 = summary['interval']
+        
         # Key Metrics Row
         col1, col2, col3, col4 = st.columns(4)
         
@@ -212,7 +159,7 @@ def app():
             """, unsafe_allow_html=True)
         
         with col2:
-            variation_optimistic = optimistic_poverty_2024 - poverty_2022
+            variation_optimistic = summary['variations']['optimista']
             trend_icon = "📉" if variation_optimistic < 0 else "📈"
             st.markdown(f"""
             <div class="metric-card">
@@ -223,7 +170,7 @@ def app():
             """, unsafe_allow_html=True)
         
         with col3:
-            variation_restrictive = restrictive_poverty_2024 - poverty_2022
+            variation_restrictive = summary['variations']['restrictivo']
             trend_icon = "📉" if variation_restrictive < 0 else "📈"
             st.markdown(f"""
             <div class="metric-card">
@@ -234,298 +181,64 @@ def app():
             """, unsafe_allow_html=True)
         
         with col4:
-            confidence_interval = restrictive_poverty_2024 - optimistic_poverty_2024
+            confidence_interval = summary['interval_width']
             st.markdown(f"""
             <div class="metric-card">
                 <h3>Rango de Incertidumbre</h3>
                 <h2>{confidence_interval:.1f} pp</h2>
-                <p>Diferencia entre escenarios</p>
+                <p>Banda P5-P95: [{poverty_p5_2024:.1f}%, {poverty_p95_2024:.1f}%]</p>
             </div>
             """, unsafe_allow_html=True)
 
+        # Rolling-origin backtest of the forecasting engine, only with a quarterly history
+        with profiler.span('Dashboard', 'datos', 'precisión histórica'):
+            accuracy = forecast_accuracy(entidad)
+        if accuracy is not None and POBREZA in accuracy.index:
+            poverty_accuracy = accuracy.loc[POBREZA]
+            with st.expander(f"🎯 Precisión histórica de los pronósticos ({int(poverty_accuracy['Evaluaciones'])} comparaciones)"):
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Error absoluto medio", f"{poverty_accuracy['MAE central (pp)']:.2f} pp")
+                col2.metric("Sesgo", f"{poverty_accuracy['Sesgo central (pp)']:+.2f} pp")
+                col3.metric(
+                    "Cobertura de la banda",
+                    f"{poverty_accuracy['Cobertura de la banda (%)']:.0f}%",
+                    help=f"Nominal: {accuracy.attrs['nominal_coverage']:.0%}",
+                )
+                st.dataframe(accuracy.style.format(precision=2))
+
         st.markdown("---")
 
         # Main Chart
         st.subheader("📊 Evolución de la Pobreza: 2022 vs. Pronósticos 2024")
         
-        # Prepare data for bar chart
-        poverty_data_for_bar = {
-            'Escenario': ['2022', '2024 (Optimista)', '2024 (Restrictivo)'],
-            'Pobreza (%)': [poverty_2022, optimistic_poverty_2024, restrictive_poverty_2024]
-        }
-        df_poverty_bar = pd.DataFrame(poverty_data_for_bar)
-
-        # Create simple bar chart (like the working original version)
-        fig_poverty_bar = px.bar(
-            df_poverty_bar,
-            x='Escenario',
-            y='Pobreza (%)',
-            color='Escenario',
-            color_discrete_map={
-                '2022': '#6366f1',
-                '2024 (Optimista)': '#10b981',
-                '2024 (Restrictivo)': '#ef4444'
-            },
-            title='Evolución de la Pobreza en México',
-            text='Pobreza (%)'
-        )
+        # Built once per distinct input and reused across reruns
+        with profiler.span('Dashboard', 'figura', 'barras de pobreza'):
+            fig_poverty_bar = scenario_bar_figure(poverty_values, 'Evolución de la Pobreza en México', theme='mejorado')
         
-        # Force x-axis to be categorical (simple fix that worked before)
-        fig_poverty_bar.update_xaxes(type='category')
+        with profiler.span('Dashboard', 'render', 'barras de pobreza'):
+            st.plotly_chart(fig_poverty_bar, use_container_width=True)
+
+        # Fan chart from the simulated scenarios
+        st.subheader("🌀 Bandas de Incertidumbre Simuladas")
+        st.write(f"Percentiles de {simulation.config['n_draws']:,} escenarios conjuntos que respetan las identidades entre indicadores.")
         
-        # Update layout for better presentation
-        fig_poverty_bar.update_traces(
-            texttemplate='%{text:.1f}%',
-            textposition='outside'
-        )
+        with profiler.span('Dashboard', 'figura', 'abanico'):
+            fig_poverty_fan = fan_chart_figure(
+                summary['fan'], 'Población en Pobreza: Bandas de Escenarios Simulados 2024', theme='mejorado', height=450
+            )
         
-        # Simple layout without backgrounds
-        fig_poverty_bar.update_layout(
-            xaxis_title="Escenario",
-            yaxis_title="Pobreza (%)",
-            showlegend=True,
-            height=500,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
+        with profiler.span('Dashboard', 'render', 'abanico'):
+            st.plotly_chart(fig_poverty_fan, use_container_width=True)
         
-        st.plotly_chart(fig_poverty_bar, use_container_width=True)
+        with st.expander("Bandas simuladas para todos los indicadores"):
+            with profiler.span('Dashboard', 'render', 'tabla de bandas'):
+                st.dataframe(simulation.bands.style.format(precision=1))
 
         
     with tab2:
         st.header("🔍 Análisis Detallado por Categorías")
         
-        # Category selector
-        selected_category = st.selectbox(
-            "Selecciona una categoría para analizar:",
-            ['POBREZA', 'PRIVACIÓN SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'BIENESTAR ECONÓMICO']
-        )
-        
-        # Filter data for selected category
-        df_category = df_full[df_full['Categoría'] == selected_category].copy()
-        
-        # Remove None values for visualization
-        df_category_clean = df_category.dropna(subset=['Valores 2022 (%)', 'Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)'])
-        
-        if not df_category_clean.empty:
-            # Apply side-by-side visualization for all categories
-            st.subheader("📊 Gráficos Separados por Indicador")
-            st.write("Se muestran gráficos separados para cada indicador con escalas optimizadas para visualizar mejor las diferencias.")
-            
-            # Get all indicators for the selected category
-            indicators = df_category_clean['Variable'].tolist()
-            
-            # Create columns based on number of indicators
-            if len(indicators) == 1:
-                # Single indicator - use full width
-                col1, = st.columns(1)
-                cols = [col1]
-            elif len(indicators) == 2:
-                # Two indicators - side by side
-                col1, col2 = st.columns(2)
-                cols = [col1, col2]
-            elif len(indicators) == 3:
-                # Three indicators - three columns
-                col1, col2, col3 = st.columns(3)
-                cols = [col1, col2, col3]
-            elif len(indicators) == 4:
-                # Four indicators - 2x2 grid
-                col1, col2 = st.columns(2)
-                col3, col4 = st.columns(2)
-                cols = [col1, col2, col3, col4]
-            elif len(indicators) == 5:
-                # Five indicators - 3x2 grid
-                col1, col2, col3 = st.columns(3)
-                col4, col5 = st.columns(2)
-                cols = [col1, col2, col3, col4, col5]
-            elif len(indicators) == 6:
-                # Six indicators - 3x2 grid
-                col1, col2, col3 = st.columns(3)
-                col4, col5, col6 = st.columns(3)
-                cols = [col1, col2, col3, col4, col5, col6]
-            else:
-                # More than 6 indicators - use 3 columns
-                cols = st.columns(3)
-            
-            # Create graphs for each indicator
-            for i, indicator in enumerate(indicators):
-                if i < len(cols):
-                    with cols[i]:
-                        indicator_data = df_category_clean[df_category_clean['Variable'] == indicator]
-                        if not indicator_data.empty:
-                            row = indicator_data.iloc[0]
-                            
-                            # Create grouped bar chart for indicator
-                            fig = go.Figure()
-                            
-                            # Add bars for each scenario
-                            fig.add_trace(go.Bar(
-                                name='2022',
-                                x=[indicator],
-                                y=[row['Valores 2022 (%)']],
-                                marker_color='#1f77b4'
-                            ))
-                            fig.add_trace(go.Bar(
-                                name='2024 (Optimista)',
-                                x=[indicator],
-                                y=[row['Pronóstico optimista 2024 (%)']],
-                                marker_color='#2ca02c'
-                            ))
-                            fig.add_trace(go.Bar(
-                                name='2024 (Restrictivo)',
-                                x=[indicator],
-                                y=[row['Pronóstico restrictivo 2024 (%)']],
-                                marker_color='#d62728'
-                            ))
-                            
-                            # Calculate optimal y-axis range for better visualization
-                            values = [row['Valores 2022 (%)'], row['Pronóstico optimista 2024 (%)'], row['Pronóstico restrictivo 2024 (%)']]
-                            min_val = min(values)
-                            max_val = max(values)
-                            range_val = max_val - min_val
-                            
-                            # Set y-axis range with more padding (20%) to accommodate bars and text labels
-                            y_min = max(0, min_val - range_val * 0.20)
-                            y_max = max_val + range_val * 0.20
-                            
-                            fig.update_layout(
-                                title=f'{indicator}',
-                                xaxis_title="Indicador",
-                                yaxis_title="Porcentaje (%)",
-                                height=400,
-                                showlegend=(i == 0),  # Only show legend for first graph
-                                plot_bgcolor='rgba(0,0,0,0)',
-                                paper_bgcolor='rgba(0,0,0,0)',
-                                yaxis=dict(range=[y_min, y_max]),
-                                title_x=0.5,
-                                title_font_size=12,
-                                barmode='group'
-                            )
-                            
-                            # Add value labels on bars
-                            fig.update_traces(texttemplate='%{y:.1f}%', textposition='outside')
-                            
-                            st.plotly_chart(fig, use_container_width=True)
-                            
-                            # Add analysis text
-                            val_2022 = row['Valores 2022 (%)']
-                            val_opt = row['Pronóstico optimista 2024 (%)']
-                            val_res = row['Pronóstico restrictivo 2024 (%)']
-                            
-                            change_opt = val_opt - val_2022
-                            change_res = val_res - val_2022
-                            
-                            st.markdown(f"""
-                            <div class="insight-box">
-                            <h4>📈 Análisis</h4>
-                            <ul>
-                                <li><strong>2022:</strong> {val_2022:.1f}%</li>
-                                <li><strong>2024 (Optimista):</strong> {val_opt:.1f}% ({change_opt:+.1f} pp)</li>
-                                <li><strong>2024 (Restrictivo):</strong> {val_res:.1f}% ({change_res:+.1f} pp)</li>
-                            </ul>
-                            </div>
-                            """, unsafe_allow_html=True)
-            
-            # If there are more indicators than columns, create additional rows
-            if len(indicators) > 6:
-                remaining_indicators = indicators[6:]
-                for i in range(0, len(remaining_indicators), 3):
-                    batch = remaining_indicators[i:i+3]
-                    if len(batch) == 3:
-                        col1, col2, col3 = st.columns(3)
-                        cols_batch = [col1, col2, col3]
-                    elif len(batch) == 2:
-                        col1, col2 = st.columns(2)
-                        cols_batch = [col1, col2]
-                    else:
-                        col1, = st.columns(1)
-                        cols_batch = [col1]
-                    
-                    for j, indicator in enumerate(batch):
-                        if j < len(cols_batch):
-                            with cols_batch[j]:
-                                indicator_data = df_category_clean[df_category_clean['Variable'] == indicator]
-                                if not indicator_data.empty:
-                                    row = indicator_data.iloc[0]
-                                    
-                                    # Create grouped bar chart for indicator
-                                    fig = go.Figure()
-                                    
-                                    # Add bars for each scenario
-                                    fig.add_trace(go.Bar(
-                                        name='2022',
-                                        x=[indicator],
-                                        y=[row['Valores 2022 (%)']],
-                                        marker_color='#1f77b4'
-                                    ))
-                                    fig.add_trace(go.Bar(
-                                        name='2024 (Optimista)',
-                                        x=[indicator],
-                                        y=[row['Pronóstico optimista 2024 (%)']],
-                                        marker_color='#2ca02c'
-                                    ))
-                                    fig.add_trace(go.Bar(
-                                        name='2024 (Restrictivo)',
-                                        x=[indicator],
-                                        y=[row['Pronóstico restrictivo 2024 (%)']],
-                                        marker_color='#d62728'
-                                    ))
-                                    
-                                    # Calculate optimal y-axis range for better visualization
-                                    values = [row['Valores 2022 (%)'], row['Pronóstico optimista 2024 (%)'], row['Pronóstico restrictivo 2024 (%)']]
-                                    min_val = min(values)
-                                    max_val = max(values)
-                                    range_val = max_val - min_val
-                                    
-                                    # Set y-axis range with more padding (20%) to accommodate bars and text labels
-                                    y_min = max(0, min_val - range_val * 0.20)
-                                    y_max = max_val + range_val * 0.20
-                                    
-                                    fig.update_layout(
-                                        title=f'{indicator}',
-                                        xaxis_title="Indicador",
-                                        yaxis_title="Porcentaje (%)",
-                                        height=400,
-                                        showlegend=False,
-                                        plot_bgcolor='rgba(0,0,0,0)',
-                                        paper_bgcolor='rgba(0,0,0,0)',
-                                        yaxis=dict(range=[y_min, y_max]),
-                                        title_x=0.5,
-                                        title_font_size=12,
-                                        barmode='group'
-                                    )
-                                    
-                                    # Add value labels on bars
-                                    fig.update_traces(texttemplate='%{y:.1f}%', textposition='outside')
-                                    
-                                    st.plotly_chart(fig, use_container_width=True)
-                                    
-                                    # Add analysis text
-                                    val_2022 = row['Valores 2022 (%)']
-                                    val_opt = row['Pronóstico optimista 2024 (%)']
-                                    val_res = row['Pronóstico restrictivo 2024 (%)']
-                                    
-                                    change_opt = val_opt - val_2022
-                                    change_res = val_res - val_2022
-                                    
-                                    st.markdown(f"""
-                                    <div class="insight-box">
-                                    <h4>📈 Análisis</h4>
-                                    <ul>
-                                        <li><strong>2022:</strong> {val_2022:.1f}%</li>
-                                        <li><strong>2024 (Optimista):</strong> {val_opt:.1f}% ({change_opt:+.1f} pp)</li>
-                                        <li><strong>2024 (Restrictivo):</strong> {val_res:.1f}% ({change_res:+.1f} pp)</li>
-                                    </ul>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                    
-        # Show detailed table
-        st.subheader("📋 Datos Detallados")
-        st.dataframe(
-            df_category[['Variable', 'Valores 2022 (%)', 'Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)']]
-            .style.hide(axis="index")
-            .format(precision=1)
-        )
+        category_analysis()
 
     with tab3:
         st.header("📊 Visualizaciones Avanzadas")
@@ -534,84 +247,231 @@ def app():
         st.subheader("📊 Gráfico de Araña: Carencias Sociales")
         
         # Prepare data for radar chart
-        df_carencias = df_full[df_full['Variable'].isin(carencias_variables)].set_index('Variable')
+        with profiler.span('Visualizaciones', 'datos', 'carencias'):
+            df_carencias = store.variables(carencias_variables)
         
         # Create radar chart
-        fig_radar = go.Figure() 
-        
-        # Add traces for each scenario
-        fig_radar.add_trace(go.Scatterpolar(
-            r=df_carencias['Valores 2022 (%)'].tolist(),
-            theta=carencias_variables,
-            fill='toself',
-            name='2022',
-            line_color='#6366f1',
-            fillcolor='rgba(99, 102, 241, 0.3)'
-        ))
+        with profiler.span('Visualizaciones', 'figura', 'radar'):
+            fig_radar = radar_figure(
+                df_carencias, 'Comparativa de Carencias Sociales: 2022 vs. Pronósticos 2024', theme='mejorado', height=600
+            )
         
-        fig_radar.add_trace(go.Scatterpolar(
-            r=df_carencias['Pronóstico optimista 2024 (%)'].tolist(),
-            theta=carencias_variables,
-            fill='toself',
-            name='2024 (Optimista)',
-            line_color='#10b981',
-            fillcolor='rgba(16, 185, 129, 0.3)'
-        ))
+        with profiler.span('Visualizaciones', 'render', 'radar'):
+            st.plotly_chart(fig_radar, use_container_width=True)
         
-        fig_radar.add_trace(go.Scatterpolar(
-            r=df_carencias['Pronóstico restrictivo 2024 (%)'].tolist(),
-            theta=carencias_variables,
-            fill='toself',
-            name='2024 (Restrictivo)',
-            line_color='#ef4444',
-            fillcolor='rgba(239, 68, 68, 0.3)'
-        ))
+        # Heatmap
+        st.subheader("🔥 Mapa de Calor: Variación por Indicador")
         
-        # Simple layout without backgrounds
-        fig_radar.update_layout(
-            polar=dict(
-                radialaxis=dict(
-                    visible=True,
-                    range=[0, df_carencias[['Valores 2022 (%)', 'Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)']].max().max() * 1.1]
-                )
-            ),
-            showlegend=True,
-            title='Comparativa de Carencias Sociales: 2022 vs. Pronósticos 2024',
-            height=600,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
+        with profiler.span('Visualizaciones', 'datos', 'todos los indicadores'):
+            df_indicators = store.variables(store.indicator_variables)
+
+        # Variations are computed inside the (cached) builder
+        with profiler.span('Visualizaciones', 'figura', 'mapa de calor'):
+            fig_heatmap = variation_heatmap_figure(df_indicators)
         
-        st.plotly_chart(fig_radar, use_container_width=True)
+        with profiler.span('Visualizaciones', 'render', 'mapa de calor'):
+            st.plotly_chart(fig_heatmap, use_container_width=True)
+
+    with tab4:
+        st.header("🧮 Microsimulación de Choques al Ingreso")
+
+        income_shock_simulation()
+
+    profile_panel(profiler)
+
+
+def start_profiler(scope):
+    """Profiler for this rerun; its spans are no-ops unless profiling is on."""
+    active = profiling.enabled(st.query_params)
+    session = st.session_state.setdefault('perfil_sesion', profiling.new_id()) if active else None
+    return profiling.Profiler(active, scope, session)
+
+
+def profile_panel(profiler):
+    """Collapsible timing and memory breakdown of the rerun; writes the trace."""
+    table = profiler.finish()
+    if table is None:
+        return
+    total = table['Tiempo (ms)'].sum()
+    with st.expander(f"⏱️ Perfil de la ejecución ({profiler.scope}): {total:.0f} ms en secciones medidas"):
+        st.dataframe(profiling.phase_summary(table).style.format(precision=2))
+        st.dataframe(table, hide_index=True)
+        st.caption(f"Traza: {profiler.trace_path}")
+
+
+def entidad_selector(key):
+    """State selector, shown only when microdata breakdowns are available."""
+    options = entidades()
+    if not options:
+        return NACIONAL
+    return st.selectbox("Entidad federativa:", [NACIONAL] + options, key=key)
+
+
+@st.fragment
+def category_analysis():
+    """State and category selectors, charts and table of the 'Análisis Detallado' tab.
+
+    Runs as a fragment, so changing the state or category reruns only this
+    function.
+    """
+    profiler = start_profiler('categorías')
+    entidad = entidad_selector('entidad_categorias')
+
+    # Category selector
+    selected_category = st.selectbox(
+        "Selecciona una categoría para analizar:",
+        CATEGORIES
+    )
+    
+    with profiler.span('Análisis Detallado', 'datos', 'categoría'):
+        store = get_store(entidad=entidad)
+
+        # Indicator rows of the category for the table; its header row is metadata in store.headers
+        df_category = store.category(selected_category)
         
-        # Heatmap
-        st.subheader("🔥 Mapa de Calor: Variación por Indicador")
+        # Only rows with values are plotted
+        indicators = store.category_variables(selected_category)
+    
+    if indicators:
+        st.subheader("📊 Gráficos por Indicador")
+        st.write("Cada indicador tiene su propio panel con escala optimizada para visualizar mejor las diferencias.")
         
-        # Calculate variations
-        df_variations = df_full.copy()
-        df_variations['Variación Optimista'] = df_variations['Pronóstico optimista 2024 (%)'] - df_variations['Valores 2022 (%)']
-        df_variations['Variación Restrictiva'] = df_variations['Pronóstico restrictivo 2024 (%)'] - df_variations['Valores 2022 (%)']
+        with profiler.span('Análisis Detallado', 'datos', 'indicadores'):
+            df_indicators = store.variables(indicators)
         
-        # Create heatmap data
-        heatmap_data = df_variations.dropna(subset=['Variación Optimista', 'Variación Restrictiva'])[['Variable', 'Variación Optimista', 'Variación Restrictiva']].set_index('Variable')
+        # Whole category in one figure: one panel per indicator, shared legend
+        with profiler.span('Análisis Detallado', 'figura', 'paneles por indicador'):
+            fig_category = category_bars_figure(df_indicators)
+        with profiler.span('Análisis Detallado', 'render', 'paneles por indicador'):
+            st.plotly_chart(fig_category, use_container_width=True)
         
-        fig_heatmap = px.imshow(
-            heatmap_data.T,
-            title='Mapa de Calor: Variación 2024 vs 2022',
-            color_continuous_scale='RdYlGn_r',
-            aspect='auto'
+        # Analysis text, three indicators per row
+        with profiler.span('Análisis Detallado', 'render', 'tarjetas de análisis'):
+            for start in range(0, len(indicators), 3):
+                cols = st.columns(3)
+                for col, indicator in zip(cols, indicators[start:start + 3]):
+                    with col:
+                        values = scenario_values(store, indicator)
+                        val_2022 = values['2022']
+                        val_opt = values['2024 (Optimista)']
+                        val_res = values['2024 (Restrictivo)']
+                        
+                        change = variations(values)
+                        change_opt = change['optimista']
+                        change_res = change['restrictivo']
+                        
+                        st.markdown(f"""
+                        <div class="insight-box">
+                        <h4>📈 {indicator}</h4>
+                        <ul>
+                            <li><strong>2022:</strong> {val_2022:.1f}%</li>
+                            <li><strong>2024 (Optimista):</strong> {val_opt:.1f}% ({change_opt:+.1f} pp)</li>
+                            <li><strong>2024 (Restrictivo):</strong> {val_res:.1f}% ({change_res:+.1f} pp)</li>
+                        </ul>
+                        </div>
+                        """, unsafe_allow_html=True)
+                
+    # Income rows month by month, with the poverty lines updated by prices
+    if selected_category == 'BIENESTAR ECONÓMICO':
+        with profiler.span('Análisis Detallado', 'datos', 'serie mensual'):
+            monthly = monthly_income_poverty(entidad)
+        if monthly is not None:
+            from poverty_lines import ESTIMADO, TRIMESTRE_INGRESOS
+
+            st.subheader("📅 Serie Mensual de Pobreza por Ingresos")
+            with profiler.span('Análisis Detallado', 'figura', 'serie mensual'):
+                fig_monthly = monthly_income_poverty_figure(monthly, BIENESTAR_ECONOMICO_VARIABLES, ESTIMADO)
+            with profiler.span('Análisis Detallado', 'render', 'serie mensual'):
+                st.plotly_chart(fig_monthly, use_container_width=True)
+            if monthly[ESTIMADO].any():
+                st.caption(
+                    "Los tramos punteados son meses sin trimestre propio en el caché: mantienen los ingresos "
+                    f"del trimestre anterior más reciente ({TRIMESTRE_INGRESOS.lower()} en la tabla) y solo "
+                    "cambian las líneas de pobreza."
+                )
+            with st.expander("Serie mensual"):
+                st.dataframe(
+                    monthly[BIENESTAR_ECONOMICO_VARIABLES + [TRIMESTRE_INGRESOS, ESTIMADO]]
+                    .style.format(precision=2, subset=BIENESTAR_ECONOMICO_VARIABLES)
+                )
+
+    # Show detailed table, with bootstrap standard errors when computed from microdata
+    st.subheader("📋 Datos Detallados")
+    table_columns = ['Variable', 'Valores 2022 (%)', 'Pronóstico optimista 2024 (%)', 'Pronóstico restrictivo 2024 (%)']
+    if STANDARD_ERROR_COLUMN in df_category:
+        table_columns.insert(2, STANDARD_ERROR_COLUMN)
+    with profiler.span('Análisis Detallado', 'render', 'tabla detallada'):
+        st.dataframe(
+            df_category[table_columns]
+            .style.hide(axis="index")
+            .format(precision=1)
+            .format(precision=2, subset=[c for c in table_columns if c == STANDARD_ERROR_COLUMN])
         )
-        
-        fig_heatmap.update_layout(
-            xaxis_title="Indicador",
-            yaxis_title="Escenario",
-            height=400,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
+
+    if STANDARD_ERROR_COLUMN in df_category:
+        st.caption("Error estándar bootstrap (Rao-Wu) sobre estratos y UPM de la ENOE.")
+    profile_panel(profiler)
+
+
+@st.fragment
+def income_shock_simulation():
+    """Income-shock sliders and results; moving a slider reruns only this function."""
+    profiler = start_profiler('microsimulación')
+    entidad = entidad_selector('entidad_microsimulacion')
+
+    with profiler.span('Microsimulación', 'datos', 'tabla de hogares'):
+        households = household_table(entidad)
+    if households is None:
+        st.info("La microsimulación usa los microdatos de hogares de la ENOE: define ENOE_CACHE_DIR para activarla.")
+        profile_panel(profiler)
+        return
+
+    st.write(
+        f"Cada escenario reclasifica a los {households.n_households:,} hogares del trimestre frente a las "
+        "líneas de pobreza. Las carencias sociales se mantienen como fueron observadas."
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        growth = st.slider("Crecimiento real del ingreso (%)", -20, 30, 0, 1)
+    with col2:
+        transfer = st.slider("Cambio en transferencias (MXN por persona al mes)", -1000, 3000, 0, 50)
+
+    with profiler.span('Microsimulación', 'datos', 'escenario'):
+        base = households.scenario()
+        shocked = households.scenario(growth, transfer)
+
+    cols = st.columns(3)
+    for col, variable in zip(cols, [POBREZA, POBREZA_EXTREMA, BAJO_LP]):
+        with col:
+            st.metric(
+                variable,
+                f"{shocked[variable]:.1f}%",
+                f"{shocked[variable] - base[variable]:+.2f} pp",
+                delta_color="inverse",
+            )
+
+    with profiler.span('Microsimulación', 'render', 'tabla de escenario'):
+        st.dataframe(
+            pd.DataFrame({
+                'Observado (%)': base,
+                'Escenario (%)': shocked,
+                'Cambio (pp)': shocked - base,
+            }).style.format(precision=2)
         )
-        
-        st.plotly_chart(fig_heatmap, use_container_width=True)
 
-    
+    st.subheader("🗺️ Rejilla de Escenarios")
+    variable = st.selectbox("Indicador de la rejilla:", list(base.index), key='variable_rejilla')
+    with profiler.span('Microsimulación', 'datos', 'rejilla'):
+        grid = households.grid()
+        df_grid = grid.pivot(index=grid.columns[0], columns=grid.columns[1], values=variable)
+    with profiler.span('Microsimulación', 'figura', 'rejilla'):
+        fig_grid = shock_grid_figure(df_grid, variable)
+    with profiler.span('Microsimulación', 'render', 'rejilla'):
+        st.plotly_chart(fig_grid, use_container_width=True)
+    st.caption(f"{len(grid)} combinaciones evaluadas en un solo paso vectorizado.")
+
+    profile_panel(profiler)
+
+
 if __name__ == "__main__":
     app() 
\ No newline at end of file
@@ -0,0 +1,454 @@
+"""Indicator store shared by Pronostico_pobreza.py and improved_version.py.
+
+The indicator tables used to be rebuilt inside ``app()`` on every Streamlit
+rerun. They now live here and are built once per process: the store is keyed
+by ``(DATA_VERSION, source hash)`` and only rebuilt when that key changes or
+when ``invalidate()`` is called explicitly.
+
+With ``ENOE_CACHE_DIR`` the observed column of the national and state stores
+is a slice of the indicator ``cube``. Each store is the variable x scenario
+face of that data: categories and the variable lists the charts ask for are
+materialized once, so a rerun only does dictionary lookups.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import schema
+
+# Bump when the meaning of the tables changes (new columns, new source)
+DATA_VERSION = "2024.1"
+
+# Path to an enoe_ingest.py output; its values replace the typed-in 2022 column
+INDICATORS_PATH_ENV = 'ENOE_INDICATORS'
+# Alternatively, an enoe_cache.py directory (and optionally which quarter)
+CACHE_DIR_ENV = 'ENOE_CACHE_DIR'
+QUARTER_ENV = 'ENOE_QUARTER'
+# Year of the observed column; a cache reaching later years still fills it from this year
+BASE_YEAR = 2022
+
+CATEGORIES = ['POBREZA', 'PRIVACIÓN SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'BIENESTAR ECONÓMICO']
+
+# Scenario name -> column in df_full
+SCENARIO_COLUMNS = {
+    '2022': 'Valores 2022 (%)',
+    'optimista': 'Pronóstico optimista 2024 (%)',
+    'restrictivo': 'Pronóstico restrictivo 2024 (%)',
+}
+VALUE_COLUMNS = list(SCENARIO_COLUMNS.values())
+
+# Bootstrap standard error of the observed column, only with microdata
+STANDARD_ERROR_COLUMN = 'Error estándar 2022 (pp)'
+
+# Selector value for the national figures; states need ENOE_CACHE_DIR
+NACIONAL = 'Nacional'
+
+# Data from the images
+# Full data for both 2022 and 2024 forecasts (parsed from the images)
+# Organized into four main categories
+FULL_DATA_RAW = {
+    'Categoría': [
+        # POBREZA
+        'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA', 'POBREZA',
+        # PRIVACIÓN SOCIAL
+        'PRIVACIÓN SOCIAL', 'PRIVACIÓN SOCIAL', 'PRIVACIÓN SOCIAL',
+        # INDICADORES DE CARENCIA SOCIAL
+        'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL', 'INDICADORES DE CARENCIA SOCIAL',
+        # BIENESTAR ECONÓMICO
+        'BIENESTAR ECONÓMICO', 'BIENESTAR ECONÓMICO', 'BIENESTAR ECONÓMICO'
+    ],
+    'Variable': [
+        # POBREZA
+        'Pobreza',
+        'Población en pobreza',
+        'Población en pobreza moderada',
+        'Población en pobreza extrema',
+        'Población vulnerable por carencias sociales',
+        'Población vulnerable por ingresos',
+        'Población no pobre y no vulnerable',
+        # PRIVACIÓN SOCIAL
+        'Privación social',
+        'Población con al menos una carencia social',
+        'Población con al menos tres carencias sociales',
+        # INDICADORES DE CARENCIA SOCIAL
+        'Indicadores de carencia social',
+        'Rezago educativo',
+        'Carencia por acceso a los servicios de salud',
+        'Carencia por acceso a la seguridad social',
+        'Carencia por calidad y espacios de la vivienda',
+        'Carencia por acceso a los servicios básicos de la vivienda',
+        'Carencia por acceso a la alimentación nutritiva y de calidad',
+        # BIENESTAR ECONÓMICO
+        'Bienestar económico',
+        'Población con ingreso inferior a la linea de pobreza extrema por ingresos',
+        'Población con ingreso inferior a la linea de pobreza por ingresos'
+    ],
+    'Valores 2022 (%)': [  # Data from the second image, cleaned to float where possible
+        # POBREZA
+        None, 16.0, 15.0, 1.1, 28.4, 9.6, 45.9,
+        # PRIVACIÓN SOCIAL
+        None, 44.5, 8.8,
+        # INDICADORES DE CARENCIA SOCIAL
+        None, 13.5, 22.8, 27.2, 3.2, 3.8, 11.7,
+        # BIENESTAR ECONÓMICO
+        None, 3.8, 25.7
+    ],
+    'Pronóstico optimista 2024 (%)': [  # Data from the first image, cleaned to float where possible
+        # POBREZA
+        None, 12.2, 11.5, 0.7, 34.6, 6.7, 46.6,
+        # PRIVACIÓN SOCIAL
+        None, 46.8, 6.1,
+        # INDICADORES DE CARENCIA SOCIAL
+        None, 13.7, 16.1, 27.2, 3.2, 3.8, 11.7,
+        # BIENESTAR ECONÓMICO
+        None, 2.8, 18.9
+    ],
+    'Pronóstico restrictivo 2024 (%)': [  # Data from the first image, cleaned to float where possible
+        # POBREZA
+        None, 15.1, 14.3, 0.8, 31.9, 8.6, 44.4,
+        # PRIVACIÓN SOCIAL
+        None, 47.0, 6.0,
+        # INDICADORES DE CARENCIA SOCIAL
+        None, 13.7, 16.2, 27.2, 3.2, 3.8, 11.7,
+        # BIENESTAR ECONÓMICO
+        None, 3.4, 23.7
+    ]
+}
+
+# Define variables by category for easy access
+CARENCIAS_VARIABLES = [
+    'Rezago educativo',
+    'Carencia por acceso a los servicios de salud',
+    'Carencia por acceso a la seguridad social',
+    'Carencia por calidad y espacios de la vivienda',
+    'Carencia por acceso a los servicios básicos de la vivienda',
+    'Carencia por acceso a la alimentación nutritiva y de calidad'
+]
+
+POBREZA_VARIABLES = [
+    'Población en pobreza',
+    'Población en pobreza moderada',
+    'Población en pobreza extrema',
+    'Población vulnerable por carencias sociales',
+    'Población vulnerable por ingresos',
+    'Población no pobre y no vulnerable'
+]
+
+PRIVACION_SOCIAL_VARIABLES = [
+    'Población con al menos una carencia social',
+    'Población con al menos tres carencias sociales'
+]
+
+BIENESTAR_ECONOMICO_VARIABLES = [
+    'Población con ingreso inferior a la linea de pobreza extrema por ingresos',
+    'Población con ingreso inferior a la linea de pobreza por ingresos'
+]
+
+
+def source_hash(data_raw):
+    """Stable content hash of a ``full_data_raw``-style dict."""
+    payload = json.dumps(data_raw, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def data_from_indicator_table(table, column='Valores 2022 (%)', data_raw=None, errors=None):
+    """Copy of ``data_raw`` with ``column`` taken from a pipeline output table.
+
+    Variables the pipeline could not measure (absent or NaN) keep their
+    typed-in value; header rows stay empty. ``errors``, a
+    ``replicate_weights`` table, adds ``STANDARD_ERROR_COLUMN`` for the
+    measured variables.
+    """
+    if data_raw is None:
+        data_raw = FULL_DATA_RAW
+    measured = table.dropna(subset=['Valor (%)'])
+    values = dict(zip(measured['Variable'], measured['Valor (%)'].astype(float)))
+    merged = {key: list(column_values) for key, column_values in data_raw.items()}
+    merged[column] = [
+        None if old is None else values.get(variable, old)
+        for variable, old in zip(data_raw['Variable'], data_raw[column])
+    ]
+    if errors is not None:
+        errors = errors.dropna(subset=['Error estándar (pp)'])
+        standard_errors = dict(zip(errors['Variable'], errors['Error estándar (pp)'].astype(float)))
+        merged[STANDARD_ERROR_COLUMN] = [
+            standard_errors.get(variable) if variable in values else None
+            for variable in data_raw['Variable']
+        ]
+    return merged
+
+
+def data_with_forecasts(data_raw, forecasts):
+    """Copy of ``data_raw`` with the scenario columns of a ``forecasting`` table.
+
+    ``forecasts`` has one row per 'Variable'; variables without a forecast
+    (too short a history) keep their current values.
+    """
+    for scenario in ('optimista', 'restrictivo'):
+        column = SCENARIO_COLUMNS[scenario]
+        data_raw = data_from_indicator_table(forecasts.rename(columns={column: 'Valor (%)'}), column, data_raw)
+    return data_raw
+
+
+def _forecast_group(cache_dir, quarter, dimension, group):
+    """Forecasts of one breakdown group, or None when the history already covers the target."""
+    import breakdowns
+    import forecasting
+
+    try:
+        table = forecasting.forecasts(cache_dir, quarter)
+    except ValueError:
+        return None
+    return breakdowns.group_table(table, dimension, group)
+
+
+_pipeline_data = {}
+
+
+def base_quarter(cache_dir):
+    """Quarter of the observed column: ``ENOE_QUARTER``, else the latest cached one of ``BASE_YEAR``.
+
+    Falls back to the latest cached quarter before ``BASE_YEAR`` ends, and to
+    the latest overall when the cache only holds later years.
+    """
+    import enoe_cache
+
+    quarter = os.environ.get(QUARTER_ENV)
+    if quarter:
+        return quarter
+    quarters = enoe_cache.read_manifest(cache_dir)['quarters']
+    # 'YYYYTn' labels sort chronologically
+    base = [q for q in quarters if int(q[:4]) <= BASE_YEAR]
+    return max(base or quarters) if quarters else None
+
+
+def default_data_raw():
+    """``FULL_DATA_RAW``, or pipeline output when ``ENOE_CACHE_DIR`` / ``ENOE_INDICATORS`` is set."""
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    path = os.environ.get(INDICATORS_PATH_ENV)
+    if cache_dir:
+        import cube
+        import enoe_cache
+        import replicate_weights
+
+        # Forecasts use the history up to ENOE_QUARTER (default: all of it)
+        history_quarter = os.environ.get(QUARTER_ENV)
+        quarter = base_quarter(cache_dir)
+        key = (cache_dir, quarter, os.path.getmtime(os.path.join(cache_dir, enoe_cache.MANIFEST_NAME)))
+        if key not in _pipeline_data:
+            table = cube.cube(cache_dir, history_quarter).group_table(NACIONAL, NACIONAL, quarter)
+            errors = replicate_weights.standard_errors(cache_dir, quarter)
+            data_raw = data_from_indicator_table(table, errors=errors)
+            forecasts = _forecast_group(cache_dir, history_quarter, NACIONAL, NACIONAL)
+            if forecasts is not None:
+                data_raw = data_with_forecasts(data_raw, forecasts)
+            _pipeline_data.clear()
+            _pipeline_data[key] = data_raw
+        return _pipeline_data[key]
+    if not path:
+        return FULL_DATA_RAW
+    key = (path, os.path.getmtime(path))
+    if key not in _pipeline_data:
+        if path.endswith('.parquet'):
+            table = pd.read_parquet(path)
+        else:
+            table = pd.read_csv(path)
+        _pipeline_data.clear()
+        _pipeline_data[key] = data_from_indicator_table(table)
+    return _pipeline_data[key]
+
+
+def data_version():
+    """Cheap identity of the data behind ``get_store()``, without building anything.
+
+    Changes with the environment and whenever the cache manifest or the
+    indicator file is rewritten, i.e. whenever a store could change.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    path = os.environ.get(INDICATORS_PATH_ENV)
+    if cache_dir:
+        import enoe_cache
+
+        path = os.path.join(cache_dir, enoe_cache.MANIFEST_NAME)
+    mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+    return (DATA_VERSION, cache_dir, path, os.environ.get(QUARTER_ENV), mtime)
+
+
+class IndicatorStore:
+    """Read-only view over the indicator table with precomputed lookups.
+
+    Everything returned by the accessors is shared between sessions, so
+    callers must ``.copy()`` before mutating.
+    """
+
+    def __init__(self, data_raw, version=DATA_VERSION):
+        self.version = version
+        self.cache_key = (version, source_hash(data_raw))
+        # Header rows ('Pobreza', 'Privación social', ...) carry no values:
+        # they are metadata, not rows of df_full
+        self.df_full, self.headers = schema.indicator_frame(data_raw, VALUE_COLUMNS)
+
+        has_values = self.df_full[VALUE_COLUMNS].notna().all(axis=1)
+        self._by_category = {
+            categoria: df_categoria
+            for categoria, df_categoria in self.df_full.groupby('Categoría', sort=False, observed=True)
+        }
+        self._variables_by_category = {
+            categoria: self.df_full.loc[has_values & (self.df_full['Categoría'] == categoria), 'Variable'].tolist()
+            for categoria in self._by_category
+        }
+        self._by_variable = self.df_full.set_index('Variable')
+        self._values = {
+            scenario: {variable: schema.as_float(value) for variable, value in self._by_variable[column].items()}
+            for scenario, column in SCENARIO_COLUMNS.items()
+        }
+        # Slices already asked for, by tuple of variables
+        self._slices = {}
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of the frames the store holds (slices are views or small copies)."""
+        return schema.nbytes([self.df_full, self._by_variable] + list(self._slices.values()))
+
+    @property
+    def categories(self) -> list:
+        return list(self._by_category)
+
+    @property
+    def indicator_variables(self) -> list:
+        """Every variable that carries values, in display order."""
+        return [v for categoria in self._by_category for v in self._variables_by_category[categoria]]
+
+    def category(self, categoria) -> pd.DataFrame:
+        """All rows of a category, in display order; its header is ``headers[categoria]``."""
+        return self._by_category[categoria]
+
+    def category_variables(self, categoria) -> list:
+        """Variables of a category that carry values."""
+        return self._variables_by_category[categoria]
+
+    def variables(self, variables) -> pd.DataFrame:
+        """Rows for ``variables``, indexed by 'Variable', in the given order.
+
+        Values are float64 of the published decimals, as charts show them.
+        """
+        key = tuple(variables)
+        if key not in self._slices:
+            self._slices[key] = schema.decimal_frame(self._by_variable.loc[list(key)])
+        return self._slices[key]
+
+    def value(self, variable, scenario) -> float:
+        """Value of one variable under a scenario ('2022', 'optimista', 'restrictivo')."""
+        return self._values[scenario][variable]
+
+    def scenario(self, scenario) -> pd.Series:
+        """All values of one scenario, indexed by 'Variable'."""
+        return self._by_variable[SCENARIO_COLUMNS[scenario]]
+
+
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+schema.register('indicator_store', _stores, _stores_lock)
+# National store plus one per state
+_MAX_STORES = 40
+
+
+def entidades():
+    """States with microdata breakdowns; empty unless ``ENOE_CACHE_DIR`` is set."""
+    if not os.environ.get(CACHE_DIR_ENV):
+        return []
+    import enoe_cache
+    return list(enoe_cache.ENTIDADES)
+
+
+_state_data = {}
+# id -> (data_raw, source hash) of the module-level defaults, hashed once per build
+_default_digests = {}
+
+
+def _default_digest(data_raw):
+    """``source_hash`` of a ``default_data_raw()`` / ``state_data_raw()`` result, memoized by identity."""
+    entry = _default_digests.get(id(data_raw))
+    if entry is None or entry[0] is not data_raw:
+        if len(_default_digests) > 4 * _MAX_STORES:
+            _default_digests.clear()
+        entry = (data_raw, source_hash(data_raw))
+        _default_digests[id(data_raw)] = entry
+    return entry[1]
+
+
+def state_data_raw(entidad):
+    """``data_raw`` for one state, from the indicator cube of the cached quarter.
+
+    The 2022 column is the state's own estimate. Forecasts come from the
+    state's own history (``forecasting``); variables whose history is too
+    short get the state's 2022 value plus the national change (pp) of each
+    scenario.
+    """
+    import breakdowns
+    import cube
+
+    cache_dir = os.environ[CACHE_DIR_ENV]
+    national = default_data_raw()
+    key = (entidad, _default_digest(national))
+    if key in _state_data:
+        return _state_data[key]
+
+    history_quarter = os.environ.get(QUARTER_ENV)
+    table = cube.cube(cache_dir, history_quarter).group_table(breakdowns.ENTIDAD, entidad, base_quarter(cache_dir))
+    merged = data_from_indicator_table(table, data_raw=national)
+    # National standard errors do not apply to a state
+    merged.pop(STANDARD_ERROR_COLUMN, None)
+    observed = SCENARIO_COLUMNS['2022']
+    for scenario in ('optimista', 'restrictivo'):
+        column = SCENARIO_COLUMNS[scenario]
+        merged[column] = [
+            None if forecast is None else round(min(100.0, max(0.0, forecast + state - base)), 1)
+            for forecast, state, base in zip(national[column], merged[observed], national[observed])
+        ]
+    forecasts = _forecast_group(cache_dir, history_quarter, breakdowns.ENTIDAD, entidad)
+    if forecasts is not None:
+        merged = data_with_forecasts(merged, forecasts)
+    _state_data[key] = merged
+    return merged
+
+
+def get_store(data_raw=None, version=DATA_VERSION, entidad=None):
+    """Return the process-wide store for ``data_raw`` (or a state), building it on first use.
+
+    Stores are kept per ``(version, source hash)``, so switching between the
+    national and state views reuses already built stores; the least recently
+    used one is dropped past ``_MAX_STORES``.
+    """
+    if data_raw is None:
+        data_raw = default_data_raw() if entidad in (None, NACIONAL) else state_data_raw(entidad)
+        key = (version, _default_digest(data_raw))
+    else:
+        key = (version, source_hash(data_raw))
+    store = _stores.get(key)
+    if store is not None:
+        # Least recently used first out; under the lock, so it cannot race an eviction
+        with _stores_lock:
+            if key in _stores:
+                _stores.move_to_end(key)
+        return store
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = IndicatorStore(data_raw, version)
+            while len(_stores) > _MAX_STORES:
+                _stores.popitem(last=False)
+        store = _stores[key]
+    schema.enforce_budget()
+    return store
+
+
+def invalidate():
+    """Drop the cached stores; the next ``get_store()`` rebuilds them."""
+    with _stores_lock:
+        _stores.clear()
+        _pipeline_data.clear()
+        _state_data.clear()
@@ -0,0 +1,333 @@
+"""Load test of many concurrent viewers against a local Streamlit server.
+
+Each app runs in its own ``streamlit run`` process, and every simulated
+viewer is a websocket client speaking Streamlit's protocol, as a browser tab
+does: it opens a session, sets widget values and asks for reruns (of the
+fragment that holds the widget, like the frontend), and waits for the script
+to finish. The interaction scripts follow what viewers do around a release:
+
+* ``improved_version.py``: open the dashboard (tab 1), switch categories in
+  tab 2, change the scenario distribution (a full rerun, which also rebuilds
+  the tab 3 radar and heatmap) and, with microdata, move the income slider of
+  tab 4;
+* ``Pronostico_pobreza.py``: open the forecasts and submit real 2024 data
+  twice through the form.
+
+Tabs are rendered on every full run, so "opening" a tab is not a rerun of its
+own. Steps whose widget is not on the page (the slider without
+``ENOE_CACHE_DIR``) are skipped.
+
+Every rerun records its latency (request to ``script_finished``) and the
+bytes received. The server's CPU time and resident memory are read from
+``/proc`` (Linux): memory is sampled during the load, and memory per session
+is the growth over the warm baseline with every session still open. One
+warm-up session runs first, outside the measurements, so the numbers are
+those of a server that already built its process caches.
+
+Usage:
+    python loadtest.py --sessions 50
+    python loadtest.py --sessions 200 --think 1 --out carga.json
+    python loadtest.py --app improved_version.py --sessions 20 --ramp 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from benchmarks import CLASSIC_APP, HERE, IMPROVED_APP, _free_port
+from indicator_store import CATEGORIES
+from montecarlo import DISTRIBUTIONS
+
+APPS = {'Pronostico_pobreza.py': CLASSIC_APP, 'improved_version.py': IMPROVED_APP}
+DEFAULT_SESSIONS = 20
+# Seconds a viewer waits between interactions (uniform up to this value)
+DEFAULT_THINK = 0.5
+SERVER_STARTUP_TIMEOUT = 60
+RERUN_TIMEOUT = 300
+SAMPLE_INTERVAL = 0.1
+PERCENTILES = (50, 95, 99)
+
+
+def improved_script(i):
+    """``(step, [(widget label, value), ...])`` of viewer ``i`` of ``improved_version.py``."""
+    return [
+        ('abrir (tab 1)', []),
+        ('tab 2: categoría', [("Selecciona una categoría", CATEGORIES[(i + 1) % len(CATEGORIES)])]),
+        ('tab 2: categoría', [("Selecciona una categoría", CATEGORIES[(i + 2) % len(CATEGORIES)])]),
+        ('tab 1: distribución (tab 3 incluida)',
+         [("Distribución de los escenarios", DISTRIBUTIONS[1 + i % (len(DISTRIBUTIONS) - 1)])]),
+        ('tab 4: crecimiento del ingreso', [("Crecimiento real del ingreso", (i % 10) - 5)]),
+    ]
+
+
+def classic_script(i):
+    """``(step, [(widget label, value), ...])`` of viewer ``i`` of ``Pronostico_pobreza.py``."""
+    # Values differ per viewer, so comparison figures are built per submission
+    return [
+        ('abrir (tab 1)', []),
+        ('enviar datos reales', [("Porcentaje de Población en Pobreza Real", 30 + i % 100 / 10),
+                                 ("Comparar Datos Reales", True)]),
+        ('enviar datos reales', [("Porcentaje de Población en Pobreza Real", 40 + i % 100 / 10),
+                                 ("Comparar Datos Reales", True)]),
+    ]
+
+
+SCRIPTS = {'Pronostico_pobreza.py': classic_script, 'improved_version.py': improved_script}
+
+
+class Session:
+    """One viewer: a websocket to the server and the widget values it has set."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        # label -> (element type, proto, fragment id), from the last deltas
+        self.widgets = {}
+        # widget id -> WidgetState sent with every rerun, as the frontend does
+        self.states = {}
+        self.errors = 0
+
+    async def rerun(self, fragment_id=''):
+        """Latency (s) and bytes received of one rerun."""
+        msg = BackMsg()
+        msg.rerun_script.query_string = ''
+        msg.rerun_script.fragment_id = fragment_id
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        await self.websocket.send(msg.SerializeToString())
+        received = 0
+        while True:
+            data = await asyncio.wait_for(self.websocket.recv(), RERUN_TIMEOUT)
+            received += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof('type')
+            if kind == 'script_finished':
+                break
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                self._record(forward.delta)
+        # Triggers (buttons) hold for one rerun only
+        self.states = {key: state for key, state in self.states.items() if not state.HasField('trigger_value')}
+        return time.perf_counter() - start, received
+
+    def _record(self, delta):
+        element = delta.new_element
+        kind = element.WhichOneof('type')
+        if kind == 'exception':
+            self.errors += 1
+        elif kind in ('selectbox', 'number_input', 'slider', 'button'):
+            proto = getattr(element, kind)
+            self.widgets[proto.label] = (kind, proto, delta.fragment_id)
+
+    def set_value(self, label, value):
+        """Set the first widget whose label starts with ``label``; its fragment id, or None if absent."""
+        match = next((widget for name, widget in self.widgets.items() if name.startswith(label)), None)
+        if match is None:
+            return None
+        kind, proto, fragment_id = match
+        state = WidgetState(id=proto.id)
+        if kind == 'selectbox':
+            state.string_value = value
+        elif kind == 'number_input':
+            state.double_value = value
+        elif kind == 'slider':
+            state.double_array_value.data[:] = [value]
+        else:
+            state.trigger_value = True
+        self.states[proto.id] = state
+        return fragment_id
+
+
+def _process_stats(pid):
+    """CPU seconds and resident memory (MB) of a process, or ``(None, None)`` without ``/proc``."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Fields after the command name; utime and stime are the 12th and 13th
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status') as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    except OSError:
+        return None, None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK'), rss_kb / 1024
+
+
+async def _sample_memory(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(_process_stats(pid)[1] or 0.0)
+        await asyncio.sleep(SAMPLE_INTERVAL)
+
+
+async def _viewer(url, script, think, delay, rng):
+    """Run one viewer's script; returns its open session and ``(step, latency, bytes)`` per rerun."""
+    await asyncio.sleep(delay)
+    websocket = await websockets.connect(url, subprotocols=['streamlit'], max_size=None)
+    session = Session(websocket)
+    reruns = []
+    for step, values in script:
+        fragments = [session.set_value(label, value) for label, value in values]
+        if None in fragments:
+            continue
+        # The fragment of the last widget (a form's submit button) is the one rerun
+        latency, received = await session.rerun(fragments[-1] if fragments else '')
+        reruns.append((step, latency, received))
+        if think:
+            await asyncio.sleep(rng.uniform(0, think))
+    return session, reruns
+
+
+def _start_server(path, port):
+    command = [
+        sys.executable, '-m', 'streamlit', 'run', path,
+        '--server.headless', 'true',
+        '--server.address', '127.0.0.1',
+        '--server.port', str(port),
+        '--server.fileWatcherType', 'none',
+        '--browser.gatherUsageStats', 'false',
+    ]
+    proc = subprocess.Popen(command, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit run {os.path.basename(path)} terminó antes de aceptar conexiones")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"streamlit run {os.path.basename(path)} no respondió a tiempo")
+
+
+async def _load(app_name, url, pid, sessions, think, ramp, seed):
+    script = SCRIPTS[app_name]
+    # Warm-up viewer: first builds stay out of the measurements
+    warm, _ = await _viewer(url, script(0), 0, 0, random.Random(seed))
+    await warm.websocket.close()
+    await asyncio.sleep(1)
+    cpu_before, rss_before = _process_stats(pid)
+
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(_sample_memory(pid, samples, stop))
+    start = time.perf_counter()
+    viewers = await asyncio.gather(*(
+        _viewer(url, script(i), think, ramp * i / sessions, random.Random(seed + i)) for i in range(sessions)
+    ))
+    elapsed = time.perf_counter() - start
+    # Every session is still open here
+    cpu_after, rss_open = _process_stats(pid)
+    stop.set()
+    await sampler
+    for session, _ in viewers:
+        await session.websocket.close()
+
+    reruns = pd.DataFrame(
+        [rerun for _, session_reruns in viewers for rerun in session_reruns],
+        columns=['step', 'latency', 'bytes'],
+    )
+    return {
+        'reruns': reruns,
+        'errors': sum(session.errors for session, _ in viewers),
+        'elapsed_s': elapsed,
+        'cpu_s': None if cpu_before is None else cpu_after - cpu_before,
+        'rss_base_mb': rss_before,
+        'rss_open_mb': rss_open,
+        'rss_peak_mb': max(samples, default=None),
+    }
+
+
+def _percentiles(latencies):
+    values = np.percentile(np.asarray(latencies) * 1000, PERCENTILES)
+    return {f'p{p}_ms': round(float(v), 1) for p, v in zip(PERCENTILES, values)}
+
+
+def run_load_test(app_name, sessions=DEFAULT_SESSIONS, think=DEFAULT_THINK, ramp=0.0, seed=0):
+    """Summary and per-step latencies of ``sessions`` concurrent viewers of one app."""
+    port = _free_port()
+    proc = _start_server(APPS[app_name], port)
+    try:
+        load = asyncio.run(_load(app_name, f"ws://127.0.0.1:{port}/_stcore/stream", proc.pid,
+                                 sessions, think, ramp, seed))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    reruns = load['reruns']
+    summary = {
+        'app': app_name,
+        'sessions': sessions,
+        'reruns': len(reruns),
+        'errors': load['errors'],
+        **_percentiles(reruns['latency']),
+        'kb_per_rerun': round(reruns['bytes'].mean() / 1024, 1),
+        'elapsed_s': round(load['elapsed_s'], 2),
+    }
+    if load['cpu_s'] is not None:
+        summary.update({
+            'cpu_s_per_session': round(load['cpu_s'] / sessions, 3),
+            'cpu_percent': round(load['cpu_s'] / load['elapsed_s'] * 100, 1),
+            'rss_base_mb': round(load['rss_base_mb'], 1),
+            'rss_peak_mb': round(load['rss_peak_mb'], 1),
+            'mb_per_session': round((load['rss_open_mb'] - load['rss_base_mb']) / sessions, 2),
+        })
+    steps = [
+        {'app': app_name, 'step': step, 'reruns': len(group), **_percentiles(group['latency'])}
+        for step, group in reruns.groupby('step', sort=False)
+    ]
+    return summary, steps
+
+
+def report(summaries, steps):
+    """Comparison tables: one row per app, then one per app and step."""
+    columns = {
+        'app': 'App', 'sessions': 'Sesiones', 'reruns': 'Reruns', 'errors': 'Errores',
+        'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)', 'p99_ms': 'p99 (ms)', 'kb_per_rerun': 'kB por rerun',
+        'cpu_s_per_session': 'CPU por sesión (s)', 'cpu_percent': 'CPU (%)',
+        'rss_base_mb': 'Memoria base (MB)', 'rss_peak_mb': 'Memoria pico (MB)', 'mb_per_session': 'MB por sesión',
+    }
+    summary = pd.DataFrame(summaries).rename(columns=columns)
+    summary = summary[[name for name in columns.values() if name in summary]].set_index('App').astype(object).T
+    by_step = pd.DataFrame(steps).rename(columns={**columns, 'step': 'Paso'}).set_index(['App', 'Paso'])
+    return summary, by_step
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga con sesiones simultáneas de las apps.")
+    parser.add_argument('--app', choices=list(APPS), action='append', help="App a probar (por omisión, ambas)")
+    parser.add_argument('--sessions', type=int, default=DEFAULT_SESSIONS, help="Sesiones simultáneas")
+    parser.add_argument('--think', type=float, default=DEFAULT_THINK,
+                        help="Pausa máxima entre interacciones (s)")
+    parser.add_argument('--ramp', type=float, default=0.0, help="Segundos en que se abren todas las sesiones")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Archivo JSON de resultados")
+    args = parser.parse_args(argv)
+
+    summaries, steps = [], []
+    for app_name in args.app or list(APPS):
+        print(f"{app_name}: {args.sessions} sesiones...", flush=True)
+        summary, app_steps = run_load_test(app_name, args.sessions, args.think, args.ramp, args.seed)
+        summaries.append(summary)
+        steps += app_steps
+
+    summary_table, step_table = report(summaries, steps)
+    print()
+    print(summary_table.to_string())
+    print()
+    print(step_table.to_string())
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summaries, 'steps': steps}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
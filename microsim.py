@@ -0,0 +1,216 @@
+"""Household microsimulation of income shocks on the poverty indicators.
+
+A shock is a real growth of household income (``growth``, %) plus a change
+in transfers (``transfer``, MXN per person per month, added to every
+household's per-capita income). ENOE only measures labour income, so the
+transfer stands for a flat, universal amount rather than a change to
+existing programmes.
+
+The cached quarter is reduced once to a household table: per-capita income,
+area (urban/rural) and the expansion weight of all its members and of those
+with no carencia, at least one and at least three. Households of each area are sorted by income, with cumulative
+weights. A household is below a line ``L`` after the shock when
+``income * (1 + growth) + transfer < L``, i.e. when its current income is
+below ``(L - transfer) / (1 + growth)``; so every scenario reclassifies all
+households with one ``np.searchsorted`` per line and area, and a grid of
+scenarios is a single vectorized call over all its thresholds.
+
+Only the income-dependent rows change; carencias are left as observed.
+
+Usage:
+    python microsim.py --cache-dir cache/ --growth 5 --transfer 500
+    python microsim.py --cache-dir cache/ --grid
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import enoe_cache
+import schema
+from enoe_ingest import CARENCIA_COLUMNS, LINEAS_POBREZA, POPCOUNT, encode_persons, measured_carencias
+from montecarlo import (
+    BAJO_LP,
+    BAJO_LPE,
+    NO_POBRE,
+    POBREZA,
+    POBREZA_EXTREMA,
+    POBREZA_MODERADA,
+    VULNERABLE_CARENCIAS,
+    VULNERABLE_INGRESOS,
+)
+
+# Rows of df_full that depend on income, in display order
+SHOCK_VARIABLES = [
+    POBREZA, POBREZA_MODERADA, POBREZA_EXTREMA, VULNERABLE_CARENCIAS,
+    VULNERABLE_INGRESOS, NO_POBRE, BAJO_LPE, BAJO_LP,
+]
+GROWTH_COLUMN = 'Crecimiento del ingreso (%)'
+TRANSFER_COLUMN = 'Transferencia (MXN/mes)'
+
+# Default grid: 21 growth rates x 21 transfer changes
+GRID_GROWTHS = np.arange(-10, 31, 2)
+GRID_TRANSFERS = np.arange(-500, 2001, 125)
+
+MICRO_COLUMNS = ['hogar', 'ent', 'fac', 'urbano', 'ingreso_pc'] + CARENCIA_COLUMNS
+# Weight columns of the household table: all members, and by carencia count
+_ALL, _NONE, _ONE, _THREE = range(4)
+
+_tables = {}
+_tables_lock = threading.Lock()
+schema.register('microsim', _tables, _tables_lock)
+
+
+class HouseholdTable:
+    """Households of a quarter (or a state) sorted by income, per area."""
+
+    def __init__(self, frame, lineas=LINEAS_POBREZA):
+        self.lineas = lineas
+        codes, known = encode_persons(frame, lineas)
+        n_carencias = POPCOUNT[codes & measured_carencias(known)]
+
+        # Members' weight by carencia count, summed per household; the area is
+        # part of the key so a household is never split across lines
+        urbano = frame['urbano'].to_numpy().astype(bool)
+        key = frame['hogar'].to_numpy(dtype=np.int64) * 2 + urbano
+        hogar, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        weights = frame['fac'].to_numpy(dtype=np.float64)
+        classes = np.column_stack([
+            np.ones(len(frame), dtype=bool), n_carencias == 0, n_carencias >= 1, n_carencias >= 3,
+        ])
+        member_weights = np.column_stack([
+            np.bincount(inverse, weights=weights * classes[:, k], minlength=len(hogar)) for k in range(4)
+        ])
+        self.n_households = len(hogar)
+        self.totals = member_weights.sum(axis=0)
+
+        income = frame['ingreso_pc'].to_numpy(dtype=np.float64)[first]
+        urbano = urbano[first]
+        # area -> (sorted incomes, cumulative weights with a leading zero row)
+        self.areas = {}
+        for area, mask in (('urbano', urbano), ('rural', ~urbano)):
+            order = np.argsort(income[mask], kind='stable')
+            cumulative = np.vstack([np.zeros(4), np.cumsum(member_weights[mask][order], axis=0)])
+            self.areas[area] = (income[mask][order], cumulative)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(incomes.nbytes + cumulative.nbytes for incomes, cumulative in self.areas.values())
+
+    def _below(self, thresholds):
+        """Weight of households with income below ``thresholds[area]`` (arrays), by class: shape (n, 4)."""
+        below = 0.0
+        for area, (incomes, cumulative) in self.areas.items():
+            below = below + cumulative[np.searchsorted(incomes, thresholds[area], side='left')]
+        return below
+
+    def _indicators(self, lp, lpe):
+        """Table of the income-dependent indicators (%) from the weights below each line."""
+        totals = self.totals
+        pobreza = lp[:, _ONE]
+        extrema = lpe[:, _THREE]
+        values = {
+            POBREZA: pobreza,
+            POBREZA_MODERADA: pobreza - extrema,
+            POBREZA_EXTREMA: extrema,
+            VULNERABLE_CARENCIAS: totals[_ONE] - pobreza,
+            VULNERABLE_INGRESOS: lp[:, _NONE],
+            NO_POBRE: totals[_NONE] - lp[:, _NONE],
+            BAJO_LPE: lpe[:, _ALL],
+            BAJO_LP: lp[:, _ALL],
+        }
+        return pd.DataFrame({variable: values[variable] / totals[_ALL] * 100 for variable in SHOCK_VARIABLES})
+
+    def evaluate(self, growths, transfers):
+        """Income-dependent indicators (%) for paired arrays of shocks.
+
+        ``growths`` in %, ``transfers`` in MXN per person per month; returns
+        a table with one row per scenario and one column per variable.
+        """
+        growths = np.asarray(growths, dtype=np.float64)
+        transfers = np.asarray(transfers, dtype=np.float64)
+        if (growths <= -100).any():
+            raise ValueError("El crecimiento del ingreso debe ser mayor que -100%")
+        lp, lpe = (
+            self._below({area: (self.lineas[line][area] - transfers) / (1 + growths / 100) for area in self.areas})
+            for line in ('pobreza', 'pobreza_extrema')
+        )
+        table = self._indicators(lp, lpe)
+        table.insert(0, TRANSFER_COLUMN, transfers)
+        table.insert(0, GROWTH_COLUMN, growths)
+        return table
+
+    def evaluate_lines(self, lineas):
+        """Income-dependent indicators (%) against other sets of poverty lines.
+
+        ``lineas`` is shaped like ``LINEAS_POBREZA`` with an array per line and
+        area (e.g. one value per month); incomes are left as observed. Returns
+        one row per set of lines.
+        """
+        lp = self._below({area: np.asarray(lineas['pobreza'][area], dtype=np.float64) for area in self.areas})
+        lpe = self._below({area: np.asarray(lineas['pobreza_extrema'][area], dtype=np.float64) for area in self.areas})
+        return self._indicators(lp, lpe)
+
+    def scenario(self, growth=0.0, transfer=0.0):
+        """Indicators (%) of one shock, indexed by 'Variable'."""
+        return self.evaluate([growth], [transfer]).iloc[0][SHOCK_VARIABLES].rename_axis('Variable')
+
+    def grid(self, growths=GRID_GROWTHS, transfers=GRID_TRANSFERS):
+        """Every combination of ``growths`` x ``transfers`` in one vectorized pass."""
+        growth, transfer = np.meshgrid(growths, transfers, indexing='ij')
+        return self.evaluate(growth.ravel(), transfer.ravel())
+
+
+def household_frame(cache_dir, quarter, entidad=None):
+    """Person columns of a cached quarter that ``HouseholdTable`` needs, optionally of one state."""
+    frame = enoe_cache.load_quarter(cache_dir, quarter, MICRO_COLUMNS)
+    if entidad is not None:
+        frame = frame[frame['ent'] == enoe_cache.ENTIDADES.index(entidad) + 1]
+    return frame
+
+
+def household_table(cache_dir, quarter=None, entidad=None):
+    """Household table of a cached quarter (optionally one state), built once per process."""
+    quarter = quarter or enoe_cache.latest_quarter(cache_dir)
+    entry = enoe_cache.read_manifest(cache_dir)['quarters'][quarter]
+    key = (cache_dir, quarter, entry['sha256'], entidad)
+    if key in _tables:
+        return _tables[key]
+    with _tables_lock:
+        if key not in _tables:
+            _tables[key] = HouseholdTable(household_frame(cache_dir, quarter, entidad))
+        table = _tables[key]
+    schema.enforce_budget()
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microsimulación de choques al ingreso de los hogares.")
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--quarter')
+    parser.add_argument('--entidad')
+    parser.add_argument('--growth', type=float, default=0.0, help="Crecimiento real del ingreso (%%)")
+    parser.add_argument('--transfer', type=float, default=0.0, help="Cambio en transferencias (MXN por persona al mes)")
+    parser.add_argument('--grid', action='store_true', help="Evaluar la rejilla completa de choques")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table = household_table(args.cache_dir, args.quarter, args.entidad)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    if args.grid:
+        result = table.grid()
+        print(result.pivot(index=GROWTH_COLUMN, columns=TRANSFER_COLUMN, values=POBREZA).round(1).to_string())
+        label = f"{len(result)} escenarios"
+    else:
+        base = table.scenario()
+        shocked = table.scenario(args.growth, args.transfer)
+        print(pd.DataFrame({'Base (%)': base, 'Choque (%)': shocked, 'Cambio (pp)': shocked - base}).round(2).to_string())
+        label = "2 escenarios"
+    print(f"{table.n_households} hogares preparados en {built:.2f} s, {label} en {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Monte Carlo scenario engine for the 2024 indicators.
+
+Instead of reading the optimistic and restrictive forecasts as the ends of an
+"implicit interval", every indicator is placed on a position axis where 0 is
+the optimistic forecast and 1 the restrictive one. Positions are drawn jointly
+for all indicators in one batch:
+
+* a one-factor Gaussian copula (``rho``) makes indicators move together
+  towards the optimistic or the restrictive scenario;
+* each position follows a configurable distribution on
+  ``[-margin, 1 + margin]`` (uniform, triangular or Beta-PERT);
+* the accounting identities between rows of ``df_full`` are enforced on the
+  draws (the four CONEVAL quadrants add up to 100, moderate + extreme =
+  poverty, ``al menos una carencia`` = poverty + vulnerable by carencias, ...).
+
+Results are cached per store and configuration, so reruns are free, and
+kept in the ``result_store`` on disk for other processes and restarts.
+"""
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+import result_store
+import schema
+
+DISTRIBUTIONS = ('pert', 'triangular', 'uniforme')
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Bump when the draws (or their stored form) change for the same configuration
+SIMULATION_VERSION = 2
+
+DEFAULT_DRAWS = 100_000
+DEFAULT_RHO = 0.6
+DEFAULT_MARGIN = 0.25
+DEFAULT_SEED = 2024
+
+POBREZA = 'Población en pobreza'
+POBREZA_MODERADA = 'Población en pobreza moderada'
+POBREZA_EXTREMA = 'Población en pobreza extrema'
+VULNERABLE_CARENCIAS = 'Población vulnerable por carencias sociales'
+VULNERABLE_INGRESOS = 'Población vulnerable por ingresos'
+NO_POBRE = 'Población no pobre y no vulnerable'
+UNA_CARENCIA = 'Población con al menos una carencia social'
+TRES_CARENCIAS = 'Población con al menos tres carencias sociales'
+BAJO_LPE = 'Población con ingreso inferior a la linea de pobreza extrema por ingresos'
+BAJO_LP = 'Población con ingreso inferior a la linea de pobreza por ingresos'
+
+# Inverse CDF tables are tabulated once on this grid
+GRID_SIZE = 4097
+
+_results = {}
+_results_lock = threading.Lock()
+schema.register('montecarlo', _results, _results_lock)
+_MAX_RESULTS = 16
+
+
+def _norm_cdf(x):
+    """Standard normal CDF (Abramowitz-Stegun 7.1.26, |error| < 1.5e-7)."""
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def position_quantiles(distribution, mode=0.5, grid_size=GRID_SIZE):
+    """Quantile function of a position distribution on [0, 1].
+
+    Returned as its values at ``grid_size`` evenly spaced probabilities, so
+    lookups are an index computation instead of a binary search.
+    """
+    x = np.linspace(0.0, 1.0, grid_size)
+    if distribution == 'uniforme':
+        pdf = np.ones_like(x)
+    elif distribution == 'triangular':
+        pdf = np.where(x < mode, x / max(mode, 1e-9), (1.0 - x) / max(1.0 - mode, 1e-9))
+    elif distribution == 'pert':
+        # Beta-PERT with the usual lambda = 4
+        alpha = 1.0 + 4.0 * mode
+        beta = 1.0 + 4.0 * (1.0 - mode)
+        pdf = x ** (alpha - 1.0) * (1.0 - x) ** (beta - 1.0)
+    else:
+        raise ValueError(f"Distribución desconocida: {distribution!r}; usa una de {DISTRIBUTIONS}")
+    cdf = np.concatenate([[0.0], np.cumsum((pdf[1:] + pdf[:-1]) / 2.0)])
+    cdf /= cdf[-1]
+    return np.interp(np.linspace(0.0, 1.0, grid_size), cdf, x).astype(np.float32)
+
+
+def _lookup_quantiles(table, uniforms):
+    """Linear interpolation in an evenly spaced quantile table."""
+    scaled = uniforms * np.float32(len(table) - 1)
+    index = np.minimum(scaled.astype(np.int32), len(table) - 2)
+    fraction = scaled - index.astype(np.float32)
+    return table[index] + fraction * (table[index + 1] - table[index])
+
+
+def apply_constraints(draws, columns):
+    """Enforce the identities between ``df_full`` rows, in place.
+
+    ``columns`` maps variable name -> column of ``draws``; rows that are not
+    present are skipped.
+    """
+    c = columns
+    np.clip(draws, 0.0, 100.0, out=draws)
+
+    quadrants = [c.get(v) for v in (POBREZA, VULNERABLE_CARENCIAS, VULNERABLE_INGRESOS, NO_POBRE)]
+    if None not in quadrants:
+        # The four CONEVAL quadrants partition the population
+        total = draws[:, quadrants].sum(axis=1, keepdims=True)
+        draws[:, quadrants] *= 100.0 / total
+
+    if POBREZA in c and POBREZA_EXTREMA in c:
+        for upper in (BAJO_LPE, TRES_CARENCIAS):
+            if upper in c:
+                np.minimum(draws[:, c[POBREZA_EXTREMA]], draws[:, c[upper]], out=draws[:, c[POBREZA_EXTREMA]])
+        np.minimum(draws[:, c[POBREZA_EXTREMA]], draws[:, c[POBREZA]], out=draws[:, c[POBREZA_EXTREMA]])
+        if POBREZA_MODERADA in c:
+            draws[:, c[POBREZA_MODERADA]] = draws[:, c[POBREZA]] - draws[:, c[POBREZA_EXTREMA]]
+
+    if UNA_CARENCIA in c and POBREZA in c and VULNERABLE_CARENCIAS in c:
+        draws[:, c[UNA_CARENCIA]] = draws[:, c[POBREZA]] + draws[:, c[VULNERABLE_CARENCIAS]]
+    if BAJO_LP in c and POBREZA in c and VULNERABLE_INGRESOS in c:
+        draws[:, c[BAJO_LP]] = draws[:, c[POBREZA]] + draws[:, c[VULNERABLE_INGRESOS]]
+    if BAJO_LPE in c and BAJO_LP in c:
+        np.minimum(draws[:, c[BAJO_LPE]], draws[:, c[BAJO_LP]], out=draws[:, c[BAJO_LPE]])
+    if TRES_CARENCIAS in c and UNA_CARENCIA in c:
+        np.minimum(draws[:, c[TRES_CARENCIAS]], draws[:, c[UNA_CARENCIA]], out=draws[:, c[TRES_CARENCIAS]])
+    return draws
+
+
+def draw_scenarios(optimistic, restrictive, n_draws=DEFAULT_DRAWS, distribution='pert',
+                   rho=DEFAULT_RHO, margin=DEFAULT_MARGIN, mode=0.5, seed=DEFAULT_SEED, columns=None):
+    """Draw ``n_draws`` joint scenarios; returns a float32 (n_draws x k) array.
+
+    ``optimistic`` and ``restrictive`` are length-k arrays of bounds.
+    """
+    optimistic = np.asarray(optimistic, dtype=np.float32)
+    restrictive = np.asarray(restrictive, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+
+    # One common factor plus idiosyncratic noise, mapped to uniforms
+    common = rng.standard_normal((n_draws, 1), dtype=np.float32)
+    noise = rng.standard_normal((n_draws, len(optimistic)), dtype=np.float32)
+    latent = np.sqrt(rho, dtype=np.float32) * common + np.sqrt(1.0 - rho, dtype=np.float32) * noise
+    uniforms = _norm_cdf(latent).astype(np.float32)
+
+    position = _lookup_quantiles(position_quantiles(distribution, mode), uniforms)
+    position = position * np.float32(1.0 + 2.0 * margin) - np.float32(margin)
+
+    draws = optimistic + position * (restrictive - optimistic)
+    if columns is not None:
+        apply_constraints(draws, columns)
+    return draws
+
+
+class SimulationResult:
+    """Percentile bands and mean of the draws for every indicator with forecasts."""
+
+    def __init__(self, variables, draws, config):
+        self.variables = variables
+        # Only the bands are kept: the draws would hold n_draws x variables floats per cached result
+        self.n_draws = len(draws)
+        self.config = config
+        percentiles = np.percentile(draws, PERCENTILES, axis=0)
+        self.bands = pd.DataFrame(
+            percentiles.T,
+            index=pd.Index(variables, name='Variable'),
+            columns=[f'P{p}' for p in PERCENTILES],
+        )
+        self.bands['Media'] = draws.mean(axis=0)
+
+    def to_json(self) -> str:
+        """Bands and configuration as JSON, for the shared ``result_store``."""
+        return json.dumps({
+            'config': self.config,
+            'n_draws': self.n_draws,
+            'variables': list(self.variables),
+            'columns': list(self.bands.columns),
+            'dtypes': [str(dtype) for dtype in self.bands.dtypes],
+            'data': self.bands.to_numpy(dtype=np.float64).tolist(),
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, payload):
+        """Inverse of ``to_json``; plain data only, so a shared file cannot inject code."""
+        data = json.loads(payload)
+        result = cls.__new__(cls)
+        result.variables = data['variables']
+        result.n_draws = data['n_draws']
+        result.config = data['config']
+        bands = pd.DataFrame(
+            data['data'], index=pd.Index(data['variables'], name='Variable'), columns=data['columns']
+        )
+        result.bands = bands.astype(dict(zip(data['columns'], data['dtypes'])))
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.bands.memory_usage(deep=True).sum())
+
+    def band(self, variable, low=5, high=95):
+        """(low, high) percentiles of one variable."""
+        row = self.bands.loc[variable]
+        return float(row[f'P{low}']), float(row[f'P{high}'])
+
+    def fan(self, variable, start_value):
+        """Fan chart rows from the observed ``start_value`` to the 2024 bands."""
+        row = self.bands.loc[variable]
+        return pd.DataFrame(
+            [{f'P{p}': start_value for p in PERCENTILES}, row[[f'P{p}' for p in PERCENTILES]].to_dict()],
+            index=['2022', '2024'],
+        )
+
+
+def simulate(store, n_draws=DEFAULT_DRAWS, distribution='pert', rho=DEFAULT_RHO,
+             margin=DEFAULT_MARGIN, seed=DEFAULT_SEED):
+    """Cached ``SimulationResult`` for the indicators of ``store``."""
+    config = (n_draws, distribution, rho, margin, seed)
+    key = (store.cache_key,) + config
+    result = _results.get(key)
+    if result is not None:
+        return result
+
+    # Other replicas and earlier runs leave their bands on disk, as JSON
+    disk = result_store.default_store()
+    payload = disk.get('simulacion', repr(key), str(SIMULATION_VERSION)) if disk is not None else None
+    if payload is not None:
+        result = SimulationResult.from_json(payload.decode('utf-8'))
+    else:
+        result = _simulate(store, config)
+        if disk is not None:
+            disk.put('simulacion', repr(key), str(SIMULATION_VERSION), result.to_json().encode('utf-8'))
+    with _results_lock:
+        if len(_results) >= _MAX_RESULTS:
+            _results.pop(next(iter(_results)))
+        _results[key] = result
+    schema.enforce_budget()
+    return result
+
+
+def _simulate(store, config):
+    n_draws, distribution, rho, margin, seed = config
+    variables = store.indicator_variables
+    rows = store.variables(variables)
+    draws = draw_scenarios(
+        rows['Pronóstico optimista 2024 (%)'].to_numpy(),
+        rows['Pronóstico restrictivo 2024 (%)'].to_numpy(),
+        n_draws=n_draws, distribution=distribution, rho=rho, margin=margin, seed=seed,
+        columns={variable: i for i, variable in enumerate(variables)},
+    )
+    return SimulationResult(variables, draws, dict(zip(('n_draws', 'distribution', 'rho', 'margin', 'seed'), config)))
@@ -0,0 +1,303 @@
+"""Incremental refresh of the ENOE cache and everything derived from it.
+
+The refresh is a DAG of stages; each one only depends on the outputs of the
+stages before it:
+
+* ``ingesta:<trimestre>``: source tables -> columnar cache and indicator
+  table of the quarter (``enoe_cache.build_quarter``);
+* ``cubo:<trimestre>``: cell totals of the quarter (``cube.quarter_cells``),
+  after its ingestion;
+* ``errores``: bootstrap standard errors of the latest quarter, after its
+  ingestion;
+* ``pronosticos`` and ``backtest``: forecasts and rolling-origin backtest of
+  the history, after the cube block of every quarter.
+
+``pipeline.json`` in the cache records, per stage, the digest of its inputs
+(source hashes for an ingestion, the output digests of its dependencies
+otherwise) and of its output. A stage whose input digest did not change is
+skipped. An ingestion's output digest is the hash of the cache file, so a
+quarter re-ingested with the same content does not rebuild anything after
+it. Stages that need a build run in a process pool as soon as their
+dependencies are done. Source hashes are reused while a file's size and
+modification time are unchanged, so a refresh does not re-read every table.
+
+Every stage writes its outputs under content hashes (see each module), so
+the apps pick up rebuilt outputs on their next read and never read stale
+ones.
+
+Quarters are found in ``--sources`` by INEGI's file names: ``SDEMT122.csv``
+is the first quarter of 2022. ENOE does not measure the vivienda, servicios
+and alimentación carencias; keyed tables with them are given per quarter
+with ``--extra`` (same ``ruta:columnas[:llaves]`` format as
+``enoe_ingest.py``) and enter the input digest of the quarter's ingestion.
+
+Usage:
+    python pipeline.py --sources enoe/ --cache-dir cache/
+    python pipeline.py --sources enoe/ --cache-dir cache/ --dry-run
+    python pipeline.py --sources enoe/ --cache-dir cache/ --workers 4 --force
+    python pipeline.py --sources enoe/ --cache-dir cache/ --extra 2022T1=vivienda_122.csv:car_vivienda,car_servicios
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+import enoe_cache
+import enoe_ingest
+
+MANIFEST_NAME = 'pipeline.json'
+PIPELINE_VERSION = 1
+# SDEMT<quarter><two-digit year>, as published by INEGI
+SOURCE_PATTERN = re.compile(r'^sdemt([1-4])(\d{2})\.(csv|dbf)$', re.IGNORECASE)
+
+
+class Stage:
+    """A node of the DAG: ``fn(*args)`` once ``deps`` are done; ``params`` enter its input digest.
+
+    ``fn`` returns the output digest, or None when the output is a function
+    of the inputs alone (the input digest is used).
+    """
+
+    def __init__(self, name, fn, args, deps=(), params=None):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.deps = list(deps)
+        self.params = params
+
+    def input_digest(self, outputs):
+        payload = json.dumps(
+            [PIPELINE_VERSION, self.name, self.params, {dep: outputs[dep] for dep in self.deps}], sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def read_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'format': PIPELINE_VERSION, 'sources': {}, 'stages': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def find_sources(sources_dir):
+    """``{quarter: (year, path)}`` of the SDEM tables in ``sources_dir``."""
+    sources = {}
+    for name in sorted(os.listdir(sources_dir)):
+        match = SOURCE_PATTERN.match(name)
+        if match:
+            year = 2000 + int(match.group(2))
+            sources[f"{year}T{match.group(1)}"] = (year, os.path.join(sources_dir, name))
+    return sources
+
+
+def source_hash(path, known):
+    """sha256 of ``path``, reused from ``known`` (updated in place) while its size and mtime hold."""
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    entry = known.get(key)
+    if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': enoe_cache.file_hash(path)}
+        known[key] = entry
+    return entry['sha256']
+
+
+def _ingest(cache_dir, sdem_path, year, quarter, extra_tables=()):
+    return enoe_cache.build_quarter(sdem_path, year, quarter, cache_dir, extra_tables)['sha256']
+
+
+def _cube_block(cache_dir, quarter):
+    import cube
+
+    cube.quarter_cells(cache_dir, quarter)
+
+
+def _standard_errors(cache_dir, quarter):
+    import replicate_weights
+
+    replicate_weights.standard_errors(cache_dir, quarter)
+
+
+def _forecasts(cache_dir):
+    import forecasting
+
+    try:
+        forecasting.forecasts(cache_dir)
+    except ValueError:
+        # The history already reaches the target quarter: nothing to forecast
+        return 'sin pronóstico'
+
+
+def _backtest(cache_dir):
+    import backtesting
+
+    backtesting.backtest(cache_dir)
+
+
+def plan(sources_dir, cache_dir, known_sources, extra_tables=None):
+    """Stages of the DAG in dependency order.
+
+    ``extra_tables`` maps a quarter to its ``(path, columns, keys)`` carencia
+    tables (see ``enoe_ingest.iter_person_frames``).
+    """
+    import forecasting
+
+    sources = find_sources(sources_dir)
+    if not sources:
+        raise ValueError(f"No hay tablas SDEMT en {sources_dir}")
+    extra_tables = extra_tables or {}
+    unknown = sorted(set(extra_tables) - set(sources))
+    if unknown:
+        raise ValueError(f"Tablas adicionales de trimestres sin tabla SDEMT: {', '.join(unknown)}")
+    stages = []
+    for quarter, (year, path) in sorted(sources.items(), key=lambda item: forecasting.quarter_index(item[0])):
+        extras = [tuple(table) for table in extra_tables.get(quarter, ())]
+        params = {'fuente': os.path.basename(path), 'sha256': source_hash(path, known_sources), 'year': year}
+        if extras:
+            # Only when given, so quarters without extra tables keep their digests
+            params['adicionales'] = [
+                [os.path.basename(extra), source_hash(extra, known_sources), list(columns), list(keys)]
+                for extra, columns, keys in extras
+            ]
+        stages.append(Stage(f'ingesta:{quarter}', _ingest, (cache_dir, path, year, quarter, extras), params=params))
+        stages.append(Stage(f'cubo:{quarter}', _cube_block, (cache_dir, quarter), [f'ingesta:{quarter}']))
+    latest = max(sources, key=forecasting.quarter_index)
+    stages.append(Stage('errores', _standard_errors, (cache_dir, latest), [f'ingesta:{latest}']))
+    blocks = [f'cubo:{quarter}' for quarter in sources]
+    model = {'model': forecasting.MODEL_VERSION, 'target': forecasting.TARGET_QUARTER}
+    stages.append(Stage('pronosticos', _forecasts, (cache_dir,), blocks, params=model))
+    stages.append(Stage('backtest', _backtest, (cache_dir,), blocks, params=model))
+    return stages
+
+
+def _run_stage(fn, args):
+    start = time.perf_counter()
+    output = fn(*args)
+    return output, time.perf_counter() - start
+
+
+def run(stages, cache_dir, manifest, max_workers=None, force=False, dry_run=False):
+    """Build the stages whose inputs changed; one report row per stage.
+
+    The manifest is written after every finished stage, so an interrupted
+    refresh resumes where it stopped.
+    """
+    records = manifest['stages']
+    pending = {stage.name: stage for stage in stages}
+    outputs = {}
+    failed = set()
+    rows = []
+    running = {}
+    pool = None
+    workers = max_workers or min(os.cpu_count() or 1, 8)
+    try:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(dep in failed for dep in stage.deps):
+                    del pending[name]
+                    failed.add(name)
+                    rows.append((name, 'omitida', None))
+                    continue
+                if any(dep not in outputs for dep in stage.deps):
+                    continue
+                del pending[name]
+                inputs = stage.input_digest(outputs)
+                record = records.get(name)
+                if not force and record is not None and record['inputs'] == inputs:
+                    outputs[name] = record['output']
+                    rows.append((name, 'al día', None))
+                elif dry_run:
+                    # Unknown until built: everything after it is pending too
+                    outputs[name] = f'?{inputs}'
+                    rows.append((name, 'pendiente', None))
+                else:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(max_workers=workers)
+                    running[pool.submit(_run_stage, stage.fn, stage.args)] = (stage, inputs)
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, inputs = running.pop(future)
+                try:
+                    output, seconds = future.result()
+                except Exception as error:
+                    failed.add(stage.name)
+                    rows.append((stage.name, f'error: {error}', None))
+                    continue
+                outputs[stage.name] = output or inputs
+                records[stage.name] = {
+                    'inputs': inputs,
+                    'output': outputs[stage.name],
+                    'seconds': round(seconds, 2),
+                    'updated': datetime.datetime.now().isoformat(timespec='seconds'),
+                }
+                write_manifest(cache_dir, manifest)
+                rows.append((stage.name, 'construida', seconds))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    # Stages no longer in the DAG (a source was removed) are forgotten
+    manifest['stages'] = {name: record for name, record in records.items() if name in outputs}
+    report = pd.DataFrame(rows, columns=['Etapa', 'Estado', 'Segundos']).astype({'Segundos': float})
+    order = {stage.name: i for i, stage in enumerate(stages)}
+    return report.sort_values('Etapa', key=lambda names: names.map(order)).reset_index(drop=True)
+
+
+def refresh(sources_dir, cache_dir, max_workers=None, force=False, dry_run=False, extra_tables=None):
+    """Bring ``cache_dir`` up to date with the tables in ``sources_dir``; returns the stage report."""
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = read_manifest(cache_dir)
+    stages = plan(sources_dir, cache_dir, manifest['sources'], extra_tables)
+    report = run(stages, cache_dir, manifest, max_workers, force, dry_run)
+    if not dry_run:
+        write_manifest(cache_dir, manifest)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Actualización incremental del caché ENOE y sus derivados.")
+    parser.add_argument('--sources', required=True, help="Directorio con las tablas SDEMT de INEGI")
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--force', action='store_true', help="Reconstruir todas las etapas")
+    parser.add_argument('--dry-run', action='store_true', help="Solo mostrar qué etapas se reconstruirían")
+    parser.add_argument('--extra', action='append', default=[],
+                        help="Tabla con carencias adicionales de un trimestre: 2022T1=ruta:col1,col2[:llave1,llave2]")
+    args = parser.parse_args(argv)
+
+    extra_tables = {}
+    for spec in args.extra:
+        quarter, _, table = spec.partition('=')
+        if not table:
+            parser.error(f"--extra debe indicar el trimestre: {spec}")
+        extra_tables.setdefault(quarter, []).append(enoe_ingest.parse_extra(table))
+    start = time.perf_counter()
+    try:
+        report = refresh(args.sources, args.cache_dir, args.workers, args.force, args.dry_run, extra_tables)
+    except ValueError as error:
+        parser.error(str(error))
+    print(report.to_string(index=False, na_rep='', float_format='{:.2f}'.format))
+    built = (report['Estado'] == 'construida').sum()
+    print(f"{built} de {len(report)} etapas construidas en {time.perf_counter() - start:.2f} s")
+    if report['Estado'].str.startswith(('error', 'omitida')).any():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
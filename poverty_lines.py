@@ -0,0 +1,195 @@
+"""Monthly poverty lines and the income-poverty series they give.
+
+CONEVAL updates the income poverty lines every month with the price index:
+the extreme line (food basket) and the full line (food and non-food
+baskets), each for urban and rural areas. The series is read from a CSV
+with one row per month:
+
+    Mes,LP urbano,LP rural,LPE urbano,LPE rural
+    2022-01,4093.30,2925.51,2040.11,1565.99
+
+Each month is classified with the households of its own cached ENOE
+quarter; months of a quarter that is not cached (after the latest one, or a
+gap such as the suspended 2020T2) keep the nominal incomes of the most
+recent cached quarter before them, so only the lines move (a nowcast,
+flagged in ``ESTIMADO``).
+Comparing nominal incomes with each month's lines is the same as deflating
+incomes to the prices of the lines, without a separate deflator per line
+and area.
+
+The households x months comparison is never materialized: households are
+sorted by income once (``microsim.HouseholdTable``), so all the months of a
+quarter are classified with one ``np.searchsorted`` per line and area over
+the month thresholds. Results are cached per quarter, in memory and next to
+the columnar cache, keyed by the quarter's hash and the lines of its months.
+
+The series is read from ``SIMULADOR_LINEAS_POBREZA``, or from
+``lineas_pobreza.csv`` in ``ENOE_CACHE_DIR``.
+
+Usage:
+    python poverty_lines.py --cache-dir cache/ --lineas lineas_pobreza.csv
+    python poverty_lines.py --cache-dir cache/ --entidad Jalisco
+"""
+import argparse
+import bisect
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import enoe_cache
+import schema
+from indicator_store import BIENESTAR_ECONOMICO_VARIABLES
+
+LINES_ENV = 'SIMULADOR_LINEAS_POBREZA'
+LINES_NAME = 'lineas_pobreza.csv'
+MES = 'Mes'
+# Column of the series -> (line, area) of ``enoe_ingest.LINEAS_POBREZA``
+LINE_COLUMNS = {
+    'LP urbano': ('pobreza', 'urbano'),
+    'LP rural': ('pobreza', 'rural'),
+    'LPE urbano': ('pobreza_extrema', 'urbano'),
+    'LPE rural': ('pobreza_extrema', 'rural'),
+}
+TRIMESTRE_INGRESOS = 'Trimestre de ingresos'
+ESTIMADO = 'Estimado'
+
+_lines = {}
+_blocks = {}
+_blocks_lock = threading.Lock()
+schema.register('lineas mensuales', _blocks, _blocks_lock)
+
+
+def lines_path(cache_dir=None):
+    """``SIMULADOR_LINEAS_POBREZA``, else ``lineas_pobreza.csv`` in ``cache_dir`` if present, else None."""
+    path = os.environ.get(LINES_ENV)
+    if path:
+        return path
+    if cache_dir and os.path.exists(os.path.join(cache_dir, LINES_NAME)):
+        return os.path.join(cache_dir, LINES_NAME)
+    return None
+
+
+def read_lines(path):
+    """Monthly lines indexed by ``Mes`` ('YYYY-MM'), read once per version of the file."""
+    key = (path, os.path.getmtime(path))
+    if key in _lines:
+        return _lines[key]
+    frame = pd.read_csv(path)
+    missing = [column for column in [MES] + list(LINE_COLUMNS) if column not in frame]
+    if missing:
+        raise ValueError(f"Faltan columnas en {os.path.basename(path)}: {', '.join(missing)}")
+    frame[MES] = pd.to_datetime(frame[MES].astype(str)).dt.strftime('%Y-%m')
+    if frame[MES].duplicated().any():
+        raise ValueError(f"Meses repetidos en {os.path.basename(path)}")
+    lines = frame.set_index(MES)[list(LINE_COLUMNS)].astype(np.float64).sort_index()
+    if not (lines > 0).all().all():
+        raise ValueError(f"Las líneas de pobreza de {os.path.basename(path)} deben ser positivas")
+    _lines.clear()
+    _lines[key] = lines
+    return lines
+
+
+def month_quarter(month):
+    """Quarter label ('2022T1') of a 'YYYY-MM' month."""
+    return f"{month[:4]}T{(int(month[5:7]) - 1) // 3 + 1}"
+
+
+def _lineas(rows):
+    """``LINEAS_POBREZA``-shaped dict with one array entry per month of ``rows``."""
+    lineas = {}
+    for column, (line, area) in LINE_COLUMNS.items():
+        lineas.setdefault(line, {})[area] = rows[column].to_numpy()
+    return lineas
+
+
+def quarter_block(cache_dir, quarter, rows, entidad=None):
+    """Income-dependent indicators (%) of one quarter's households against the lines in ``rows``."""
+    import microsim
+
+    entry = enoe_cache.read_manifest(cache_dir)['quarters'][quarter]
+    digest = hashlib.sha256(f"{entidad}\n{rows.to_csv()}".encode('utf-8')).hexdigest()[:12]
+    key = (cache_dir, quarter, entry['sha256'], digest)
+    if key in _blocks:
+        return _blocks[key]
+
+    path = os.path.join(cache_dir, f"ingreso_mensual_{quarter}_{entry['sha256'][:12]}_{digest}.csv")
+    with _blocks_lock:
+        if key not in _blocks:
+            if os.path.exists(path):
+                block = pd.read_csv(path, index_col=MES)
+            else:
+                # The per-quarter table of microsim: sorted once, within the memory budget
+                households = microsim.household_table(cache_dir, quarter, entidad)
+                block = households.evaluate_lines(_lineas(rows)).set_index(rows.index)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                block.to_csv(tmp_path)
+                os.replace(tmp_path, path)
+            _blocks[key] = block
+        block = _blocks[key]
+    schema.enforce_budget()
+    return block
+
+
+def monthly_series(cache_dir, lines, entidad=None, quarter=None):
+    """Income-dependent indicators (%) for every month of ``lines`` the cache can classify.
+
+    Months of a cached quarter (up to ``quarter``, default: all) use its
+    households; other months, such as those of a quarter missing from the
+    history or after the latest one, use the most recent cached quarter
+    before them and are flagged in ``ESTIMADO``. Months before the first
+    cached quarter are left out.
+    """
+    from forecasting import quarter_index
+
+    cached = sorted(
+        (q for q in enoe_cache.read_manifest(cache_dir)['quarters'] if quarter is None or q <= quarter),
+        key=quarter_index,
+    )
+    if not cached:
+        return None
+    # Month -> most recent cached quarter at or before it, whose incomes classify it
+    indices = [quarter_index(q) for q in cached]
+    positions = {
+        month: bisect.bisect_right(indices, quarter_index(month_quarter(month))) - 1 for month in lines.index
+    }
+    sources = pd.Series(
+        {month: cached[position] for month, position in positions.items() if position >= 0}, dtype=object
+    ).rename_axis(MES)
+    if sources.empty:
+        return None
+    blocks = [
+        quarter_block(cache_dir, q, lines.loc[months.index], entidad)
+        for q, months in sources.groupby(sources, sort=False)
+    ]
+    series = pd.concat(blocks).loc[sources.index]
+    series[TRIMESTRE_INGRESOS] = sources
+    series[ESTIMADO] = [month_quarter(month) != q for month, q in sources.items()]
+    return series
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serie mensual de pobreza por ingresos con líneas de pobreza mensuales.")
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--lineas', help=f"CSV de líneas mensuales (por omisión, {LINES_ENV} o {LINES_NAME} del caché)")
+    parser.add_argument('--entidad')
+    parser.add_argument('--quarter', help="Último trimestre a usar (por omisión, el más reciente)")
+    args = parser.parse_args(argv)
+
+    path = args.lineas or lines_path(args.cache_dir)
+    if path is None:
+        parser.error(f"Indica --lineas, define {LINES_ENV} o agrega {LINES_NAME} al caché")
+    start = time.perf_counter()
+    series = monthly_series(args.cache_dir, read_lines(path), args.entidad, args.quarter)
+    if series is None:
+        parser.error("Ningún mes de la serie cae en o después de los trimestres del caché")
+    elapsed = time.perf_counter() - start
+    print(series[BIENESTAR_ECONOMICO_VARIABLES + [TRIMESTRE_INGRESOS, ESTIMADO]].round(2).to_string())
+    print(f"{len(series)} meses de {series[TRIMESTRE_INGRESOS].nunique()} trimestres en {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Per-rerun timing spans for the apps.
+
+Profiling is off unless ``POBREZA_PROFILE=1`` is set or the page is opened
+with ``?perfil=1``. When off, ``span()`` returns a shared no-op context, so
+the instrumentation costs nothing.
+
+When on, each span records its wall time and the Python memory allocated
+(net of frees) inside it. Memory comes from ``tracemalloc``, which runs while
+at least one profiler is active; it slows allocation-heavy code such as
+figure building, so compare spans with each other rather than with
+unprofiled timings. Tracing is process-wide: while other sessions run, their
+allocations also land in a span. Spans are flat,
+not nested, and carry a tab, a phase ('datos', 'figura' or 'render') and a
+name. At the end of a rerun they are shown in the app and
+appended to a JSON-lines trace (``POBREZA_TRACE``, by default
+``perfil_traza.jsonl``). Run this module on a trace to aggregate it:
+
+    python profiling.py perfil_traza.jsonl
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+
+import pandas as pd
+
+PROFILE_ENV = 'POBREZA_PROFILE'
+PROFILE_PARAM = 'perfil'
+TRACE_PATH_ENV = 'POBREZA_TRACE'
+DEFAULT_TRACE_PATH = 'perfil_traza.jsonl'
+
+SPAN_COLUMNS = ['Pestaña', 'Fase', 'Sección', 'Tiempo (ms)', 'Memoria asignada (MB)']
+
+_NO_SPAN = contextlib.nullcontext()
+_trace_lock = threading.Lock()
+# Active profilers of the process; tracemalloc runs while there is one
+_tracing_users = 0
+_tracing_lock = threading.Lock()
+
+
+def new_id():
+    return uuid.uuid4().hex[:12]
+
+
+def enabled(query_params=None):
+    """Whether to profile: env var, or ``?perfil=1`` in ``query_params``."""
+    if os.environ.get(PROFILE_ENV, '').lower() in ('1', 'true', 'si', 'sí'):
+        return True
+    return query_params is not None and query_params.get(PROFILE_PARAM) in ('1', 'true')
+
+
+class Profiler:
+    """Spans of one rerun (or one fragment rerun)."""
+
+    def __init__(self, active, scope='app', session=None, trace_path=None):
+        self.active = active
+        self.scope = scope
+        self.session = session
+        self.trace_path = trace_path or os.environ.get(TRACE_PATH_ENV, DEFAULT_TRACE_PATH)
+        self.run_id = new_id()
+        self.spans = []
+        self._start = time.perf_counter()
+        if active:
+            _acquire_tracing()
+
+    def span(self, tab, phase, name):
+        if not self.active:
+            return _NO_SPAN
+        return self._span(tab, phase, name)
+
+    @contextlib.contextmanager
+    def _span(self, tab, phase, name):
+        # No reset_peak(): the peak is shared with every other active span
+        base, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            current, _ = tracemalloc.get_traced_memory()
+            self.spans.append({
+                'Pestaña': tab,
+                'Fase': phase,
+                'Sección': name,
+                'Tiempo (ms)': round(elapsed, 2),
+                'Memoria asignada (MB)': round(max(current - base, 0) / 2**20, 3),
+            })
+
+    def finish(self):
+        """Release tracing, append the spans to the trace and return them as a table."""
+        if not self.active:
+            return None
+        total = (time.perf_counter() - self._start) * 1000
+        self.active = False
+        _release_tracing()
+        table = pd.DataFrame(self.spans, columns=SPAN_COLUMNS)
+        self.write_trace(total)
+        return table
+
+    def write_trace(self, total_ms):
+        timestamp = datetime.datetime.now().isoformat(timespec='milliseconds')
+        lines = [
+            json.dumps({
+                'timestamp': timestamp,
+                'session': self.session,
+                'run': self.run_id,
+                'scope': self.scope,
+                'total_ms': round(total_ms, 2),
+                **span,
+            }, ensure_ascii=False)
+            for span in self.spans
+        ]
+        with _trace_lock, open(self.trace_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines))
+
+
+def _acquire_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def _release_tracing():
+    """Stop tracing when the last active profiler finishes."""
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def phase_summary(table):
+    """Time and allocated memory per phase of one rerun."""
+    return table.groupby('Fase', sort=False).agg(
+        **{'Tiempo (ms)': ('Tiempo (ms)', 'sum'), 'Memoria asignada (MB)': ('Memoria asignada (MB)', 'sum')}
+    )
+
+
+def aggregate(trace_path):
+    """Median and p95 time of every span across all reruns in a trace."""
+    trace = pd.read_json(trace_path, lines=True)
+    grouped = trace.groupby(['scope', 'Pestaña', 'Fase', 'Sección'], sort=False)['Tiempo (ms)']
+    return pd.DataFrame({
+        'ejecuciones': grouped.size(),
+        'mediana (ms)': grouped.median(),
+        'p95 (ms)': grouped.quantile(0.95),
+    }).round(2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resume una traza de perfil del simulador.")
+    parser.add_argument('trace', nargs='?', default=DEFAULT_TRACE_PATH)
+    args = parser.parse_args(argv)
+    print(aggregate(args.trace).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Real 2024 values uploaded as a table, validated and joined onto ``df_full``.
+
+The file (CSV or Parquet) has one row per indicator value:
+
+* ``Variable``: a ``df_full`` variable with values;
+* ``Real 2024 (%)`` (or ``Valor 2024 (%)``, ``Valor (%)``, ``Valor``);
+* optionally ``Entidad`` and ``Trimestre``, to upload several groups at once.
+
+Validation is one vectorized pass over the whole table: per-row checks
+(unknown variable or state, non-numeric or out-of-range value, duplicates)
+are boolean masks, and the accounting identities between indicators are
+checked on the wide (group x variable) pivot of the valid rows.
+"""
+import numpy as np
+import pandas as pd
+
+import schema
+from indicator_store import NACIONAL, SCENARIO_COLUMNS, entidades
+from montecarlo import (
+    BAJO_LP,
+    BAJO_LPE,
+    NO_POBRE,
+    POBREZA,
+    POBREZA_EXTREMA,
+    POBREZA_MODERADA,
+    TRES_CARENCIAS,
+    UNA_CARENCIA,
+    VULNERABLE_CARENCIAS,
+    VULNERABLE_INGRESOS,
+)
+
+REAL_COLUMN = 'Real 2024 (%)'
+VALUE_ALIASES = [REAL_COLUMN, 'Valor 2024 (%)', 'Valor (%)', 'Valor']
+GROUP_COLUMNS = ['Entidad', 'Trimestre']
+ISSUE_COLUMNS = ['Fila', 'Entidad', 'Trimestre', 'Variable', 'Tipo', 'Problema']
+
+ERROR = 'Error'
+WARNING = 'Advertencia'
+
+# Values are rounded to one decimal: allowed gap per term of an identity (pp)
+TOLERANCE = 0.15
+
+# (description, left-hand variables, right-hand variables): sum(left) == sum(right)
+IDENTITIES = [
+    ("Los cuatro cuadrantes deben sumar 100%",
+     [POBREZA, VULNERABLE_CARENCIAS, VULNERABLE_INGRESOS, NO_POBRE], []),
+    ("Pobreza moderada + extrema debe igualar la pobreza", [POBREZA_MODERADA, POBREZA_EXTREMA], [POBREZA]),
+    ("Al menos una carencia debe igualar pobreza + vulnerables por carencias",
+     [UNA_CARENCIA], [POBREZA, VULNERABLE_CARENCIAS]),
+    ("Ingreso bajo la línea de pobreza debe igualar pobreza + vulnerables por ingresos",
+     [BAJO_LP], [POBREZA, VULNERABLE_INGRESOS]),
+]
+# (description, smaller, larger): smaller <= larger
+BOUNDS = [
+    ("La pobreza extrema no puede superar la pobreza", POBREZA_EXTREMA, POBREZA),
+    ("Tres o más carencias no puede superar al menos una carencia", TRES_CARENCIAS, UNA_CARENCIA),
+    ("Ingreso bajo la línea de pobreza extrema no puede superar el de la línea de pobreza", BAJO_LPE, BAJO_LP),
+]
+
+
+def read_real_values(source, name=None):
+    """Uploaded or on-disk CSV/Parquet as a frame with canonical columns.
+
+    ``source`` is a path or a file-like object (e.g. Streamlit's
+    ``UploadedFile``, whose ``name`` is used to pick the reader).
+    """
+    name = name or getattr(source, 'name', source)
+    if str(name).lower().endswith('.parquet'):
+        table = pd.read_parquet(source)
+    else:
+        table = pd.read_csv(source, encoding='utf-8-sig')
+    table.columns = [str(column).strip() for column in table.columns]
+
+    if 'Variable' not in table:
+        raise ValueError("El archivo debe tener una columna 'Variable'")
+    value_column = next((c for c in VALUE_ALIASES if c in table), None)
+    if value_column is None:
+        raise ValueError(f"El archivo debe tener una columna de valores: {', '.join(VALUE_ALIASES)}")
+
+    frame = pd.DataFrame({
+        'Fila': np.arange(2, len(table) + 2),  # line in the file, after the header
+        'Entidad': table['Entidad'].fillna(NACIONAL).astype(str).str.strip() if 'Entidad' in table else NACIONAL,
+        'Trimestre': table['Trimestre'].fillna('').astype(str).str.strip() if 'Trimestre' in table else '',
+        'Variable': table['Variable'].astype(str).str.strip(),
+        REAL_COLUMN: table[value_column],
+    })
+    return frame
+
+
+def _issues(rows, kind, message):
+    issues = rows[['Fila', 'Entidad', 'Trimestre', 'Variable']].copy()
+    issues['Tipo'] = kind
+    issues['Problema'] = message
+    return issues
+
+
+def validate(frame, variables):
+    """Validate uploaded rows against the indicator ``variables``.
+
+    Returns ``(valid, issues)``: the rows that passed the per-row checks and
+    a table of problems. Rows with errors are left out of ``valid``;
+    consistency warnings keep their rows.
+    """
+    raw = frame[REAL_COLUMN]
+    values = pd.to_numeric(raw, errors='coerce')
+    frame = frame.assign(**{REAL_COLUMN: values})
+    known_entidades = [NACIONAL] + entidades()
+
+    checks = [
+        (~frame['Variable'].isin(variables), "Variable desconocida o sin valores en df_full"),
+        (~frame['Entidad'].isin(known_entidades),
+         "Entidad desconocida o sin desagregación disponible (requiere microdatos ENOE)"),
+        (values.isna() & raw.notna(), "Valor no numérico"),
+        (values.isna() & raw.isna(), "Valor vacío"),
+        ((values < 0) | (values > 100), "Valor fuera del rango 0-100"),
+        (frame.duplicated(GROUP_COLUMNS + ['Variable'], keep='first'), "Variable repetida en el mismo grupo"),
+    ]
+    failed = np.zeros(len(frame), dtype=bool)
+    issues = []
+    for mask, message in checks:
+        mask = mask.to_numpy()
+        if mask.any():
+            issues.append(_issues(frame[mask], ERROR, message))
+            failed |= mask
+    valid = frame[~failed]
+
+    issues += consistency_issues(valid)
+    issues = pd.concat(issues, ignore_index=True) if issues else pd.DataFrame(columns=ISSUE_COLUMNS)
+    return valid.reset_index(drop=True), issues.sort_values(['Fila', 'Tipo'], kind='stable', ignore_index=True)
+
+
+def consistency_issues(valid):
+    """Identity and bound violations, checked for every group at once."""
+    if valid.empty:
+        return []
+    wide = valid.pivot(index=GROUP_COLUMNS, columns='Variable', values=REAL_COLUMN)
+    issues = []
+
+    def flag(mask, variables, message):
+        groups = wide.index[mask.to_numpy()]
+        if len(groups):
+            rows = valid.set_index(GROUP_COLUMNS).loc[groups].reset_index()
+            rows = rows[rows['Variable'].isin(variables)]
+            issues.append(_issues(rows, WARNING, message))
+
+    for message, left, right in IDENTITIES:
+        involved = left + right
+        if not set(involved) <= set(wide.columns):
+            continue
+        target = wide[right].sum(axis=1) if right else 100.0
+        gap = (wide[left].sum(axis=1) - target).abs()
+        flag(wide[involved].notna().all(axis=1) & (gap > TOLERANCE * len(involved)), involved, message)
+
+    for message, smaller, larger in BOUNDS:
+        if smaller in wide and larger in wide:
+            flag(wide[smaller] > wide[larger] + TOLERANCE, [smaller, larger], message)
+    return issues
+
+
+def groups(valid):
+    """``(Entidad, Trimestre)`` groups present in the valid rows, in file order."""
+    return list(dict.fromkeys(zip(*(valid[c] for c in GROUP_COLUMNS))))
+
+
+def join_real_values(df_full, valid, entidad=NACIONAL, trimestre=''):
+    """``df_full`` plus the group's real values and their gap to each scenario."""
+    df_full = schema.decimal_frame(df_full)
+    rows = valid[(valid['Entidad'] == entidad) & (valid['Trimestre'] == trimestre)]
+    joined = df_full.merge(rows[['Variable', REAL_COLUMN]], on='Variable', how='left')
+    joined['Real - Optimista (pp)'] = joined[REAL_COLUMN] - joined[SCENARIO_COLUMNS['optimista']]
+    joined['Real - Restrictivo (pp)'] = joined[REAL_COLUMN] - joined[SCENARIO_COLUMNS['restrictivo']]
+    return joined
+
+
+def example_table(variables):
+    """Template with every variable, for users to fill in."""
+    return pd.DataFrame({'Variable': list(variables), REAL_COLUMN: np.nan})
+
@@ -0,0 +1,168 @@
+"""Bootstrap standard errors for ENOE-based indicators.
+
+Uses the Rao-Wu rescaling bootstrap over the survey design: strata
+(``est_d``) and primary sampling units (``upm``). Within each stratum with
+``n_h`` PSUs, a replicate resamples ``n_h - 1`` PSUs with replacement and
+rescales their weights by ``n_h / (n_h - 1)``. Strata with a single PSU keep
+their weights and contribute no variance.
+
+Replicates never touch person rows. The person frame is reduced once to PSU
+totals ``T`` (PSUs x indicators, numerator and denominator), each block of
+replicates is a multiplier matrix ``M`` (replicates x PSUs), and all replicate
+estimates of all indicators are ``(M @ T_num) / (M @ T_den)``. Blocks run in a
+process pool and the result is cached per quarter next to the columnar cache.
+
+Usage:
+    python replicate_weights.py --cache-dir cache/ --quarter 2022T1 --replicates 500
+"""
+import argparse
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import enoe_cache
+from enoe_ingest import group_totals
+
+DESIGN_COLUMNS = ['upm', 'est_d']
+DEFAULT_REPLICATES = 200
+DEFAULT_SEED = 2022
+
+_errors = {}
+_errors_lock = threading.Lock()
+
+
+def psu_totals(frame):
+    """Weighted numerator and denominator totals per PSU.
+
+    Returns ``(strata, t_num, t_den, variables)`` with one row per PSU and
+    ``strata`` giving the stratum code of each PSU.
+    """
+    psu_codes, psu_index = np.unique(frame['upm'].to_numpy(), return_inverse=True)
+    n_psu = len(psu_codes)
+    strata = np.zeros(n_psu, dtype=np.int64)
+    strata[psu_index] = frame['est_d'].to_numpy()
+
+    t_num, t_den, variables = group_totals(frame, psu_index, n_psu)
+    return strata, t_num, t_den, variables
+
+
+def multiplier_matrix(strata, n_replicates, rng):
+    """Rao-Wu weight multipliers, shape (n_replicates, n_psu)."""
+    order = np.argsort(strata, kind='stable')
+    sorted_strata = strata[order]
+    starts = np.flatnonzero(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    sizes = np.diff(np.r_[starts, len(strata)])
+
+    resampled = sizes > 1
+    draws_per_stratum = np.where(resampled, sizes - 1, 0)
+    # One draw slot per resampled PSU: the stratum it belongs to
+    slot_start = np.repeat(starts, draws_per_stratum)
+    slot_size = np.repeat(sizes, draws_per_stratum)
+
+    n_psu = len(strata)
+    picks = slot_start + (rng.random((n_replicates, len(slot_start))) * slot_size).astype(np.int64)
+    picks += np.arange(n_replicates)[:, None] * n_psu
+    counts = np.bincount(picks.ravel(), minlength=n_replicates * n_psu).reshape(n_replicates, n_psu)
+
+    psu_resampled = np.repeat(resampled, sizes)
+    psu_scale = np.repeat(sizes / np.maximum(sizes - 1, 1), sizes)
+    multipliers = np.where(psu_resampled, counts * psu_scale, 1.0)
+
+    # Back from stratum order to PSU order
+    result = np.empty_like(multipliers)
+    result[:, order] = multipliers
+    return result
+
+
+def _replicate_block(strata, t_num, t_den, n_replicates, seed_sequence):
+    """Replicate estimates (%) for one block; runs in a worker process."""
+    rng = np.random.default_rng(seed_sequence)
+    multipliers = multiplier_matrix(strata, n_replicates, rng)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (multipliers @ t_num) / (multipliers @ t_den) * 100
+
+
+def bootstrap_standard_errors(frame, n_replicates=DEFAULT_REPLICATES, seed=DEFAULT_SEED, max_workers=None):
+    """Point estimate and bootstrap standard error (pp) of every indicator."""
+    strata, t_num, t_den, variables = psu_totals(frame)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        estimates = t_num.sum(axis=0) / t_den.sum(axis=0) * 100
+
+    workers = max_workers or min(os.cpu_count() or 1, 8)
+    blocks = np.array_split(np.arange(n_replicates), workers)
+    blocks = [block for block in blocks if len(block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    if len(blocks) == 1:
+        replicates = _replicate_block(strata, t_num, t_den, len(blocks[0]), seeds[0])
+    else:
+        with ProcessPoolExecutor(max_workers=len(blocks)) as pool:
+            futures = [
+                pool.submit(_replicate_block, strata, t_num, t_den, len(block), block_seed)
+                for block, block_seed in zip(blocks, seeds)
+            ]
+            replicates = np.vstack([future.result() for future in futures])
+
+    with warnings.catch_warnings():
+        # Carencias not measured this quarter are all-NaN columns
+        warnings.simplefilter('ignore', RuntimeWarning)
+        standard_errors = np.sqrt(np.nanmean((replicates - np.nanmean(replicates, axis=0)) ** 2, axis=0))
+    table = pd.DataFrame({
+        'Variable': variables,
+        'Valor (%)': estimates,
+        'Error estándar (pp)': standard_errors,
+    })
+    table['IC 95% inferior'] = table['Valor (%)'] - 1.96 * table['Error estándar (pp)']
+    table['IC 95% superior'] = table['Valor (%)'] + 1.96 * table['Error estándar (pp)']
+    return table
+
+
+def standard_errors(cache_dir, quarter=None, n_replicates=DEFAULT_REPLICATES, seed=DEFAULT_SEED, max_workers=None):
+    """Standard errors of a cached quarter, computed once and kept on disk.
+
+    The on-disk result is tied to the sha256 of the cached quarter, so a
+    re-ingested quarter gets new errors.
+    """
+    quarter = quarter or enoe_cache.latest_quarter(cache_dir)
+    entry = enoe_cache.read_manifest(cache_dir)['quarters'][quarter]
+    key = (cache_dir, quarter, entry['sha256'], n_replicates, seed)
+    if key in _errors:
+        return _errors[key]
+
+    path = os.path.join(cache_dir, f"errores_{quarter}_{entry['sha256'][:12]}_{n_replicates}_{seed}.csv")
+    with _errors_lock:
+        if key not in _errors:
+            if os.path.exists(path):
+                table = pd.read_csv(path)
+            else:
+                columns = enoe_cache.INDICATOR_COLUMNS + DESIGN_COLUMNS
+                frame = enoe_cache.load_quarter(cache_dir, quarter, columns)
+                table = bootstrap_standard_errors(frame, n_replicates, seed, max_workers)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                table.to_csv(tmp_path, index=False)
+                os.replace(tmp_path, path)
+            _errors[key] = table
+    return _errors[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Errores estándar bootstrap de un trimestre ENOE en caché.")
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--quarter')
+    parser.add_argument('--replicates', type=int, default=DEFAULT_REPLICATES)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table = standard_errors(args.cache_dir, args.quarter, args.replicates, args.seed, args.workers)
+    print(table.round(2).to_string(index=False))
+    print(f"{args.replicates} réplicas en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Headless report of the dashboard charts and tables.
+
+Renders, outside Streamlit, every chart the apps show (main scenario bar, fan
+chart, per-category indicator panels, radar and heatmap, for each theme) to
+self-contained HTML, plus an ``index.html`` with the category tables. Static
+images (png, svg, pdf) are written too when ``kaleido`` is installed.
+
+Charts are rendered in a process pool. Each output records the content hash
+of its inputs (builder, data slice, title, theme, format) in
+``reporte.json``; outputs whose hash did not change are skipped without
+building the figure.
+
+Usage:
+    python report.py --out reporte/
+    python report.py --out reporte/ --formats html png --workers 4
+"""
+import argparse
+import html
+import importlib.util
+import json
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly
+
+import figures
+from core import poverty_summary
+from indicator_store import CARENCIAS_VARIABLES, CATEGORIES, STANDARD_ERROR_COLUMN, VALUE_COLUMNS, get_store
+
+MANIFEST_NAME = 'reporte.json'
+FORMATS = ('html', 'png', 'svg', 'pdf')
+IMAGE_SCALE = 2
+
+# Titles and sizes as shown by each app
+THEME_CHARTS = {
+    'clasico': {
+        'bar': 'Población en Pobreza: 2022 vs. Pronósticos 2024 (Gráfico de Barras)',
+        'fan_height': 500,
+        'radar_height': None,
+    },
+    'mejorado': {
+        'bar': 'Evolución de la Pobreza en México',
+        'fan_height': 450,
+        'radar_height': 600,
+    },
+}
+FAN_TITLE = 'Población en Pobreza: Bandas de Escenarios Simulados 2024'
+RADAR_TITLE = 'Comparativa de Carencias Sociales: 2022 vs. Pronósticos 2024'
+
+
+def slug(text):
+    """File-name friendly version of a category or chart name."""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+def chart_jobs(store, themes=tuple(THEME_CHARTS)):
+    """``(name, builder, args, kwargs)`` for every chart of the report."""
+    summary = poverty_summary(store)
+    poverty_values = summary['values']
+    df_fan = summary['fan']
+    df_carencias = store.variables(CARENCIAS_VARIABLES)
+
+    jobs = []
+    for theme in themes:
+        charts = THEME_CHARTS[theme]
+        jobs += [
+            (f'pobreza_barras_{theme}', 'scenario_bar_figure', (poverty_values, charts['bar']), {'theme': theme}),
+            (f'pobreza_abanico_{theme}', 'fan_chart_figure', (df_fan, FAN_TITLE),
+             {'theme': theme, 'height': charts['fan_height']}),
+            (f'carencias_radar_{theme}', 'radar_figure', (df_carencias, RADAR_TITLE),
+             {'theme': theme, 'height': charts['radar_height']}),
+        ]
+    for categoria in CATEGORIES:
+        indicators = store.category_variables(categoria)
+        if indicators:
+            jobs.append((f'categoria_{slug(categoria)}', 'category_bars_figure', (store.variables(indicators),), {}))
+    jobs.append(('variacion_mapa_calor', 'variation_heatmap_figure', (store.variables(store.indicator_variables),), {}))
+    return jobs
+
+
+def _render(builder, args, kwargs, outputs, include_plotlyjs):
+    """Build one figure and write it in every requested format; runs in a worker."""
+    fig = getattr(figures, builder)(*args, **kwargs)
+    for fmt, path in outputs:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if fmt == 'html':
+            fig.write_html(tmp_path, include_plotlyjs=include_plotlyjs, full_html=True)
+        else:
+            fig.write_image(tmp_path, format=fmt, scale=IMAGE_SCALE)
+        os.replace(tmp_path, path)
+    return [path for _, path in outputs]
+
+
+def tables_html(store, charts):
+    """``index.html``: category tables and links to the rendered charts."""
+    columns = ['Variable'] + VALUE_COLUMNS
+    sections = []
+    for categoria in CATEGORIES:
+        df_categoria = store.category(categoria)
+        table_columns = columns + ([STANDARD_ERROR_COLUMN] if STANDARD_ERROR_COLUMN in df_categoria else [])
+        table = df_categoria[table_columns].to_html(index=False, na_rep='', float_format='{:.1f}'.format, border=0)
+        sections.append(f"<h2>{html.escape(categoria)}</h2>\n{table}")
+    links = '\n'.join(
+        f'<li><a href="{html.escape(path)}">{html.escape(path)}</a></li>' for path in sorted(charts)
+    )
+    return f"""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>Simulador de Pobreza 2024: reporte</title>
+<style>
+body {{ font-family: sans-serif; margin: 2rem; }}
+table {{ border-collapse: collapse; margin-bottom: 1.5rem; }}
+th, td {{ padding: 0.3rem 0.6rem; border-bottom: 1px solid #ddd; text-align: right; }}
+th:first-child, td:first-child {{ text-align: left; }}
+</style>
+</head>
+<body>
+<h1>Simulador de Pobreza 2024 con Datos ENOE-INEGI</h1>
+<h2>Gráficos</h2>
+<ul>
+{links}
+</ul>
+{chr(10).join(sections)}
+</body>
+</html>
+"""
+
+
+def _read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_text(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def build_report(out_dir, formats=('html',), themes=tuple(THEME_CHARTS), max_workers=None, cdn=False, force=False):
+    """Render the report into ``out_dir``; returns ``(written, skipped)`` file names."""
+    os.makedirs(out_dir, exist_ok=True)
+    store = get_store()
+    manifest = {} if force else _read_manifest(out_dir)
+    include_plotlyjs = 'cdn' if cdn else True
+
+    pending = []
+    hashes = {}
+    skipped = []
+    charts = []
+    for name, builder, args, kwargs in chart_jobs(store, themes):
+        outputs = []
+        for fmt in formats:
+            file_name = f"{name}.{fmt}"
+            charts.append(file_name)
+            key = figures.data_hash(
+                builder, args, kwargs, fmt, include_plotlyjs, figures.FIGURES_VERSION, plotly.__version__
+            )
+            hashes[file_name] = key
+            if manifest.get(file_name) == key and os.path.exists(os.path.join(out_dir, file_name)):
+                skipped.append(file_name)
+            else:
+                outputs.append((fmt, os.path.join(out_dir, file_name)))
+        if outputs:
+            pending.append((builder, args, kwargs, outputs, include_plotlyjs))
+
+    written = []
+    workers = max_workers or min(os.cpu_count() or 1, 8)
+    if workers == 1 or len(pending) <= 1:
+        for job in pending:
+            written += _render(*job)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            for paths in pool.map(_render, *zip(*pending)):
+                written += paths
+    written = [os.path.basename(path) for path in written]
+
+    index = tables_html(store, charts)
+    key = figures.data_hash(index)
+    if manifest.get('index.html') == key and os.path.exists(os.path.join(out_dir, 'index.html')):
+        skipped.append('index.html')
+    else:
+        _write_text(os.path.join(out_dir, 'index.html'), index)
+        written.append('index.html')
+    hashes['index.html'] = key
+
+    manifest.update(hashes)
+    _write_text(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True))
+    return written, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reporte estático de los gráficos y tablas del simulador.")
+    parser.add_argument('--out', required=True, help="Directorio de salida")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=['html'])
+    parser.add_argument('--themes', nargs='+', choices=list(THEME_CHARTS), default=list(THEME_CHARTS))
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--cdn', action='store_true', help="Cargar plotly.js desde CDN en lugar de incrustarlo")
+    parser.add_argument('--force', action='store_true', help="Reescribir aunque el contenido no haya cambiado")
+    args = parser.parse_args(argv)
+
+    if set(args.formats) - {'html'} and importlib.util.find_spec('kaleido') is None:
+        parser.error("Las imágenes estáticas requieren kaleido (pip install kaleido)")
+
+    start = time.perf_counter()
+    written, skipped = build_report(args.out, args.formats, args.themes, args.workers, args.cdn, args.force)
+    print(f"{len(written)} archivos escritos, {len(skipped)} sin cambios, "
+          f"{time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Disk store of computed results shared by app replicas and restarts.
+
+The process-wide caches (stores, simulations, figures) are shared by every
+session of one process. This SQLite file extends them across processes: an
+app replica, the API or a restarted server finds what another one already
+computed. Values are opaque bytes under ``(namespace, key)`` plus a version;
+a read with another version is a miss, so bumping a builder's version
+retires its old entries without touching the others.
+
+SQLite runs in WAL mode: readers never block and are not blocked by the
+single writer, and writers from several processes queue on the file lock
+(``busy_timeout``). Every thread gets its own connection. When the file
+holds more than ``SIMULADOR_RESULTS_MAX_MB``, the least recently read
+entries are deleted in the same transaction as the write. Read times are
+refreshed at most once per ``ACCESS_RESOLUTION`` seconds, so hot reads do
+not turn into writes.
+
+The store lives in ``SIMULADOR_RESULTS_DB``, or next to the columnar cache
+when only ``ENOE_CACHE_DIR`` is set; without either it is disabled.
+
+Usage:
+    python result_store.py --db resultados.sqlite
+    python result_store.py --db resultados.sqlite --clear
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from indicator_store import CACHE_DIR_ENV
+
+RESULTS_DB_ENV = 'SIMULADOR_RESULTS_DB'
+RESULTS_MAX_MB_ENV = 'SIMULADOR_RESULTS_MAX_MB'
+DB_NAME = 'resultados.sqlite'
+DEFAULT_MAX_MB = 256
+BUSY_TIMEOUT_MS = 10_000
+ACCESS_RESOLUTION = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class ResultStore:
+    """Versioned, size-bounded key-value store in one SQLite file."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_MB * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key, version):
+        """Stored bytes, or None when missing or stored under another version."""
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, version, accessed FROM results WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        if row is None or row[1] != version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        if now - row[2] > ACCESS_RESOLUTION:
+            conn.execute('UPDATE results SET accessed = ? WHERE namespace = ? AND key = ?', (now, namespace, key))
+        return row[0]
+
+    def put(self, namespace, key, version, value):
+        """Store ``value`` (bytes), evicting the least recently read entries over the size bound."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO results (namespace, key, version, value, size, accessed) VALUES (?, ?, ?, ?, ?, ?)',
+                (namespace, key, version, sqlite3.Binary(value), len(value), time.time()),
+            )
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+            if total > self.max_bytes:
+                # Oldest reads first, until the running total fits
+                conn.execute(
+                    """DELETE FROM results WHERE rowid IN (
+                           SELECT rowid FROM (
+                               SELECT rowid, SUM(size) OVER (ORDER BY accessed DESC, rowid DESC) AS newer
+                               FROM results
+                           ) WHERE newer > ?
+                       )""",
+                    (self.max_bytes,),
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def stats(self):
+        conn = self._connection()
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        return {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        self._connection().execute('DELETE FROM results')
+
+
+def default_path():
+    """``SIMULADOR_RESULTS_DB``, else ``resultados.sqlite`` in ``ENOE_CACHE_DIR``, else None."""
+    path = os.environ.get(RESULTS_DB_ENV)
+    if path:
+        return path
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    return os.path.join(cache_dir, DB_NAME) if cache_dir else None
+
+
+def default_store():
+    """The process-wide store for ``default_path()``, or None when disabled."""
+    path = default_path()
+    if path is None:
+        return None
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            if path not in _stores:
+                max_mb = float(os.environ.get(RESULTS_MAX_MB_ENV) or DEFAULT_MAX_MB)
+                _stores[path] = ResultStore(path, int(max_mb * 2**20))
+            store = _stores[path]
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Almacén en disco de resultados compartidos.")
+    parser.add_argument('--db', help=f"Archivo SQLite (por omisión, {RESULTS_DB_ENV} o el caché ENOE)")
+    parser.add_argument('--clear', action='store_true', help="Borrar todas las entradas")
+    args = parser.parse_args(argv)
+
+    path = args.db or default_path()
+    if path is None:
+        parser.error(f"Indica --db o define {RESULTS_DB_ENV}")
+    store = ResultStore(path)
+    if args.clear:
+        store.clear()
+    conn = store._connection()
+    for namespace, entries, size in conn.execute(
+            'SELECT namespace, COUNT(*), SUM(size) FROM results GROUP BY namespace ORDER BY namespace'):
+        print(f"{namespace:20} {entries:6} entradas {size / 2**20:9.2f} MB")
+    stats = store.stats()
+    print(f"Total: {stats['entries']} entradas, {stats['bytes'] / 2**20:.2f} MB de {stats['max_bytes'] / 2**20:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Compact dtypes for the indicator frames, and a per-process memory budget.
+
+Indicator frames (``df_full`` of every store) follow one schema:
+
+* ``Categoría`` and ``Variable`` are categoricals: every label is stored once
+  and rows hold small integer codes;
+* measures (scenario values, standard errors) are float32, enough for
+  percentages published with one decimal;
+* header rows ('Pobreza', 'Privación social', ...), which carry no values,
+  are not rows: they are kept as metadata, category -> header label.
+
+Person-level microdata keeps the dtypes of the columnar cache (int8 codes,
+float32 weights and incomes); carencia flags are int8 with
+``CARENCIA_NO_MEDIDA`` where not measured, instead of float NaN.
+
+Process-wide caches register here (``register``). ``memory_report`` lists
+what each one holds, and ``enforce_budget`` evicts their oldest entries,
+largest cache first, while the total is over ``SIMULADOR_MEMORY_BUDGET_MB``.
+
+Usage:
+    python schema.py
+    python schema.py --cache-dir cache/
+"""
+import argparse
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+LABEL_COLUMNS = ['Categoría', 'Variable']
+MEASURE_DTYPE = np.float32
+# Carencia flag of a person it was not measured for
+CARENCIA_NO_MEDIDA = -1
+
+MEMORY_BUDGET_ENV = 'SIMULADOR_MEMORY_BUDGET_MB'
+
+# name -> (cache dict, its lock)
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def indicator_frame(data_raw, measure_columns):
+    """``(frame, headers)`` of a ``full_data_raw``-style dict.
+
+    Rows where every measure is empty are the category headers: they go to
+    ``headers`` (category -> label) instead of the frame.
+    """
+    frame = pd.DataFrame(data_raw)
+    is_header = frame[measure_columns].isna().all(axis=1)
+    headers = dict(zip(frame.loc[is_header, 'Categoría'], frame.loc[is_header, 'Variable']))
+    frame = frame[~is_header].reset_index(drop=True)
+    for column in LABEL_COLUMNS:
+        # Categories in display order, so sorting keeps the table's order
+        frame[column] = pd.Categorical(frame[column], categories=pd.unique(frame[column]))
+    measures = [column for column in frame.columns if column not in LABEL_COLUMNS]
+    frame[measures] = frame[measures].astype(MEASURE_DTYPE)
+    return frame, headers
+
+
+def as_float(value):
+    """A float32 measure as the Python float of its shortest decimal (12.2, not 12.199999809)."""
+    return float(np.format_float_positional(np.float32(value), unique=True))
+
+
+def decimal_frame(frame):
+    """Copy of ``frame`` with float32 columns widened through their shortest decimals.
+
+    For output (JSON, CSV) where float32 noise would show.
+    """
+    widened = frame.copy()
+    for column in frame.columns:
+        if frame[column].dtype == MEASURE_DTYPE:
+            widened[column] = frame[column].astype(str).astype(np.float64)
+    return widened
+
+
+def nbytes(value):
+    """Memory held by a cached value: frames (deep), arrays, bytes, containers of them, or ``.nbytes``."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    if isinstance(value, bytes):
+        return len(value)
+    return int(getattr(value, 'nbytes', 0))
+
+
+def register(name, cache, lock):
+    """Put a process-wide cache (a dict, oldest entries first) under the budget."""
+    with _caches_lock:
+        _caches[name] = (cache, lock)
+
+
+def memory_report():
+    """Entries and memory (MB) of every registered cache."""
+    with _caches_lock:
+        caches = list(_caches.items())
+    rows = []
+    for name, (cache, _) in caches:
+        values = list(cache.values())
+        rows.append({'Caché': name, 'Entradas': len(values), 'Memoria (MB)': sum(map(nbytes, values)) / 2**20})
+    table = pd.DataFrame(rows, columns=['Caché', 'Entradas', 'Memoria (MB)'])
+    table.attrs['budget_mb'] = memory_budget_mb()
+    return table.round({'Memoria (MB)': 2})
+
+
+def memory_budget_mb():
+    """Per-process budget from ``SIMULADOR_MEMORY_BUDGET_MB``, or None."""
+    budget = os.environ.get(MEMORY_BUDGET_ENV)
+    return float(budget) if budget else None
+
+
+def enforce_budget():
+    """Evict the oldest cached entries, largest cache first, until under the budget.
+
+    Returns the number of entries evicted. Callers must not hold a cache lock.
+    """
+    budget = memory_budget_mb()
+    if budget is None:
+        return 0
+    with _caches_lock:
+        caches = list(_caches.values())
+    sizes = [{key: nbytes(value) for key, value in list(cache.items())} for cache, _ in caches]
+    total = sum(sum(size.values()) for size in sizes)
+    evicted = 0
+    while total > budget * 2**20:
+        largest = max(range(len(caches)), key=lambda i: sum(sizes[i].values()))
+        if not sizes[largest]:
+            break
+        key = next(iter(sizes[largest]))
+        cache, lock = caches[largest]
+        with lock:
+            cache.pop(key, None)
+        total -= sizes[largest].pop(key)
+        evicted += 1
+    return evicted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memoria de los cachés del simulador.")
+    parser.add_argument('--cache-dir', help="Caché ENOE: incluye cubo, desagregaciones y hogares")
+    args = parser.parse_args(argv)
+
+    import indicator_store
+    # The caches register with the imported module, not with __main__
+    import schema
+
+    if args.cache_dir:
+        os.environ[indicator_store.CACHE_DIR_ENV] = args.cache_dir
+        import core
+
+        core.household_table()
+    for entidad in [indicator_store.NACIONAL] + indicator_store.entidades():
+        indicator_store.get_store(entidad=entidad)
+    report = schema.memory_report()
+    print(report.to_string(index=False))
+    budget = report.attrs['budget_mb']
+    print(f"Total: {report['Memoria (MB)'].sum():.2f} MB"
+          + (f" de {budget:g} MB de presupuesto" if budget is not None else " (sin presupuesto)"))
+
+
+if __name__ == "__main__":
+    main()
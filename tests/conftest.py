@@ -0,0 +1,105 @@
+"""Tiny synthetic ENOE quarters whose indicators are known by construction.
+
+Each block of the SDEM table has ten two-person urban households, weighted
+equally, of five types (carencias measured by ENOE: educación, salud and
+seguridad social):
+
+====  ==========  ==================  ==========
+type  households  per-capita income   carencias
+====  ==========  ==================  ==========
+A     1           1 000 (< LPE)       all three
+B     2           3 000 (< LP)        salud
+C     3           10 000              seguridad social
+D     1           3 000 (< LP)        none
+E     3           10 000              none
+====  ==========  ==================  ==========
+
+so poverty is A + B = 30%, extreme poverty A = 10%, and so on
+(``EXPECTED``). Every household also lists an incomplete interview and a
+non-resident with a large income, both outside the universe. Half of the
+blocks are in Ciudad de México (ent 9) and half in Jalisco (ent 14); each
+block is one PSU, so every PSU has the same composition.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+HOUSEHOLD_TYPES = [
+    # (households per block, income per capita, anios_esc, imssissste, seg_soc)
+    (1, 1000.0, 6, 4, 2),
+    (2, 3000.0, 12, 4, 1),
+    (3, 10000.0, 12, 1, 2),
+    (1, 3000.0, 12, 1, 1),
+    (3, 10000.0, 12, 1, 1),
+]
+BLOCKS = 10
+ENTIDADES = (9, 14)
+
+EXPECTED = {
+    'Población en pobreza': 30.0,
+    'Población en pobreza moderada': 20.0,
+    'Población en pobreza extrema': 10.0,
+    'Población vulnerable por carencias sociales': 30.0,
+    'Población vulnerable por ingresos': 10.0,
+    'Población no pobre y no vulnerable': 30.0,
+    'Población con al menos una carencia social': 60.0,
+    'Población con al menos tres carencias sociales': 10.0,
+    'Rezago educativo': 10.0,
+    'Carencia por acceso a los servicios de salud': 30.0,
+    'Carencia por acceso a la seguridad social': 40.0,
+    'Población con ingreso inferior a la linea de pobreza extrema por ingresos': 10.0,
+    'Población con ingreso inferior a la linea de pobreza por ingresos': 40.0,
+}
+
+
+def sdem_frame(income_scale=1.0, psu='bloque'):
+    """SDEM rows (INEGI column names); ``psu='hogar'`` makes every household its own PSU."""
+    rows = []
+    con = 0
+    for block in range(BLOCKS):
+        ent = ENTIDADES[block * len(ENTIDADES) // BLOCKS]
+        for count, income, anios_esc, imssissste, seg_soc in HOUSEHOLD_TYPES:
+            for _ in range(count):
+                con += 1
+                upm = block + 1 if psu == 'bloque' else con
+                members = [(1, 0, 1), (2, 0, 1), (3, 1, 1), (4, 0, 2)]
+                for n_ren, r_def, c_res in members:
+                    rows.append({
+                        'CD_A': 1, 'ENT': ent, 'CON': con, 'V_SEL': 1, 'N_HOG': 1, 'H_MUD': 0, 'N_REN': n_ren,
+                        'R_DEF': r_def, 'C_RES': c_res, 'SEX': 1 + n_ren % 2, 'EDA': 30,
+                        'ANIOS_ESC': anios_esc, 'CS_P17': 1, 'IMSSISSSTE': imssissste, 'SEG_SOC': seg_soc,
+                        'EMP_PPAL': 2,
+                        # Outside the universe: would move every indicator if counted
+                        'INGOCUP': income * income_scale if r_def == 0 and c_res == 1 else 1e6,
+                        'UPM': upm, 'FAC_TRI': 100, 'T_LOC_TRI': 1, 'EST_D_TRI': ent,
+                    })
+    return pd.DataFrame(rows)
+
+
+def write_sdem(path, income_scale=1.0, psu='bloque'):
+    sdem_frame(income_scale, psu).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def _isolated_environment(monkeypatch):
+    """No test reads the developer's caches, result store or lines."""
+    for name in ('ENOE_CACHE_DIR', 'ENOE_INDICATORS', 'ENOE_QUARTER', 'SIMULADOR_RESULTS_DB',
+                 'SIMULADOR_LINEAS_POBREZA', 'POBREZA_PROFILE'):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def sdem_path(tmp_path):
+    return write_sdem(tmp_path / 'SDEMT122.csv')
+
+
+@pytest.fixture
+def cache_dir(tmp_path, sdem_path):
+    """Columnar cache with the 2022T1 quarter."""
+    import enoe_cache
+
+    path = os.path.join(tmp_path, 'cache')
+    enoe_cache.build_quarter(sdem_path, 2022, '2022T1', path)
+    return path
@@ -0,0 +1,64 @@
+"""The ASGI app is called directly: Starlette's TestClient needs httpx."""
+import asyncio
+import gzip
+import json
+
+import api
+
+
+def _get(path, query='', headers=()):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query.encode(), 'server': ('test', 80), 'client': ('test', 1),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(api.app(scope, receive, send))
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+
+
+def test_etag_gives_bodiless_304():
+    status, headers, body = _get('/api/variaciones')
+    assert status == 200
+    assert json.loads(body)
+    etag = headers['etag']
+
+    status, headers, body = _get('/api/variaciones', headers=[('If-None-Match', etag)])
+    assert status == 304
+    assert body == b''
+    assert headers['etag'] == etag
+
+
+def test_gzip_body_has_its_own_etag_and_same_content():
+    _, plain_headers, plain = _get('/api/indicadores')
+    status, headers, body = _get('/api/indicadores', headers=[('Accept-Encoding', 'gzip, deflate')])
+    assert status == 200
+    assert headers['content-encoding'] == 'gzip'
+    assert headers['etag'] == plain_headers['etag'][:-1] + '-gz"'
+    assert gzip.decompress(body) == plain
+    # Either tag revalidates the other encoding
+    status, _, _ = _get('/api/indicadores', headers=[('If-None-Match', headers['etag'])])
+    assert status == 304
+
+
+def test_unknown_entidad_is_404():
+    status, _, body = _get('/api/variaciones', query='entidad=Atlantis')
+    assert status == 404
+    assert 'Atlantis' in json.loads(body)['error']
+
+
+def test_variations_are_rounded_to_one_decimal():
+    _, _, body = _get('/api/variaciones')
+    values = [value for row in json.loads(body) for value in row.values() if isinstance(value, float)]
+    assert values
+    assert all(value == round(value, 1) for value in values)
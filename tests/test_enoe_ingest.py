@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import enoe_cache
+import enoe_ingest
+from tests.conftest import EXPECTED
+
+
+def _values(table):
+    return table.set_index('Variable')['Valor (%)']
+
+
+def test_encode_persons_packs_carencias_and_income_bits():
+    lp = enoe_ingest.LINEAS_POBREZA['pobreza']['urbano']
+    lpe = enoe_ingest.LINEAS_POBREZA['pobreza_extrema']['urbano']
+    frame = pd.DataFrame({
+        'car_educ': [1.0, 0.0, np.nan],
+        'car_salud': [np.nan, 1.0, 0.0],
+        'car_segsoc': [1.0, 0.0, 0.0],
+        'car_vivienda': np.nan,
+        'car_servicios': np.nan,
+        'car_alim': np.nan,
+        'urbano': True,
+        'ingreso_pc': [lpe - 1, lp - 1, lp],
+    })
+    codes, known = enoe_ingest.encode_persons(frame)
+    educ, salud, segsoc = (enoe_ingest.CARENCIA_BITS[c] for c in ('car_educ', 'car_salud', 'car_segsoc'))
+    below_both = enoe_ingest.BAJO_LP_BIT | enoe_ingest.BAJO_LPE_BIT
+    # An income equal to the line is not below it
+    assert codes.tolist() == [educ | segsoc | below_both, salud | enoe_ingest.BAJO_LP_BIT, 0]
+    assert known.tolist() == [educ | segsoc, educ | salud | segsoc, salud | segsoc]
+
+
+@pytest.mark.parametrize('min_carencias', [1, 2, 3])
+def test_quadrants_partition_every_code(min_carencias):
+    flags = enoe_ingest.code_flags(min_carencias=min_carencias)
+    counts = sum(flags[variable] for variable in enoe_ingest.QUADRANTS)
+    np.testing.assert_array_equal(counts, np.ones(256))
+
+
+def test_ingest_quarter_gives_known_values(sdem_path):
+    values = _values(enoe_ingest.ingest_quarter(sdem_path, 2022))
+    for variable, expected in EXPECTED.items():
+        assert values[variable] == pytest.approx(expected), variable
+    # Not measured by ENOE and no extra table given
+    for column in enoe_ingest.EXTRA_CARENCIA_COLUMNS:
+        variable = next(v for v, c in enoe_ingest.CARENCIA_BY_VARIABLE.items() if c == column)
+        assert np.isnan(values[variable])
+
+
+def test_chunked_ingestion_matches_one_pass(sdem_path):
+    one_pass = enoe_ingest.ingest_quarter(sdem_path, 2022)
+    chunks = list(enoe_ingest.iter_table(sdem_path, enoe_ingest.SDEM_COLUMNS, enoe_ingest.OPTIONAL_SDEM_COLUMNS,
+                                         chunksize=37))
+    assert len(chunks) > 1
+    accumulator = enoe_ingest.IndicatorAccumulator()
+    hh_keys, hh_income_pc = enoe_ingest.household_income(sdem_path, 37)
+    for chunk in chunks:
+        accumulator.add(enoe_ingest.person_frame(chunk, 2022, hh_keys, hh_income_pc))
+    pd.testing.assert_frame_equal(accumulator.table(), one_pass)
+
+
+def test_higher_carencia_threshold_keeps_quadrants_at_100(sdem_path):
+    frame = next(enoe_ingest.iter_person_frames(sdem_path, 2022))
+    numerators, denominators, variables = enoe_ingest.group_totals(frame, min_carencias=2)
+    with np.errstate(invalid='ignore'):
+        values = pd.Series(numerators[0] / denominators[0] * 100, index=variables)
+    assert values[enoe_ingest.QUADRANTS].sum() == pytest.approx(100.0)
+    # Only A has two or more carencias: B and C move to the non-poor quadrants
+    assert values['Población en pobreza'] == pytest.approx(10.0)
+    assert values['Población vulnerable por ingresos'] == pytest.approx(30.0)
+
+
+def test_cached_quarter_gives_the_same_table(sdem_path, cache_dir):
+    pd.testing.assert_frame_equal(enoe_cache.indicator_table(cache_dir, '2022T1'),
+                                  enoe_ingest.ingest_quarter(sdem_path, 2022))
+
+
+def test_accumulator_without_chunks_raises_value_error():
+    with pytest.raises(ValueError, match="Sin registros"):
+        enoe_ingest.IndicatorAccumulator().table()
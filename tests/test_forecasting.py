@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtesting
+import breakdowns
+import enoe_cache
+import forecasting
+from core import POBREZA
+from tests.conftest import EXPECTED, write_sdem
+
+QUARTERS = ['2021T1', '2021T2', '2021T3', '2021T4', '2022T1']
+
+
+def _history(rows):
+    index = pd.MultiIndex.from_tuples(
+        [(breakdowns.NACIONAL, breakdowns.NACIONAL, variable) for variable in rows],
+        names=breakdowns.INDEX_COLUMNS)
+    return pd.DataFrame(list(rows.values()), index=index, columns=QUARTERS)
+
+
+def test_constant_series_forecasts_the_constant():
+    table, params = forecasting.forecast_table(_history({POBREZA: [30.0] * 5}), '2022T3', max_workers=1)
+    row = table.iloc[0]
+    assert row[forecasting.FORECAST_COLUMNS].tolist() == [30.0, 30.0, 30.0]
+    assert len(params) == 1
+
+
+def test_trend_is_damped_and_bands_order_by_direction():
+    hist = _history({POBREZA: [30.0, 31.0, 32.0, 33.0, 34.0]})
+    table, _ = forecasting.forecast_table(hist, '2023T1', max_workers=1)
+    row = table.iloc[0]
+    central = row[forecasting.CENTRAL_COLUMN]
+    # Above the last value, below the undamped four-quarter extrapolation
+    assert 34.0 < central < 38.0
+    optimistic, restrictive = row[forecasting.FORECAST_COLUMNS[1:]]
+    assert optimistic <= central <= restrictive
+
+
+def test_short_series_get_no_forecast():
+    hist = _history({POBREZA: [np.nan, np.nan, 30.0, 31.0, 32.0]})
+    table, params = forecasting.forecast_table(hist, '2022T3', max_workers=1)
+    assert table[forecasting.FORECAST_COLUMNS].isna().all(axis=None)
+    assert params == {}
+
+
+def test_target_inside_history_raises_value_error():
+    with pytest.raises(ValueError, match="no es un pronóstico"):
+        forecasting.forecast_table(_history({POBREZA: [30.0] * 5}), '2022T1')
+
+
+def test_backtest_of_a_flat_history_is_exact(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    sdem_path = write_sdem(tmp_path / 'SDEMT122.csv')
+    for quarter in QUARTERS:
+        enoe_cache.build_quarter(sdem_path, int(quarter[:4]), quarter, cache_dir)
+    results = backtesting.backtest(cache_dir, max_horizon=2, max_workers=1)
+    assert sorted(results['Origen'].unique()) == ['2021T4']
+    table = backtesting.accuracy(results)
+    assert table.loc[POBREZA, 'Evaluaciones'] == 1
+    for variable in EXPECTED:
+        assert table.loc[variable, 'MAE central (pp)'] == 0.0
+        assert table.loc[variable, 'Cobertura de la banda (%)'] == 100.0
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import enoe_cache
+import microsim
+from enoe_ingest import LINEAS_POBREZA
+from tests.conftest import EXPECTED
+
+
+@pytest.fixture
+def households(cache_dir):
+    return microsim.household_table(cache_dir, '2022T1')
+
+
+def test_no_shock_reproduces_the_quarter(households):
+    values = households.scenario()
+    for variable in microsim.SHOCK_VARIABLES:
+        assert values[variable] == pytest.approx(EXPECTED[variable]), variable
+
+
+def test_income_growth_lifts_households_over_the_line(households):
+    # B and D reach 4 500 > LP; A reaches 1 500 < LPE
+    values = households.scenario(growth=50)
+    assert values['Población en pobreza'] == pytest.approx(10.0)
+    assert values['Población en pobreza extrema'] == pytest.approx(10.0)
+    assert values['Población vulnerable por ingresos'] == pytest.approx(0.0)
+    assert values['Población con ingreso inferior a la linea de pobreza por ingresos'] == pytest.approx(10.0)
+
+
+def test_transfer_moves_extreme_to_moderate_poverty(households):
+    # A reaches 2 100 > LPE, B 4 100 < LP
+    values = households.scenario(transfer=1100)
+    assert values['Población en pobreza extrema'] == pytest.approx(0.0)
+    assert values['Población en pobreza moderada'] == pytest.approx(30.0)
+
+
+def test_grid_matches_single_scenarios(households):
+    grid = households.grid(growths=[0, 50], transfers=[0, 1100]).set_index(
+        [microsim.GROWTH_COLUMN, microsim.TRANSFER_COLUMN])
+    for growth, transfer in grid.index:
+        np.testing.assert_allclose(grid.loc[(growth, transfer)], households.scenario(growth, transfer))
+
+
+def test_growth_of_minus_100_raises_value_error(households):
+    with pytest.raises(ValueError, match="mayor que -100%"):
+        households.scenario(growth=-100)
+
+
+def test_base_lines_give_the_base_scenario(households):
+    lineas = {line: {area: [value] for area, value in areas.items()} for line, areas in LINEAS_POBREZA.items()}
+    np.testing.assert_allclose(households.evaluate_lines(lineas).iloc[0], households.scenario())
+
+
+def test_state_table_uses_its_own_households(cache_dir):
+    jalisco = microsim.household_table(cache_dir, '2022T1', enoe_cache.ENTIDADES[13])
+    national = microsim.household_table(cache_dir, '2022T1')
+    assert jalisco.n_households * 2 == national.n_households
+    np.testing.assert_allclose(jalisco.scenario(), national.scenario())
@@ -0,0 +1,51 @@
+import pytest
+
+import enoe_cache
+import pipeline
+from tests.conftest import write_sdem
+
+
+@pytest.fixture
+def sources_dir(tmp_path):
+    path = tmp_path / 'fuentes'
+    path.mkdir()
+    write_sdem(path / 'SDEMT122.csv')
+    write_sdem(path / 'SDEMT222.csv', income_scale=2.0)
+    return str(path)
+
+
+def _states(report):
+    return dict(zip(report['Etapa'], report['Estado']))
+
+
+def test_second_refresh_builds_nothing(sources_dir, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    first = pipeline.refresh(sources_dir, cache_dir, max_workers=1)
+    assert set(first['Estado']) == {'construida'}
+    assert sorted(enoe_cache.read_manifest(cache_dir)['quarters']) == ['2022T1', '2022T2']
+
+    second = pipeline.refresh(sources_dir, cache_dir, max_workers=1)
+    assert set(second['Estado']) == {'al día'}
+    assert second['Etapa'].tolist() == first['Etapa'].tolist()
+
+
+def test_changed_source_rebuilds_its_quarter_and_what_follows(sources_dir, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    pipeline.refresh(sources_dir, cache_dir, max_workers=1)
+    write_sdem(tmp_path / 'fuentes' / 'SDEMT222.csv', income_scale=3.0)
+
+    planned = _states(pipeline.refresh(sources_dir, cache_dir, max_workers=1, dry_run=True))
+    assert planned['ingesta:2022T1'] == 'al día'
+    assert planned['cubo:2022T1'] == 'al día'
+    assert planned['ingesta:2022T2'] == 'pendiente'
+    assert planned['errores'] == 'pendiente'
+
+    states = _states(pipeline.refresh(sources_dir, cache_dir, max_workers=1))
+    assert states['ingesta:2022T1'] == 'al día'
+    assert states['ingesta:2022T2'] == 'construida'
+    assert states['cubo:2022T2'] == 'construida'
+
+
+def test_sources_dir_without_sdem_raises_value_error(tmp_path):
+    with pytest.raises(ValueError, match="No hay tablas SDEMT"):
+        pipeline.refresh(str(tmp_path), str(tmp_path / 'cache'), max_workers=1)
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+import enoe_cache
+import poverty_lines
+from enoe_ingest import LINEAS_POBREZA
+from tests.conftest import write_sdem
+
+POBREZA = 'Población en pobreza'
+BAJO_LP = 'Población con ingreso inferior a la linea de pobreza por ingresos'
+
+
+@pytest.fixture
+def lines(tmp_path):
+    months = pd.period_range('2021-12', '2022-12', freq='M').astype(str)
+    frame = pd.DataFrame({poverty_lines.MES: months})
+    for column, (line, area) in poverty_lines.LINE_COLUMNS.items():
+        frame[column] = LINEAS_POBREZA[line][area]
+    # Below B and D's 3 000, above A's 1 000
+    frame.loc[frame[poverty_lines.MES] == '2022-02', 'LP urbano'] = 2500.0
+    path = tmp_path / 'lineas.csv'
+    frame.to_csv(path, index=False)
+    return poverty_lines.read_lines(str(path))
+
+
+@pytest.fixture
+def gap_cache(tmp_path):
+    """2022T1 as built, no 2022T2, and a 2022T3 where every income doubled."""
+    cache_dir = str(tmp_path / 'cache')
+    enoe_cache.build_quarter(write_sdem(tmp_path / 'SDEMT122.csv'), 2022, '2022T1', cache_dir)
+    enoe_cache.build_quarter(write_sdem(tmp_path / 'SDEMT322.csv', income_scale=2.0), 2022, '2022T3', cache_dir)
+    return cache_dir
+
+
+def test_monthly_series_uses_each_months_lines(gap_cache, lines):
+    series = poverty_lines.monthly_series(gap_cache, lines)
+    assert series.loc['2022-01', POBREZA] == pytest.approx(30.0)
+    assert series.loc['2022-02', POBREZA] == pytest.approx(10.0)
+    assert series.loc['2022-02', BAJO_LP] == pytest.approx(10.0)
+    # Doubled incomes leave only A (2 000) below the lines
+    assert series.loc['2022-08', POBREZA] == pytest.approx(10.0)
+    assert series.loc['2022-08', 'Población en pobreza extrema'] == pytest.approx(10.0)
+
+
+def test_gap_and_late_months_use_the_previous_quarter(gap_cache, lines):
+    series = poverty_lines.monthly_series(gap_cache, lines)
+    # Before the first cached quarter
+    assert '2021-12' not in series.index
+    sources = series[poverty_lines.TRIMESTRE_INGRESOS]
+    assert sources.loc['2022-01':'2022-06'].eq('2022T1').all()
+    assert sources.loc['2022-07':'2022-12'].eq('2022T3').all()
+    estimated = series.index[series[poverty_lines.ESTIMADO]].tolist()
+    assert estimated == ['2022-04', '2022-05', '2022-06', '2022-10', '2022-11', '2022-12']
+    assert series.loc['2022-05', POBREZA] == pytest.approx(30.0)
+
+
+def test_series_up_to_a_quarter_ignores_later_ones(gap_cache, lines):
+    series = poverty_lines.monthly_series(gap_cache, lines, quarter='2022T1')
+    assert series[poverty_lines.TRIMESTRE_INGRESOS].eq('2022T1').all()
+    assert series.loc['2022-08', POBREZA] == pytest.approx(30.0)
+
+
+def test_lines_without_a_column_raise_value_error(tmp_path):
+    path = tmp_path / 'lineas.csv'
+    pd.DataFrame({poverty_lines.MES: ['2022-01'], 'LP urbano': [4000.0]}).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="Faltan columnas"):
+        poverty_lines.read_lines(str(path))
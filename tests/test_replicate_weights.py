@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import enoe_cache
+import replicate_weights
+from tests.conftest import EXPECTED, write_sdem
+
+
+def _frame(tmp_path, psu):
+    cache_dir = str(tmp_path / 'cache')
+    enoe_cache.build_quarter(write_sdem(tmp_path / 'SDEMT122.csv', psu=psu), 2022, '2022T1', cache_dir)
+    columns = enoe_cache.INDICATOR_COLUMNS + replicate_weights.DESIGN_COLUMNS
+    return enoe_cache.load_quarter(cache_dir, '2022T1', columns)
+
+
+def test_identical_psus_have_no_sampling_error(tmp_path):
+    table = replicate_weights.bootstrap_standard_errors(_frame(tmp_path, 'bloque'), 50, max_workers=1)
+    table = table.set_index('Variable')
+    for variable, expected in EXPECTED.items():
+        assert table.loc[variable, 'Valor (%)'] == pytest.approx(expected)
+        assert table.loc[variable, 'Error estándar (pp)'] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_household_psus_give_reproducible_positive_errors(tmp_path):
+    frame = _frame(tmp_path, 'hogar')
+    first = replicate_weights.bootstrap_standard_errors(frame, 50, seed=7, max_workers=1)
+    second = replicate_weights.bootstrap_standard_errors(frame, 50, seed=7, max_workers=1)
+    errors = first.set_index('Variable').loc[list(EXPECTED), 'Error estándar (pp)']
+    assert (errors > 0).all()
+    np.testing.assert_array_equal(first['Error estándar (pp)'], second['Error estándar (pp)'])
+    measured = first.dropna()
+    assert (measured['IC 95% inferior'] < measured['Valor (%)']).all()
+
+
+def test_standard_errors_are_kept_on_disk(cache_dir):
+    table = replicate_weights.standard_errors(cache_dir, '2022T1', n_replicates=20, max_workers=1)
+    replicate_weights._errors.clear()
+    reread = replicate_weights.standard_errors(cache_dir, '2022T1', n_replicates=20, max_workers=1)
+    np.testing.assert_allclose(reread['Error estándar (pp)'], table['Error estándar (pp)'], equal_nan=True)